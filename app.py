@@ -1,43 +1,317 @@
-import pandas as pd
-import joblib
-from flask import Flask, jsonify, render_template, request, session, redirect, url_for
-from werkzeug.security import check_password_hash, generate_password_hash
+import time
+_import_started = time.perf_counter()
+
+import base64
+import json
+import queue
 import sqlite3
+import threading
+from flask import (Flask, Response, g, jsonify, render_template, request, send_file, session, redirect, stream_with_context,
+                   url_for)
+from werkzeug.security import check_password_hash, generate_password_hash
 import os
 
-# Import the final prediction function
-from predict import get_holistic_risk_profile
+# Only lightweight modules are imported here. pandas, NumPy and the model are
+# loaded on first use, so /login, /logout and the notes endpoints never pay for them.
+from cache import TTLCache
+from db import (ConnectionPool, fetch_filter_options, fetch_notes, fetch_student_history, fetch_student_page, insert_note,
+                search_notes)
+from exports import (EXPORT_DIR, EXPORT_FORMATS, ExportWorker, enqueue_export_job, export_header, get_export_job,
+                     iter_csv, iter_export_rows, list_export_jobs)
+from live_updates import SUBSCRIBER_QUEUE_SIZE, EventBroadcaster, fetch_events_after, publish_event
+from metrics import REQUEST_METRIC, format_metric, metrics, time_stage
+from model_registry import ModelRegistry
+from profiling import PROFILE_DIR, PROFILE_MODES, RequestProfiler
+from scoring_worker import ScoringWorker, enqueue_scoring_job, get_scoring_job, list_scoring_jobs
+from tenants import TenantManager, TenantRegistry, tenant_path
 
 app = Flask(__name__)
 app.secret_key = 'a_very_secret_key_for_production'
 
 # --- File Configuration ---
+# The names of an institution's files, inside its tenant directory (see tenants.py).
 MODEL_FILE = 'student_dropout_model.joblib'
 LABEL_ENCODER_FILE = 'label_encoder.joblib'
+COMPILED_MODEL_FILE = 'student_dropout_model.compiled.joblib'
 DB_FILE = 'mentors_eye.db'
 
-# --- Load Model Artifacts ---
-# These are loaded once when the application starts.
-try:
-    model = joblib.load(MODEL_FILE)
-    label_encoder = joblib.load(LABEL_ENCODER_FILE)
-    print("--- Model and label encoder loaded successfully. ---")
-except FileNotFoundError as e:
-    print(f"🛑 FATAL ERROR: Could not load model files: {e}")
-    print("Please ensure you have run 'train_model.py' successfully.")
-    model, label_encoder = None, None
+# --- Response Caches ---
+# Mentors click back and forth between the same students in the drawer, so the
+# per-student detail payload and notes list are served from memory when possible.
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL_SECONDS = 300
+
+# --- Cohort API ---
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+NOTES_SEARCH_PAGE_SIZE = 20
+# Display names used by the dashboard for each predicted class.
+RISK_LEVEL_MAP = {'Dropout': 'High', 'Enrolled': 'Medium', 'Graduate': 'Low'}
+
+# --- Model Artifacts ---
+# Loaded lazily and memory-mapped by the registry. The compiled NumPy-only
+# model is preferred; the scikit-learn pipeline is the fallback if it is
+# missing or was exported from a different model file. Set MODEL_WARMUP=0 to
+# skip loading in the background when a tenant is opened (e.g. for tests).
+#
+# Retrained artifacts are picked up every MODEL_WATCH_INTERVAL seconds (0
+# disables this) and swapped in without a restart. Every process also reports
+# the versions it serves to the database every MODEL_WATCH_INTERVAL (or
+# MODEL_SYNC_INTERVAL) seconds; a retired version's scores are only deleted
+# once no process serves it. With a non-zero
+# MODEL_SHADOW_SAMPLE_RATE, that fraction of student detail requests is also
+# scored by the new model, which is only promoted once it has been compared on
+# MODEL_SHADOW_MIN_SAMPLES students and disagrees on at most
+# MODEL_MAX_DISAGREEMENT_RATE of them.
+WARM_UP_MODEL = os.environ.get('MODEL_WARMUP', '1') != '0'
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', '10'))
+MODEL_SHADOW_SAMPLE_RATE = float(os.environ.get('MODEL_SHADOW_SAMPLE_RATE', '0'))
+MODEL_SHADOW_MIN_SAMPLES = int(os.environ.get('MODEL_SHADOW_MIN_SAMPLES', '200'))
+MODEL_MAX_DISAGREEMENT_RATE = float(os.environ.get('MODEL_MAX_DISAGREEMENT_RATE', '0.05'))
+MODEL_SYNC_INTERVAL = 10
+
+# --- Background Scoring ---
+# Cohort-wide scoring never runs on the request path: it is queued as a job in
+# the database and run in batches by a worker thread. Set SCORING_WORKER=0 to
+# run the worker in its own process instead ('python scoring_worker.py --work').
+RUN_SCORING_WORKER = os.environ.get('SCORING_WORKER', '1') != '0'
+
+# Large cohort exports are written to files by their own worker thread, so
+# that a long export never delays rescoring. EXPORT_WORKER=0 disables it.
+RUN_EXPORT_WORKER = os.environ.get('EXPORT_WORKER', '1') != '0'
+
+# --- Live Updates ---
+# Risk changes, new notes and model swaps are logged to the database by
+# whichever process makes them, and streamed to dashboards over /api/events
+# (Server-Sent Events) so cards are patched in place instead of reloaded.
+EVENT_KEEPALIVE_SECONDS = 15
+
+# --- Tenants ---
+# Each institution has its own directory holding its database and model
+# artifacts, and each mentor belongs to one institution (see tenants.py).
+# A tenant's connection pool, model, caches and workers are opened on its
+# first request, so tenants never share a database lock or a worker. When the
+# open tenants use more than TENANT_MEMORY_BUDGET_MB, the least recently used
+# idle ones are closed. Their memory use is estimated from the size of their
+# model artifacts plus TENANT_OVERHEAD_BYTES for connections and caches.
+TENANT_MEMORY_BUDGET_MB = float(os.environ.get('TENANT_MEMORY_BUDGET_MB', '2048'))
+TENANT_OVERHEAD_BYTES = 16 * 1024 * 1024
+
+class TenantServices:
+    """Everything the app keeps open for one tenant."""
+
+    def __init__(self, config):
+        self.name = config.name
+        self.db_file = tenant_path(config, DB_FILE)
+        # One pooled connection per worker thread; routes never open or close their own.
+        self.pool = ConnectionPool(self.db_file)
+        self.student_details_cache = TTLCache(maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+        self.notes_cache = TTLCache(maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+        # Model versions for which every student's latest record is known to be
+        # scored -> how many scores they had then. A version whose count falls
+        # (its scores were deleted elsewhere) is dropped, so it gets rescored.
+        self.fully_scored_versions = {}
+
+        self.model_registry = ModelRegistry(
+            tenant_path(config, MODEL_FILE), tenant_path(config, LABEL_ENCODER_FILE), tenant_path(config, COMPILED_MODEL_FILE),
+            shadow_sample_rate=MODEL_SHADOW_SAMPLE_RATE, shadow_min_samples=MODEL_SHADOW_MIN_SAMPLES,
+            max_disagreement_rate=MODEL_MAX_DISAGREEMENT_RATE, prepare=self.prepare_model, on_swap=self.on_model_swap,
+            db_file=self.db_file, on_sync=self.check_scored_versions
+        )
+        self.scoring_worker = ScoringWorker(self.db_file, self.model_registry.get, on_job_done=self.on_scoring_job_done)
+        self.export_worker = ExportWorker(self.db_file, self.model_registry.get, output_dir=tenant_path(config, EXPORT_DIR))
+        self.event_broadcaster = EventBroadcaster(self.db_file, on_event=self.on_change_event)
+
+        if WARM_UP_MODEL:
+            self.model_registry.warm_up_in_background()
+        self.model_registry.start_watching(MODEL_WATCH_INTERVAL or MODEL_SYNC_INTERVAL, watch_files=MODEL_WATCH_INTERVAL > 0)
+        if os.path.exists(self.db_file):
+            self.upgrade_database()
+            if RUN_SCORING_WORKER:
+                self.scoring_worker.start()
+            if RUN_EXPORT_WORKER:
+                self.export_worker.start()
+            self.event_broadcaster.start()
+
+    def upgrade_database(self):
+        """
+        Adds what databases set up by an older database_setup.py are missing,
+        once, when the tenant is opened: the notes search index (indexing the
+        existing notes) and the students' trends. Only the schema is checked
+        here; trends are computed on a background thread, so the request that
+        opens the tenant does not wait for them (or for pandas).
+        """
+        conn = sqlite3.connect(self.db_file)
+        try:
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE name IN ('notes_fts', 'student_trends', 'latest_student_state')"
+            )}
+            if 'notes_fts' not in tables:
+                from database_setup import create_notes_search_index
+                with conn:
+                    if create_notes_search_index(conn.cursor()):
+                        print(f"-> Tenant '{self.name}': indexed existing notes for search.")
+            if 'latest_student_state' not in tables:
+                return
+            if 'student_trends' not in tables:
+                from trends import create_student_trends_table
+                create_student_trends_table(conn)
+                conn.commit()
+            if conn.execute('SELECT 1 FROM student_trends LIMIT 1').fetchone() is None:
+                threading.Thread(target=self.backfill_trends, name='trends-backfill', daemon=True).start()
+        finally:
+            conn.close()
+
+    def backfill_trends(self):
+        """Computes every student's trends for a database that has none yet."""
+        from trends import refresh_student_trends
+
+        conn = sqlite3.connect(self.db_file)
+        try:
+            with conn:
+                trends_df = refresh_student_trends(conn)
+            self.student_details_cache.clear()
+            if len(trends_df):
+                print(f"-> Tenant '{self.name}': computed trends for {len(trends_df)} students.")
+        except Exception as e:
+            print(f"🛑 ERROR: Tenant '{self.name}': computing trends failed: {e}")
+        finally:
+            conn.close()
+
+    def prepare_model(self, loaded):
+        """
+        Queues the scoring of every student with a new model before it is
+        swapped in. Every process queues the same job, which only a worker
+        already serving the new version claims, so the cohort is scored once.
+        """
+        enqueue_scoring_job(self.pool.get_connection(), model_version=loaded.version)
+        self.scoring_worker.notify()
+
+    def mark_fully_scored(self, conn, model_version):
+        """Records that every student's latest record is scored by a version, with its current score count."""
+        from risk_scores import count_model_version_scores
+
+        self.fully_scored_versions[model_version] = count_model_version_scores(conn, model_version)
+
+    def check_scored_versions(self):
+        """Forgets fully scored versions whose scores were (partly) deleted since. Runs on the watcher thread."""
+        from risk_scores import count_model_version_scores
+
+        if not self.fully_scored_versions or not os.path.exists(self.db_file):
+            return
+        conn = self.pool.get_connection()
+        for model_version, count in list(self.fully_scored_versions.items()):
+            if count_model_version_scores(conn, model_version) < count:
+                self.fully_scored_versions.pop(model_version, None)
+
+    def on_model_swap(self, previous, loaded):
+        """
+        Drops everything derived from the previous model once the new one is
+        serving. Its stored scores are left for other processes that may still
+        serve it; the registry deletes them once none does.
+        """
+        self.student_details_cache.clear()
+        if previous is not None and previous.version != loaded.version:
+            self.fully_scored_versions.pop(previous.version, None)
+            # Every score changed at once; dashboards reload their list instead of patching cards.
+            publish_event(self.pool.get_connection(), 'model', None, {'version': loaded.version})
+
+    def on_scoring_job_done(self, job):
+        """Records a fully scored model version and drops cached payloads whose scores were replaced."""
+        if job['status'] != 'done':
+            return
+        if job['student_ids'] is None:
+            self.mark_fully_scored(self.pool.get_connection(), job['model_version'])
+        if job['force']:
+            if job['student_ids'] is None:
+                self.student_details_cache.clear()
+            else:
+                for student_id in job['student_ids']:
+                    self.student_details_cache.invalidate(student_id)
+
+    def on_change_event(self, event):
+        """Drops this process's cached payloads that a change (possibly made elsewhere) made stale."""
+        if event['type'] in ('risk', 'record'):
+            self.student_details_cache.invalidate(event['student_id'])
+        elif event['type'] == 'note':
+            self.notes_cache.invalidate(event['student_id'])
+        elif event['type'] == 'model':
+            self.student_details_cache.clear()
+
+    def memory_bytes(self):
+        return self.model_registry.memory_bytes() + TENANT_OVERHEAD_BYTES
+
+    def close(self):
+        """Stops the tenant's threads and releases its model, caches and connections."""
+        self.event_broadcaster.stop()
+        self.scoring_worker.stop()
+        self.export_worker.stop()
+        self.model_registry.stop()
+        self.student_details_cache.clear()
+        self.notes_cache.clear()
+        self.pool.close_all()
+
+tenant_registry = TenantRegistry()
+tenants = TenantManager(lambda name: TenantServices(tenant_registry.get(name)), TENANT_MEMORY_BUDGET_MB * 1024 * 1024)
+
+# --- Instrumentation ---
+# Every request and serving stage is timed into in-process histograms, exposed
+# with cache and model stats at /metrics in the Prometheus text format.
+# With PROFILE_REQUESTS=1, a request sent with an 'X-Profile: cprofile' or
+# 'X-Profile: stacks' header is also profiled; the file is written to
+# PROFILE_DIR and its path returned in the X-Profile-File response header.
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '0') == '1'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_OUTPUT_DIR = os.environ.get('PROFILE_DIR', PROFILE_DIR)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    mode = request.headers.get(PROFILE_HEADER) if PROFILE_REQUESTS else None
+    if mode:
+        g.profiler = RequestProfiler(mode if mode in PROFILE_MODES else 'cprofile', PROFILE_OUTPUT_DIR)
+        g.profiler.start()
+
+@app.after_request
+def record_request_time(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response.headers['X-Profile-File'] = profiler.stop(request.endpoint or 'unknown')
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe(REQUEST_METRIC, time.perf_counter() - started,
+                        endpoint=request.endpoint or 'unknown', method=request.method, status=response.status_code)
+    return response
 
 # --- In-memory User Store (for demonstration) ---
 USERS = {
     "mentor@college.edu": generate_password_hash("password123")
 }
 
-# --- Helper Function ---
+# --- Tenant Routing ---
+# Every request from a logged-in mentor is served by their institution's services.
+@app.before_request
+def open_tenant():
+    email = session.get('user_email')
+    if email is None:
+        return
+    name = tenant_registry.tenant_for_mentor(email)
+    if name is None:
+        # Removed from their institution since logging in.
+        session.pop('user_email', None)
+        return
+    g.tenant = tenants.acquire(name)
+
+@app.teardown_request
+def release_tenant(exc):
+    # Runs after a streamed response has finished, so a tenant is never closed mid-stream.
+    tenant = g.pop('tenant', None)
+    if tenant is not None:
+        tenants.release(tenant.name)
+
 def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Returns the current thread's pooled connection to the logged-in mentor's database."""
+    return g.tenant.pool.get_connection()
 
 # --- Routes ---
 @app.route('/login', methods=['GET', 'POST'])
@@ -47,6 +321,8 @@ def login():
         password = request.form['password']
         
         if email in USERS and check_password_hash(USERS.get(email), password):
+            if tenant_registry.tenant_for_mentor(email) is None:
+                return render_template('login.html', error="Your account is not linked to an institution yet.")
             session['user_email'] = email
             return redirect(url_for('dashboard'))
         else:
@@ -62,63 +338,430 @@ def logout():
 def dashboard():
     if 'user_email' not in session:
         return redirect(url_for('login'))
-        
-    if model is None or label_encoder is None:
+
+    loaded = g.tenant.model_registry.get()
+    if loaded is None:
         return "Error: Model artifacts not loaded. Please check server logs.", 500
 
+    from predict import RISK_RULES
+    from risk_scores import count_unscored_latest_records
+    from trends import TREND_RULES
+
     conn = get_db_connection()
-    # Fetch only the latest record for each student for the main list
-    query = """
-    SELECT t1.*
-    FROM students t1
-    INNER JOIN (
-        SELECT StudentID, MAX(ReportingPeriod) as MaxPeriod
-        FROM students
-        GROUP BY StudentID
-    ) t2 ON t1.StudentID = t2.StudentID AND t1.ReportingPeriod = t2.MaxPeriod
-    """
-    latest_df = pd.read_sql_query(query, conn)
-    conn.close()
-
-    student_data_with_risk = []
-    for _, row in latest_df.iterrows():
-        student_profile_for_prediction = row.drop(['StudentID', 'Name', 'Email', 'Phone', 'Target', 'ReportingPeriod'])
-        student_profile_df = pd.DataFrame([student_profile_for_prediction])
-        
-        risk_profile = get_holistic_risk_profile(student_profile_df, model, label_encoder)
-        
-        student_display_data = row.to_dict()
-        student_display_data['risk'] = risk_profile
-        student_data_with_risk.append(student_display_data)
+    # The student list itself is paged in from /api/students, which only lists
+    # scored students. If this model version may have gaps, the worker fills
+    # them in while the page shows the job's progress. Another process may
+    # have scored the version already, so the database is asked first.
+    scoring_job_id = None
+    if loaded.version not in g.tenant.fully_scored_versions:
+        if count_unscored_latest_records(conn, loaded.version) == 0:
+            g.tenant.mark_fully_scored(conn, loaded.version)
+        else:
+            scoring_job_id = enqueue_scoring_job(conn, model_version=loaded.version)
+            g.tenant.scoring_worker.notify()
+
+    with time_stage('db_query'):
+        filter_options = fetch_filter_options(conn)
+    factor_names = [rule['text'] for rule in RISK_RULES]
+    trend_names = [rule['text'] for rule in TREND_RULES]
+
+    with time_stage('template_render'):
+        return render_template('index.html', user_email=session.get('user_email'),
+                               branches=filter_options['branches'], years=filter_options['years'],
+                               factors=factor_names, trends=trend_names, page_size=API_PAGE_SIZE,
+                               scoring_job_id=scoring_job_id)
+
+def encode_page_cursor(row):
+    """Encodes the keyset of a page's last row as an opaque cursor string."""
+    keyset = json.dumps([row['dropout_probability'], row['StudentID']])
+    return base64.urlsafe_b64encode(keyset.encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(cursor):
+    """Decodes a cursor from encode_page_cursor. Raises ValueError if it is malformed."""
+    try:
+        probability, student_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(probability), str(student_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def parse_student_filters(args):
+    """
+    Turns the cohort filter parameters shared by /api/students and the exports
+    (risk, branch, year, fee_status, factor, trend and q) into
+    fetch_student_page keyword arguments.
+    Raises ValueError for an unknown factor or trend.
+    """
+    from predict import RISK_RULES
+    from trends import TREND_RULES
+
+    level = args.get('risk') or None
+    if level is not None:
+        display_to_class = {display: label for label, display in RISK_LEVEL_MAP.items()}
+        level = display_to_class.get(level, level)
+
+    factor_bit = None
+    if args.get('factor'):
+        factor_bits = {rule['text']: bit for bit, rule in enumerate(RISK_RULES)}
+        if args['factor'] not in factor_bits:
+            raise ValueError(f"Unknown factor: {args['factor']}")
+        factor_bit = factor_bits[args['factor']]
+
+    trend_bit = None
+    if args.get('trend'):
+        trend_bits = {rule['text']: bit for bit, rule in enumerate(TREND_RULES)}
+        if args['trend'] not in trend_bits:
+            raise ValueError(f"Unknown trend: {args['trend']}")
+        trend_bit = trend_bits[args['trend']]
+
+    try:
+        year = int(args['year']) if args.get('year') not in (None, '') else None
+    except (TypeError, ValueError):
+        year = None
+
+    return {
+        'level': level, 'branch': args.get('branch') or None, 'year': year,
+        'fee_status': args.get('fee_status') or None, 'factor_bit': factor_bit, 'trend_bit': trend_bit,
+        'search': args.get('q') or None,
+    }
 
-    return render_template('index.html', student_data=student_data_with_risk, user_email=session.get('user_email'))
+@app.route('/api/students')
+def list_students():
+    """
+    Returns one page of the cohort as JSON, sorted by dropout probability.
+    Query parameters: cursor, limit, risk (High/Medium/Low or a class name),
+    branch, year, fee_status, factor (a risk factor text), trend (a trend rule
+    text, e.g. "Attendance dropped >10 points") and q (name/ID search).
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    loaded = g.tenant.model_registry.get()
+    if loaded is None:
+        return jsonify({"error": "Model artifacts not loaded."}), 500
+
+    from predict import build_risk_profile
+    from trends import expand_trend_flags
+
+    args = request.args
+    limit = max(1, min(args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+
+    try:
+        filters = parse_student_filters(args)
+        after = decode_page_cursor(args['cursor']) if args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # One extra row tells us whether there is another page.
+    conn = get_db_connection()
+    with time_stage('db_query'):
+        rows = fetch_student_page(conn, loaded.version, limit + 1, after=after, **filters)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    class_names = loaded.label_encoder.classes_
+    students = []
+    with time_stage('response_build'):
+        for row in rows:
+            probabilities = json.loads(row['probabilities'])
+            students.append({
+                'StudentID': row['StudentID'],
+                'Name': row['Name'],
+                'Branch': row['Branch'],
+                'Year': row['Year'],
+                'FeeStatus': row['FeeStatus'],
+                'ReportingPeriod': row['ReportingPeriod'],
+                'risk': build_risk_profile(row['level'], [probabilities[str(label)] for label in class_names],
+                                           row['factor_bitmask'], class_names),
+                'trends': {
+                    'attendance_delta': row['attendance_delta'],
+                    'score_delta': row['score_delta'],
+                    'flags': expand_trend_flags(row['trend_bitmask'] or 0),
+                },
+            })
+
+    return jsonify({
+        'students': students,
+        'next_cursor': encode_page_cursor(rows[-1]) if has_more else None
+    })
 
 @app.route('/student/<student_id>')
 def get_student_details(student_id):
     if 'user_email' not in session:
         return jsonify({"error": "Unauthorized"}), 401
+
+    cached_response = g.tenant.student_details_cache.get(student_id)
+    if cached_response is not None:
+        return jsonify(cached_response)
+
+    loaded = g.tenant.model_registry.get()
+    if loaded is None:
+        return jsonify({"error": "Model artifacts not loaded."}), 500
+
+    from risk_scores import get_risk_explanations, get_risk_profiles
+    from trends import fetch_student_trends
     
     conn = get_db_connection()
-    student_history_df = pd.read_sql_query(f"SELECT * FROM students WHERE StudentID = '{student_id}' ORDER BY ReportingPeriod", conn)
-    conn.close()
+    student_history_df = fetch_student_history(conn, student_id)
     
     if student_history_df.empty:
         return jsonify({"error": "Student not found"}), 404
         
-    student_history = student_history_df.to_dict('records')
+    with time_stage('dataframe_build'):
+        student_history = student_history_df.to_dict('records')
     latest_record = student_history[-1]
     
-    latest_record_for_prediction = pd.DataFrame([latest_record]).drop(columns=['StudentID', 'Name', 'Email', 'Phone', 'Target', 'ReportingPeriod'])
-    
-    risk_profile = get_holistic_risk_profile(latest_record_for_prediction, model, label_encoder)
+    risk_profile = get_risk_profiles(conn, student_history_df.tail(1), loaded.model, loaded.label_encoder, loaded.version)[0]
+    # Stored with the score, so this is a lookup rather than a recomputation.
+    risk_profile['explanation'] = get_risk_explanations(conn, student_history_df.tail(1), loaded.model, loaded.label_encoder,
+                                                        loaded.version)[0]
+    # If a new model is waiting to be promoted, compare it against this one (in the background).
+    g.tenant.model_registry.shadow_score(student_history_df.tail(1))
     
     response_data = {
         **latest_record,
         "risk": risk_profile,
+        "trends": fetch_student_trends(conn, student_id),
         "history": student_history
     }
+    g.tenant.student_details_cache.set(student_id, response_data)
     return jsonify(response_data)
 
+# --- Model Management ---
+@app.route('/api/model')
+def model_status():
+    """Returns the serving model version and the shadow model's disagreement rate, if any."""
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(g.tenant.model_registry.status())
+
+@app.route('/api/model/promote', methods=['POST'])
+def promote_model():
+    """
+    Promotes the shadow model, whatever its disagreement rate. The decision is
+    recorded and every app process swaps the model in on its watcher thread
+    within MODEL_WATCH_INTERVAL seconds; poll /api/model to see it serving.
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    version = g.tenant.model_registry.promote_shadow()
+    if version is None:
+        return jsonify({"error": "No shadow model to promote."}), 409
+    return jsonify({**g.tenant.model_registry.status(), 'promotion_requested': version}), 202
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus scrape endpoint: request and stage latency histograms, and the
+    response cache hit rates and serving model of every open tenant. Left
+    outside the login, like any scrape target; keep it off the public network.
+    """
+    open_tenants = tenants.open_tenants()
+    cache_stats = [
+        ({'tenant': name, 'cache': cache_name}, cache.stats())
+        for name, tenant in open_tenants
+        for cache_name, cache in (('student_details', tenant.student_details_cache), ('notes', tenant.notes_cache))
+    ]
+    statuses = [({'tenant': name}, tenant.model_registry.status()) for name, tenant in open_tenants]
+
+    lines = metrics.render()
+    lines += format_metric('mentors_eye_cache_hits_total', 'counter', "Response cache hits.",
+                           [(labels, stats['hits']) for labels, stats in cache_stats])
+    lines += format_metric('mentors_eye_cache_misses_total', 'counter', "Response cache misses.",
+                           [(labels, stats['misses']) for labels, stats in cache_stats])
+    lines += format_metric('mentors_eye_cache_hit_rate', 'gauge', "Fraction of cache lookups that hit.",
+                           [(labels, stats['hit_rate']) for labels, stats in cache_stats])
+    lines += format_metric('mentors_eye_cache_entries', 'gauge', "Entries currently cached.",
+                           [(labels, stats['size']) for labels, stats in cache_stats])
+    lines += format_metric('mentors_eye_model_info', 'gauge', "The serving model (always 1), labelled with its version.",
+                           [({**labels, 'version': status['version'], 'model_type': status['model_type'],
+                              'shadow_version': status['shadow_version'] or ''}, 1) for labels, status in statuses])
+    lines += format_metric('mentors_eye_model_swaps_total', 'counter', "Models swapped in since the tenant was opened.",
+                           [(labels, status['swaps']) for labels, status in statuses])
+    lines += format_metric('mentors_eye_tenant_memory_bytes', 'gauge', "Estimated memory used by an open tenant.",
+                           [({'tenant': name}, tenant.memory_bytes()) for name, tenant in open_tenants])
+    lines += format_metric('mentors_eye_tenant_opens_total', 'counter', "Tenants opened since startup.",
+                           [({}, tenants.opens)])
+    lines += format_metric('mentors_eye_tenant_evictions_total', 'counter', "Idle tenants closed to stay within the memory budget.",
+                           [({}, tenants.evictions)])
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# --- Scoring Jobs ---
+@app.route('/api/scoring_jobs', methods=['GET', 'POST'])
+def scoring_jobs():
+    """
+    GET lists recent rescoring jobs. POST queues one; the JSON body may hold
+    'student_ids' (omit for the whole cohort), 'model_version' and 'force'.
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    conn = get_db_connection()
+    if request.method == 'GET':
+        return jsonify(list_scoring_jobs(conn, limit=request.args.get('limit', 20, type=int)))
+
+    data = request.get_json(silent=True) or {}
+    student_ids = data.get('student_ids')
+    if student_ids is not None and (not isinstance(student_ids, list) or not all(isinstance(i, str) for i in student_ids)):
+        return jsonify({"error": "'student_ids' must be a list of StudentIDs."}), 400
+
+    job_id = enqueue_scoring_job(conn, student_ids, data.get('model_version'), data.get('force'))
+    g.tenant.scoring_worker.notify()
+    return jsonify(get_scoring_job(conn, job_id)), 202
+
+@app.route('/api/scoring_jobs/<int:job_id>')
+def scoring_job_status(job_id):
+    """Returns a job's status and progress ('processed' of 'total' records)."""
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = get_scoring_job(get_db_connection(), job_id)
+    if job is None:
+        return jsonify({"error": "Scoring job not found"}), 404
+    return jsonify(job)
+
+# --- Exports ---
+@app.route('/api/export')
+def export_cohort():
+    """
+    Streams the scored cohort as CSV, highest dropout probability first, with
+    the same filter parameters as /api/students. Rows are written page by page
+    as they are read, so memory use does not grow with the cohort. For very
+    large cohorts or XLSX, queue a job with POST /api/exports instead.
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    if request.args.get('format', 'csv') != 'csv':
+        return jsonify({"error": "Only CSV is streamed; queue other formats with POST /api/exports."}), 400
+
+    loaded = g.tenant.model_registry.get()
+    if loaded is None:
+        return jsonify({"error": "Model artifacts not loaded."}), 500
+    try:
+        filters = parse_student_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    class_names = loaded.label_encoder.classes_
+    rows = iter_export_rows(get_db_connection(), loaded.version, class_names, filters)
+    return Response(stream_with_context(iter_csv(export_header(class_names), rows)), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename="cohort-export.csv"'})
+
+@app.route('/api/exports', methods=['GET', 'POST'])
+def export_jobs():
+    """
+    GET lists recent export jobs. POST queues one; the JSON body may hold
+    'format' (csv or xlsx) and 'filters' (the /api/students filter parameters).
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    conn = get_db_connection()
+    if request.method == 'GET':
+        return jsonify(list_export_jobs(conn, limit=request.args.get('limit', 20, type=int)))
+
+    loaded = g.tenant.model_registry.get()
+    if loaded is None:
+        return jsonify({"error": "Model artifacts not loaded."}), 500
+    data = request.get_json(silent=True) or {}
+    export_format = data.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"'format' must be one of {list(EXPORT_FORMATS)}."}), 400
+    if not isinstance(data.get('filters', {}), dict):
+        return jsonify({"error": "'filters' must be an object."}), 400
+    try:
+        filters = parse_student_filters(data.get('filters', {}))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job_id = enqueue_export_job(conn, export_format, loaded.version, filters)
+    g.tenant.export_worker.notify()
+    return jsonify(get_export_job(conn, job_id)), 202
+
+@app.route('/api/exports/<int:job_id>')
+def export_job_status(job_id):
+    """Returns an export job's status and progress ('processed' rows written)."""
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = get_export_job(get_db_connection(), job_id)
+    if job is None:
+        return jsonify({"error": "Export job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/exports/<int:job_id>/download')
+def download_export(job_id):
+    """Downloads a finished export's file."""
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = get_export_job(get_db_connection(), job_id)
+    if job is None:
+        return jsonify({"error": "Export job not found"}), 404
+    if job['status'] != 'done':
+        return jsonify({"error": f"Export job is {job['status']}."}), 409
+    if not os.path.exists(job['path']):
+        return jsonify({"error": "The export file has been removed."}), 410
+    return send_file(os.path.abspath(job['path']), as_attachment=True, download_name=os.path.basename(job['path']))
+
+# --- Live Updates ---
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+@app.route('/api/events')
+def stream_events():
+    """
+    Streams change events as Server-Sent Events: 'risk' (a student's new level,
+    probabilities and added/removed factors), 'record' (a student's records were
+    ingested or corrected), 'note' and 'model'. A reconnecting
+    client gets the events it missed via Last-Event-ID, or a 'reset' event if
+    too many were missed to replay.
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    # An open stream does not keep its tenant open: if the tenant is closed,
+    # the stream ends with a 'reset' and the client reconnects, reopening it.
+    tenant = g.pop('tenant')
+    tenants.release(tenant.name)
+    # Subscribed before the replay is read, so no event falls between the two.
+    subscriber = tenant.event_broadcaster.subscribe()
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            last_sent = 0
+            if last_event_id and last_event_id.isdigit():
+                # Read on a connection of its own, closed before the subscriber
+                # loop, since the tenant (and its pool) may be closed meanwhile.
+                conn = sqlite3.connect(tenant.db_file)
+                try:
+                    oldest = conn.execute('SELECT MIN(id) FROM change_events').fetchone()[0]
+                    missed = fetch_events_after(conn, int(last_event_id), SUBSCRIBER_QUEUE_SIZE)
+                finally:
+                    conn.close()
+                if len(missed) == SUBSCRIBER_QUEUE_SIZE or (oldest is not None and oldest > int(last_event_id) + 1):
+                    # Pruned or too many to replay; the client reloads its list instead.
+                    yield "event: reset\ndata: {}\n\n"
+                    missed = []
+                for event in missed:
+                    yield format_sse(event)
+                    last_sent = event['id']
+
+            while True:
+                try:
+                    event = subscriber.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                if event['id'] > last_sent:
+                    yield format_sse(event)
+        finally:
+            tenant.event_broadcaster.unsubscribe(subscriber)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # --- Note Taking API Endpoints ---
 @app.route('/add_note', methods=['POST'])
 def add_note():
@@ -127,10 +770,10 @@ def add_note():
     data = request.json
     try:
         conn = get_db_connection()
-        conn.execute('INSERT INTO notes (student_id, mentor_name, note_text) VALUES (?, ?, ?)',
-                     (data['student_id'], data['mentor_name'], data['note_text']))
-        conn.commit()
-        conn.close()
+        insert_note(conn, data['student_id'], data['mentor_name'], data['note_text'])
+        # Only this student's notes list is now stale.
+        g.tenant.notes_cache.invalidate(data['student_id'])
+        publish_event(conn, 'note', data['student_id'], {'StudentID': data['student_id'], 'mentor_name': data['mentor_name']})
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -139,20 +782,64 @@ def add_note():
 def get_notes(student_id):
     if 'user_email' not in session:
         return jsonify({"error": "Unauthorized"}), 401
+
+    cached_notes = g.tenant.notes_cache.get(student_id)
+    if cached_notes is not None:
+        return jsonify(cached_notes)
+
     try:
-        conn = get_db_connection()
-        notes_cursor = conn.execute('SELECT * FROM notes WHERE student_id = ? ORDER BY timestamp DESC', (student_id,))
-        notes = [dict(row) for row in notes_cursor.fetchall()]
-        conn.close()
+        notes = fetch_notes(get_db_connection(), student_id)
+        g.tenant.notes_cache.set(student_id, notes)
         return jsonify(notes)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/search_notes')
+def search_notes_endpoint():
+    """
+    Full-text search across all mentor notes, best match first.
+    Query parameters: q (words, "phrases" or prefix*), page (from 1), limit
+    and student_id (only that student's notes).
+    """
+    if 'user_email' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    args = request.args
+    query = args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing search query 'q'."}), 400
+    page = max(1, args.get('page', 1, type=int))
+    limit = max(1, min(args.get('limit', NOTES_SEARCH_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+
+    try:
+        with time_stage('db_query'):
+            results, total = search_notes(get_db_connection(), query, limit, (page - 1) * limit,
+                                          student_id=args.get('student_id') or None)
+    except sqlite3.OperationalError as e:
+        # The FTS5 index is missing (an old database, or SQLite without FTS5).
+        return jsonify({"error": f"Note search is unavailable: {e}. Run 'python database_setup.py'."}), 503
+
+    return jsonify({
+        'query': query,
+        'page': page,
+        'limit': limit,
+        'total': total,
+        'has_more': page * limit < total,
+        'results': results,
+    })
+
+print(f"--- App initialised in {(time.perf_counter() - _import_started) * 1000:.0f} ms"
+      f"{' (models warm up in background when a tenant is opened)' if WARM_UP_MODEL else ' (models load on first request)'}. ---")
+
 if __name__ == '__main__':
-    if not os.path.exists(DB_FILE):
-        print(f"🛑 FATAL ERROR: Database file '{DB_FILE}' not found. Please run 'database_setup.py' and 'migrate_data.py' first.")
-    elif model is None:
-         print(f"🛑 FATAL ERROR: Model not loaded. Please ensure '{MODEL_FILE}' exists.")
-    else:
+    missing = []
+    for config in tenant_registry.configs().values():
+        if not os.path.exists(tenant_path(config, DB_FILE)):
+            missing.append(f"Database file '{tenant_path(config, DB_FILE)}' not found. "
+                           f"Please run 'database_setup.py' and 'migrate_data.py' first.")
+        elif not os.path.exists(tenant_path(config, MODEL_FILE)):
+            missing.append(f"Model not found. Please ensure '{tenant_path(config, MODEL_FILE)}' exists.")
+    for problem in missing:
+        print(f"🛑 FATAL ERROR: {problem}")
+    if not missing:
         app.run(debug=True)
-
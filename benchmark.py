@@ -0,0 +1,248 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# --- Configuration ---
+RESULTS_FILE = 'benchmark_results.json'
+DEFAULT_STUDENTS = 10000
+DEFAULT_PERIODS = 4
+DEFAULT_SAMPLES = 200
+DEFAULT_SEED = 42
+BENCHMARK_USER = 'mentor@college.edu'
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- Peak Memory ---
+# Linux can reset a process's high-water mark, which gives a peak RSS per
+# stage; elsewhere the process-wide peak from getrusage is reported instead.
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def get_peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# --- Measurement ---
+def summarize(latencies, items_per_call=1):
+    """
+    Returns latency percentiles (ms) and throughput for a list of per-call durations (s).
+
+    Args:
+        latencies (list): Seconds taken by each call.
+        items_per_call (int): Rows processed per call, for the throughput figure.
+    """
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        'calls': len(latencies),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'mean_ms': float(latencies_ms.mean()),
+        'throughput_per_s': float(len(latencies) * items_per_call / max(latencies_ms.sum() / 1000, 1e-9)),
+    }
+
+def run_stage(name, results, function, quiet=True):
+    """Runs one stage, recording its result plus the stage's peak RSS, and prints a summary line."""
+    reset_peak_rss()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        result = function()
+    result['peak_rss_mb'] = round(get_peak_rss_mb(), 1)
+    results[name] = result
+
+    if 'p50_ms' in result:
+        print(f"{name:<32} p50 {result['p50_ms']:>9.2f} ms   p95 {result['p95_ms']:>9.2f} ms   "
+              f"{result['throughput_per_s']:>11,.0f}/s   peak {result['peak_rss_mb']:>7.1f} MB")
+    else:
+        print(f"{name:<32} {result['seconds']:>9.2f} s{'':>37}peak {result['peak_rss_mb']:>7.1f} MB")
+    return result
+
+def time_once(function):
+    start_time = time.perf_counter()
+    function()
+    return {'seconds': time.perf_counter() - start_time}
+
+def time_calls(function, arguments, items_per_call=1):
+    latencies = []
+    for argument in arguments:
+        start_time = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - start_time)
+    return summarize(latencies, items_per_call)
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- Benchmarks ---
+def run_benchmarks(num_students=DEFAULT_STUDENTS, num_periods=DEFAULT_PERIODS, samples=DEFAULT_SAMPLES,
+                   seed=DEFAULT_SEED, work_dir=None):
+    """
+    Builds a synthetic cohort in a scratch directory and times the hot paths
+    against it: data generation, training, migration, single-row and batch
+    inference (scikit-learn pipeline and compiled model), and the main routes
+    through the Flask test client.
+
+    Args:
+        num_students (int): Cohort size.
+        num_periods (int): Reporting periods per student.
+        samples (int): Calls per latency benchmark.
+        seed (int): Seed for the cohort and the sampled students.
+        work_dir (str): Scratch directory; a temporary one is used and removed if omitted.
+
+    Returns:
+        dict: {'meta': ..., 'results': {benchmark name: measurements}}.
+    """
+    owns_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='mentors_eye_bench_')
+    original_dir = os.getcwd()
+    # The scripts use paths relative to the working directory, so they are run inside the scratch directory.
+    os.chdir(work_dir)
+    os.environ['MODEL_WARMUP'] = '0'
+    os.environ['MODEL_WATCH_INTERVAL'] = '0'
+
+    results = {}
+    try:
+        import database_setup
+        import train_model
+        import migrate_data
+        from generate_synthetic_data import generate_synthetic_data
+
+        print(f"--- Benchmarking {num_students} students x {num_periods} periods in '{work_dir}' ---")
+
+        # --- Pipeline Scripts ---
+        run_stage('generate_data', results, lambda: time_once(
+            lambda: generate_synthetic_data(num_students, num_periods, train_model.DATA_FILE, seed)))
+        run_stage('train_holistic_model', results, lambda: time_once(train_model.train_holistic_model))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database_setup.create_tables()
+        run_stage('migrate_data_to_db', results, lambda: time_once(migrate_data.migrate_data_to_db))
+
+        # --- Inference ---
+        import joblib
+        from compiled_model import load_compiled_model
+        from db import ConnectionPool, fetch_latest_students
+        from predict import get_holistic_risk_profile, get_holistic_risk_profiles
+
+        pipeline = joblib.load(train_model.MODEL_FILE)
+        label_encoder = joblib.load(train_model.LABEL_ENCODER_FILE)
+        compiled = load_compiled_model()
+        latest_df = fetch_latest_students(ConnectionPool(train_model.DB_FILE).get_connection())
+
+        rng = random.Random(seed)
+        sample_rows = [latest_df.iloc[[rng.randrange(len(latest_df))]] for _ in range(samples)]
+        batch_calls = max(3, samples // 50)
+
+        for model_name, model, model_label_encoder in (('pipeline', pipeline, label_encoder), ('compiled', compiled, compiled.label_encoder)):
+            run_stage(f'risk_profile_single_{model_name}', results, lambda: time_calls(
+                lambda row: get_holistic_risk_profile(row, model, model_label_encoder), sample_rows))
+            run_stage(f'risk_profile_batch_{model_name}', results, lambda: time_calls(
+                lambda df: get_holistic_risk_profiles(df, model, model_label_encoder), [latest_df] * batch_calls, len(latest_df)))
+
+        # --- Routes ---
+        import app as app_module
+
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session['user_email'] = BENCHMARK_USER
+
+        def get(url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+        student_ids = latest_df['StudentID'].tolist()
+        sample_ids = [rng.choice(student_ids) for _ in range(samples)]
+
+        run_stage('dashboard_first_request', results, lambda: time_once(lambda: get('/')))
+        run_stage('dashboard', results, lambda: time_calls(get, ['/'] * samples))
+        run_stage('api_students_first_page', results, lambda: time_calls(get, ['/api/students'] * samples))
+
+        def get_uncached_details(student_id):
+            for _, tenant in app_module.tenants.open_tenants():
+                tenant.student_details_cache.clear()
+            get(f'/student/{student_id}')
+
+        run_stage('student_details_uncached', results, lambda: time_calls(get_uncached_details, sample_ids))
+        run_stage('student_details_cached', results, lambda: time_calls(lambda student_id: get(f'/student/{student_id}'), sample_ids))
+    finally:
+        os.chdir(original_dir)
+        if owns_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': get_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'students': num_students,
+            'periods': num_periods,
+            'samples': samples,
+            'seed': seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+def compare_results(baseline, current):
+    """Prints the relative change of every shared metric between two result files."""
+    print(f"\n--- Compared with {baseline['meta'].get('commit')} ({baseline['meta']['students']} students) ---")
+    for name, measurements in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        key = 'p50_ms' if 'p50_ms' in measurements else 'seconds'
+        before, after = baseline['results'][name][key], measurements[key]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<32} {key:<8} {before:>10.2f} -> {after:>10.2f}   {change:>+7.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Mentor's Eye hot paths on a synthetic cohort.")
+    parser.add_argument('--students', type=int, default=DEFAULT_STUDENTS, help=f"Cohort size (default: {DEFAULT_STUDENTS}).")
+    parser.add_argument('--periods', type=int, default=DEFAULT_PERIODS, help=f"Reporting periods per student (default: {DEFAULT_PERIODS}).")
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES, help=f"Calls per latency benchmark (default: {DEFAULT_SAMPLES}).")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED}).")
+    parser.add_argument('--output', default=RESULTS_FILE, help=f"Where to write the JSON results (default: {RESULTS_FILE}).")
+    parser.add_argument('--compare', default=None, help="A previous results file to compare against.")
+    parser.add_argument('--work-dir', default=None, help="Keep the generated cohort, database and model in this directory.")
+    args = parser.parse_args()
+
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+    output_file = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    benchmark = run_benchmarks(args.students, args.periods, args.samples, args.seed, args.work_dir)
+    with open(output_file, 'w') as f:
+        json.dump(benchmark, f, indent=2)
+    print(f"-> Results saved to '{output_file}'.")
+
+    if baseline is not None:
+        compare_results(baseline, benchmark)
@@ -0,0 +1,302 @@
+import hashlib
+import weakref
+
+import joblib
+import numpy as np
+
+# --- Configuration ---
+MODEL_FILE = 'student_dropout_model.joblib'
+LABEL_ENCODER_FILE = 'label_encoder.joblib'
+COMPILED_MODEL_FILE = 'student_dropout_model.compiled.joblib'
+COMPILED_FORMAT_VERSION = 1
+
+# Rows are pushed through the forest in chunks of this size so the
+# (rows x trees) node matrix stays cache-sized for large batches.
+PREDICT_CHUNK_SIZE = 1024
+
+def get_file_digest(path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compile_pipeline(model_pipeline, label_encoder):
+    """
+    Flattens a trained pipeline into plain NumPy arrays for CompiledModel.
+    The MinMaxScaler becomes scale/offset arrays, the OneHotEncoder becomes its
+    category vocabularies, and every tree of the forest is concatenated into
+    one set of contiguous node arrays. Each node's two children are stored
+    side by side and leaves point to themselves, so all trees can be traversed
+    in lock-step for a fixed number of steps.
+
+    Args:
+        model_pipeline (Pipeline): The trained preprocessor + RandomForestClassifier pipeline.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+
+    Returns:
+        dict: The compiled artifact, without a source model digest.
+    """
+    preprocessor = model_pipeline.named_steps['preprocessor']
+    forest = model_pipeline.named_steps['classifier']
+
+    numerical_features, categorical_features, passthrough_features = [], [], []
+    scale, offset, categories = np.array([]), np.array([]), []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == 'num':
+            numerical_features = list(columns)
+            scale, offset = transformer.scale_, transformer.min_
+        elif name == 'cat':
+            categorical_features = list(columns)
+            categories = [[str(category) for category in column_categories] for column_categories in transformer.categories_]
+        elif name == 'remainder' and transformer == 'passthrough':
+            passthrough_features = [preprocessor.feature_names_in_[column] if isinstance(column, (int, np.integer)) else column for column in columns]
+        elif name != 'remainder' or transformer != 'drop':
+            raise ValueError(f"Cannot compile preprocessing step '{name}' ({transformer}).")
+
+    # --- Flatten the forest into contiguous node arrays ---
+    roots, children, feature, threshold, value = [], [], [], [], []
+    node_offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        roots.append(node_offset)
+        children.append(np.column_stack([
+            np.where(is_leaf, node_ids, tree.children_left),
+            np.where(is_leaf, node_ids, tree.children_right),
+        ]) + node_offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+
+        leaf_value = tree.value[:, 0, :]
+        normalizer = leaf_value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0] = 1
+        value.append(leaf_value / normalizer)
+
+        node_offset += tree.node_count
+
+    return {
+        'format_version': COMPILED_FORMAT_VERSION,
+        'source_model_digest': None,
+        'numerical_features': numerical_features,
+        'scale': np.ascontiguousarray(scale, dtype=np.float64),
+        'offset': np.ascontiguousarray(offset, dtype=np.float64),
+        'categorical_features': categorical_features,
+        'categories': categories,
+        'passthrough_features': passthrough_features,
+        'roots': np.asarray(roots, dtype=np.int32),
+        'children': np.ascontiguousarray(np.concatenate(children).ravel(), dtype=np.int32), # [left, right] per node
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'value': np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in forest.estimators_)),
+        'model_classes': np.asarray(forest.classes_),
+        'label_classes': [str(label) for label in label_encoder.classes_],
+    }
+
+def export_compiled_model(model_pipeline, label_encoder, output_file=COMPILED_MODEL_FILE, source_model_file=MODEL_FILE):
+    """
+    Compiles a trained pipeline (see compile_pipeline) and writes the artifact.
+
+    Args:
+        model_pipeline (Pipeline): The trained preprocessor + RandomForestClassifier pipeline.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+        output_file (str): Where to write the compiled artifact.
+        source_model_file (str): The joblib file model_pipeline was saved to; its
+            digest is recorded so stale compiled artifacts can be detected.
+
+    Returns:
+        dict: The exported artifact.
+    """
+    artifact = compile_pipeline(model_pipeline, label_encoder)
+    artifact['source_model_digest'] = get_file_digest(source_model_file)
+    joblib.dump(artifact, output_file)
+    return artifact
+
+class CompiledLabelEncoder:
+    """The subset of LabelEncoder used at serving time, backed by a plain array."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+
+    def inverse_transform(self, indices):
+        return self.classes_[np.asarray(indices, dtype=np.intp)]
+
+class CompiledModel:
+    """
+    A NumPy-only drop-in for the trained pipeline's predict_proba/predict.
+    It evaluates the preprocessing and all trees of the forest over a batch
+    with vectorized array operations and needs neither pandas nor scikit-learn.
+    """
+
+    def __init__(self, artifact):
+        self.numerical_features = list(artifact['numerical_features'])
+        self.categorical_features = list(artifact['categorical_features'])
+        self.passthrough_features = list(artifact['passthrough_features'])
+        self.scale = artifact['scale']
+        self.offset = artifact['offset']
+        self.categories = [np.asarray(column_categories, dtype=object) for column_categories in artifact['categories']]
+        self.roots = artifact['roots']
+        self.children = artifact['children']
+        self.feature = artifact['feature']
+        self.threshold = artifact['threshold']
+        self.value = artifact['value']
+        self.max_depth = artifact['max_depth']
+        self.classes_ = artifact['model_classes']
+        self.label_encoder = CompiledLabelEncoder(artifact['label_classes'])
+        self.source_model_digest = artifact['source_model_digest']
+
+        # The input feature each column of the design matrix was encoded from,
+        # so one-hot columns can be summed back into their categorical feature.
+        self.input_features = self.numerical_features + self.categorical_features + self.passthrough_features
+        column_owners = list(range(len(self.numerical_features)))
+        for i, column_categories in enumerate(self.categories):
+            column_owners += [len(self.numerical_features) + i] * len(column_categories)
+        column_owners += [len(self.numerical_features) + len(self.categorical_features) + i for i in range(len(self.passthrough_features))]
+        self._column_to_feature = np.zeros((len(column_owners), len(self.input_features)))
+        self._column_to_feature[np.arange(len(column_owners)), column_owners] = 1
+
+    def transform(self, columns):
+        """
+        Applies the scaler and one-hot encoder.
+
+        Args:
+            columns: A mapping of column name -> values (a DataFrame or a dict of lists).
+
+        Returns:
+            np.ndarray: The float32 design matrix the trees were trained on.
+        """
+        blocks = []
+        if self.numerical_features:
+            numerical = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in self.numerical_features])
+            blocks.append(numerical * self.scale + self.offset)
+        for name, column_categories in zip(self.categorical_features, self.categories):
+            values = np.asarray(columns[name], dtype=object)
+            # Unknown categories encode as all zeros, like handle_unknown='ignore'.
+            blocks.append((values[:, None] == column_categories[None, :]).astype(np.float64))
+        for name in self.passthrough_features:
+            blocks.append(np.asarray(columns[name], dtype=np.float64)[:, None])
+        # The trees compare float32 features against their thresholds.
+        return np.hstack(blocks).astype(np.float32)
+
+    def _forest_proba(self, X):
+        """Traverses every tree for every row of X at once and averages the leaf values."""
+        n_rows, n_features = X.shape
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes * 2 + go_right]
+        return self.value[nodes].mean(axis=1)
+
+    def predict_proba(self, columns):
+        """
+        Returns class probabilities, matching the pipeline's predict_proba.
+
+        Args:
+            columns: A mapping of column name -> values (a DataFrame or a dict of lists).
+
+        Returns:
+            np.ndarray: An (n_rows, n_classes) probability matrix.
+        """
+        X = self.transform(columns)
+        if X.shape[0] <= PREDICT_CHUNK_SIZE:
+            return self._forest_proba(X)
+        return np.vstack([self._forest_proba(X[start:start + PREDICT_CHUNK_SIZE]) for start in range(0, X.shape[0], PREDICT_CHUNK_SIZE)])
+
+    def predict(self, columns):
+        """Returns the predicted (encoded) class for each row."""
+        return self.classes_.take(np.argmax(self.predict_proba(columns), axis=1))
+
+    # --- Explanations ---
+    def _forest_contributions(self, X, class_index):
+        """
+        Walks the trees like _forest_proba and, at every split, credits the split
+        feature with the change in class_index's probability between the node
+        and the child taken. Leaves point to themselves, so their steps add 0.
+        """
+        n_rows, n_features = X.shape
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        class_value = self.value[:, class_index]
+        contributions = np.zeros(n_rows * n_features)
+        for _ in range(self.max_depth):
+            split_columns = row_offsets + self.feature[nodes]
+            go_right = flat_X[split_columns] > self.threshold[nodes]
+            next_nodes = self.children[nodes * 2 + go_right]
+            contributions += np.bincount(split_columns.ravel(), weights=(class_value[next_nodes] - class_value[nodes]).ravel(),
+                                         minlength=n_rows * n_features)
+            nodes = next_nodes
+        return contributions.reshape(n_rows, n_features) / len(self.roots)
+
+    def expected_value(self, class_index):
+        """The probability of class_index before any split is applied, shared by every row."""
+        return float(self.value[self.roots, class_index].mean())
+
+    def predict_contributions(self, columns, class_index):
+        """
+        Path-based tree contributions: the probability of class_index for each
+        row is split into expected_value(class_index) plus one contribution per
+        input feature, and the two add up to predict_proba exactly.
+
+        Args:
+            columns: A mapping of column name -> values (a DataFrame or a dict of lists).
+            class_index (int): The probability column to explain.
+
+        Returns:
+            np.ndarray: An (n_rows, len(input_features)) contribution matrix.
+        """
+        X = self.transform(columns)
+        contributions = np.vstack([self._forest_contributions(X[start:start + PREDICT_CHUNK_SIZE], class_index)
+                                   for start in range(0, max(X.shape[0], 1), PREDICT_CHUNK_SIZE)])
+        return contributions @ self._column_to_feature
+
+# Pipelines compiled only to be explained, kept for as long as the pipeline is alive.
+_explainers = weakref.WeakKeyDictionary()
+
+def get_explainer(model, label_encoder):
+    """
+    Returns a CompiledModel that can explain 'model': the model itself if it is
+    already compiled, otherwise a compiled copy of the pipeline (built once).
+    """
+    if isinstance(model, CompiledModel):
+        return model
+    explainer = _explainers.get(model)
+    if explainer is None:
+        explainer = CompiledModel(compile_pipeline(model, label_encoder))
+        _explainers[model] = explainer
+    return explainer
+
+def load_compiled_model(compiled_file=COMPILED_MODEL_FILE, source_model_file=MODEL_FILE, mmap_mode=None):
+    """
+    Loads a compiled model, provided it was exported from the current source model.
+
+    Args:
+        compiled_file (str): The compiled artifact written by export_compiled_model.
+        source_model_file (str): The joblib pipeline it must have been exported from.
+        mmap_mode (str): Passed to joblib.load to memory-map the node arrays.
+
+    Returns:
+        CompiledModel: The loaded model, or None if it is missing or stale.
+    """
+    try:
+        artifact = joblib.load(compiled_file, mmap_mode=mmap_mode)
+    except FileNotFoundError:
+        return None
+
+    if artifact.get('format_version') != COMPILED_FORMAT_VERSION:
+        return None
+    if artifact['source_model_digest'] != get_file_digest(source_model_file):
+        print(f"-> '{compiled_file}' is stale; re-run 'python compiled_model.py' or retrain to refresh it.")
+        return None
+    return CompiledModel(artifact)
+
+if __name__ == '__main__':
+    # Compiles the existing model artifacts without retraining.
+    export_compiled_model(joblib.load(MODEL_FILE), joblib.load(LABEL_ENCODER_FILE), COMPILED_MODEL_FILE, MODEL_FILE)
+    print(f"-> Compiled '{MODEL_FILE}' into '{COMPILED_MODEL_FILE}'.")
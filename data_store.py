@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from database_setup import RECORD_COLUMNS
+
+# --- Configuration ---
+DATA_FILE = 'master_student_data_historical.csv'
+CONVERT_CHUNK_SIZE = 500000
+ROW_GROUP_SIZE = 256 * 1024
+# Written into the dataset directory; the leading underscore keeps Arrow from reading it as data.
+SUMMARY_FILE = '_summary.json'
+
+# --- Record Schema ---
+# Declared once so that neither the CSV reader nor the columnar store has to
+# infer types. The low-cardinality text columns are categorical, which keeps
+# them small in memory and dictionary-encoded on disk.
+CATEGORICAL_COLUMNS = ['Branch', 'FeeStatus', 'HealthImpact']
+RECORD_DTYPES = {
+    'StudentID': str,
+    'AttendancePercentage': 'int64',
+    'AverageScore': 'float64',
+    'FeeStatus': 'category',
+    'LMS_Logins_Per_Week': 'int64',
+    'MidtermGrade': 'float64',
+    'ScholarshipHolder': 'int64',
+    'Target': str,
+    'Name': str,
+    'Email': str,
+    'Phone': str,
+    'Branch': 'category',
+    'Year': 'int64',
+    'FinancialStressScore': 'int64',
+    'HealthImpact': 'category',
+    'CareerConfidenceScore': 'int64',
+    'ReportingPeriod': 'int64',
+}
+
+def _import_pyarrow():
+    """pyarrow is optional: without it every reader falls back to the CSV files."""
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The columnar data store needs pyarrow: pip install pyarrow") from e
+    return pa, ds, pq
+
+def get_arrow_schema():
+    """Returns the Arrow schema matching RECORD_DTYPES, in RECORD_COLUMNS order."""
+    pa, _, _ = _import_pyarrow()
+    arrow_types = {'int64': pa.int64(), 'float64': pa.float64(), 'category': pa.dictionary(pa.int32(), pa.string())}
+    return pa.schema([(column, arrow_types.get(RECORD_DTYPES[column], pa.string())) for column in RECORD_COLUMNS])
+
+def get_columnar_path(csv_file):
+    """Returns where the columnar copy of a CSV file is stored."""
+    return os.path.splitext(csv_file)[0] + '.parquet'
+
+def convert_csv_to_parquet(csv_file=DATA_FILE, parquet_dir=None, chunk_size=CONVERT_CHUNK_SIZE):
+    """
+    Converts a master-data CSV into a Parquet dataset with the explicit record schema.
+    The CSV is streamed in chunks, so memory use is bounded by the chunk size.
+    The dataset is partitioned by ReportingPeriod (one directory per period),
+    so readers that only need recent periods skip the others entirely.
+
+    Args:
+        csv_file (str): The CSV to convert.
+        parquet_dir (str): Output directory. Defaults to get_columnar_path(csv_file).
+        chunk_size (int): Rows per chunk.
+
+    Returns:
+        int: The number of records converted.
+    """
+    pa, ds, _ = _import_pyarrow()
+    parquet_dir = parquet_dir or get_columnar_path(csv_file)
+    if not os.path.exists(csv_file):
+        print(f"FATAL ERROR: Data file '{csv_file}' not found.")
+        return 0
+
+    print(f"--- Converting '{csv_file}' to Parquet dataset '{parquet_dir}' ---")
+    start_time = time.perf_counter()
+
+    # Written next to the target and swapped in at the end, so readers never see a half-written dataset.
+    staging_dir = parquet_dir + '.tmp'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    schema = get_arrow_schema()
+    total_records = 0
+    latest_periods = pd.Series(dtype='int64')
+
+    def record_batches():
+        nonlocal total_records, latest_periods
+        for chunk_df in pd.read_csv(csv_file, dtype=RECORD_DTYPES, chunksize=chunk_size):
+            total_records += len(chunk_df)
+            chunk_latest = chunk_df.groupby('StudentID')['ReportingPeriod'].max()
+            latest_periods = pd.concat([latest_periods, chunk_latest]).groupby(level=0).max()
+            yield from pa.Table.from_pandas(chunk_df[RECORD_COLUMNS], schema=schema, preserve_index=False).to_batches()
+
+    # One streaming write, so each period ends up in a few large row groups
+    # instead of one small file per chunk and period.
+    ds.write_dataset(
+        record_batches(), staging_dir, schema=schema, format='parquet',
+        partitioning=ds.partitioning(pa.schema([('ReportingPeriod', pa.int64())]), flavor='hive'),
+        min_rows_per_group=ROW_GROUP_SIZE, max_rows_per_group=ROW_GROUP_SIZE * 2,
+    )
+    # Every student's latest record is in a period >= min_latest_period, so
+    # read_latest_records can skip the older partitions without scanning first.
+    with open(os.path.join(staging_dir, SUMMARY_FILE), 'w') as f:
+        json.dump({
+            'records': total_records,
+            'students': len(latest_periods),
+            'min_latest_period': int(latest_periods.min()) if len(latest_periods) else None,
+        }, f)
+
+    shutil.rmtree(parquet_dir, ignore_errors=True)
+    os.replace(staging_dir, parquet_dir)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"-> Converted {total_records} records in {elapsed:.2f}s.")
+    print("--- Conversion Complete ---")
+    return total_records
+
+def _use_columnar(csv_file):
+    """True if an up-to-date columnar copy of csv_file exists and pyarrow is available."""
+    parquet_dir = get_columnar_path(csv_file)
+    if not os.path.isdir(parquet_dir):
+        return False
+    if os.path.exists(csv_file) and os.path.getmtime(csv_file) > os.path.getmtime(parquet_dir):
+        print(f"-> '{parquet_dir}' is older than '{csv_file}'; reading the CSV. Re-run 'python data_store.py' to refresh it.")
+        return False
+    try:
+        _import_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+def _apply_dtypes(df):
+    """Casts a frame's columns to RECORD_DTYPES, e.g. after reading Parquet partitions."""
+    return df.astype({column: RECORD_DTYPES[column] for column in df.columns if column in RECORD_DTYPES})
+
+def read_records(csv_file=DATA_FILE, columns=None, min_period=None):
+    """
+    Reads master-data records, from the columnar copy when there is one.
+    With Parquet, only the requested columns are decoded and only the
+    partitions with ReportingPeriod >= min_period are opened.
+
+    Args:
+        csv_file (str): The master-data CSV (its columnar copy is found via get_columnar_path).
+        columns (list): Columns to read, in RECORD_COLUMNS order. All of them if omitted.
+        min_period (int): Only read records from this ReportingPeriod onwards.
+
+    Returns:
+        pd.DataFrame: The records, typed according to RECORD_DTYPES.
+    """
+    columns = RECORD_COLUMNS if columns is None else [column for column in RECORD_COLUMNS if column in columns]
+
+    if _use_columnar(csv_file):
+        pa, ds, _ = _import_pyarrow()
+        dataset = ds.dataset(get_columnar_path(csv_file), format='parquet',
+                             partitioning=ds.partitioning(pa.schema([('ReportingPeriod', pa.int64())]), flavor='hive'))
+        row_filter = None if min_period is None else ds.field('ReportingPeriod') >= min_period
+        return _apply_dtypes(dataset.to_table(columns=columns, filter=row_filter).to_pandas())
+
+    usecols = columns if min_period is None or 'ReportingPeriod' in columns else columns + ['ReportingPeriod']
+    df = pd.read_csv(csv_file, usecols=usecols, dtype={column: RECORD_DTYPES[column] for column in usecols})
+    if min_period is not None:
+        df = df[df['ReportingPeriod'] >= min_period]
+    return df[columns].reset_index(drop=True)
+
+def read_latest_records(csv_file=DATA_FILE, columns=None):
+    """
+    Reads the most recent record of every student, sorted by StudentID.
+    With Parquet, only the periods that can hold someone's latest record are
+    read, using the summary written by convert_csv_to_parquet.
+
+    Args:
+        csv_file (str): The master-data CSV (or the base name of its columnar copy).
+        columns (list): Columns to return. StudentID and ReportingPeriod are always included.
+
+    Returns:
+        pd.DataFrame: One row per student.
+    """
+    columns = RECORD_COLUMNS if columns is None else list(columns)
+    columns = [column for column in RECORD_COLUMNS if column in columns or column in ('StudentID', 'ReportingPeriod')]
+
+    min_period = None
+    if _use_columnar(csv_file):
+        summary_file = os.path.join(get_columnar_path(csv_file), SUMMARY_FILE)
+        if os.path.exists(summary_file):
+            with open(summary_file) as f:
+                min_period = json.load(f)['min_latest_period']
+        else:
+            periods_df = read_records(csv_file, columns=['StudentID', 'ReportingPeriod'])
+            min_period = int(periods_df.groupby('StudentID')['ReportingPeriod'].max().min())
+
+    df = read_records(csv_file, columns=columns, min_period=min_period)
+    latest_df = df.loc[df.groupby('StudentID')['ReportingPeriod'].idxmax()]
+    return latest_df.sort_values('StudentID').reset_index(drop=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a Mentor's Eye master-data CSV into a columnar Parquet dataset.")
+    parser.add_argument('csv_file', nargs='?', default=DATA_FILE, help=f"CSV to convert (default: {DATA_FILE}).")
+    parser.add_argument('--output', default=None, help="Output dataset directory (default: the CSV name with a .parquet suffix).")
+    parser.add_argument('--chunk-size', type=int, default=CONVERT_CHUNK_SIZE, help=f"Rows per chunk (default: {CONVERT_CHUNK_SIZE}).")
+    args = parser.parse_args()
+
+    convert_csv_to_parquet(args.csv_file, args.output, args.chunk_size)
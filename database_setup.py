@@ -1,21 +1,124 @@
+import argparse
 import sqlite3
 
 DB_FILE = 'mentors_eye.db'
 
-def create_tables():
+# Columns of the flat, one-row-per-student-per-period record shape, in the
+# order the rest of the application (and the model) expects them.
+STUDENT_COLUMNS = ['StudentID', 'Name', 'Email', 'Phone', 'Branch', 'Year', 'Target']
+METRIC_COLUMNS = [
+    'StudentID', 'ReportingPeriod', 'AttendancePercentage', 'AverageScore', 'FeeStatus',
+    'LMS_Logins_Per_Week', 'MidtermGrade', 'ScholarshipHolder',
+    'FinancialStressScore', 'HealthImpact', 'CareerConfidenceScore'
+]
+RECORD_COLUMNS = [
+    'StudentID', 'AttendancePercentage', 'AverageScore', 'FeeStatus', 'LMS_Logins_Per_Week',
+    'MidtermGrade', 'ScholarshipHolder', 'Target', 'Name', 'Email', 'Phone', 'Branch', 'Year',
+    'FinancialStressScore', 'HealthImpact', 'CareerConfidenceScore', 'ReportingPeriod'
+]
+
+def _drop_legacy_students_table(cursor):
+    """
+    Older databases stored every period in a flat 'students' table (created by
+    pandas' to_sql). That layout is replaced by the normalized tables below, so
+    it is dropped here; migrate_data.py repopulates the data from the CSV.
+    """
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(students)")]
+    if 'ReportingPeriod' in columns:
+        cursor.execute("DROP TABLE students")
+        print("-> Dropped legacy flat 'students' table.")
+
+def fts5_available(conn):
+    """FTS5 is compiled into most SQLite builds, but it is optional; without it notes are not searchable."""
+    return any(row[0] == 'ENABLE_FTS5' for row in conn.execute('PRAGMA compile_options'))
+
+def create_notes_search_index(cursor):
+    """
+    Creates 'notes_fts', a full-text index over the notes, and the triggers that
+    keep it in sync with every insert, update and delete. It is an
+    external-content table: only the index is stored, the text stays in 'notes'.
+    Existing notes are indexed when the table is first created.
+
+    Returns:
+        bool: False if this SQLite build has no FTS5.
+    """
+    if not fts5_available(cursor.connection):
+        print("-> SQLite was built without FTS5; note search is disabled.")
+        return False
+
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone() is not None
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            note_text, mentor_name,
+            content='notes', content_rowid='id',
+            tokenize='porter unicode61'
+        );
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, note_text, mentor_name) VALUES (new.id, new.note_text, new.mentor_name);
+        END;
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, note_text, mentor_name) VALUES ('delete', old.id, old.note_text, old.mentor_name);
+        END;
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, note_text, mentor_name) VALUES ('delete', old.id, old.note_text, old.mentor_name);
+            INSERT INTO notes_fts(rowid, note_text, mentor_name) VALUES (new.id, new.note_text, new.mentor_name);
+        END;
+    ''')
+    if not exists:
+        rebuild_notes_search_index(cursor)
+    return True
+
+def rebuild_notes_search_index(cursor):
+    """Re-indexes every note from scratch, e.g. after notes were bulk-loaded with the triggers missing."""
+    cursor.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO notes_fts(notes_fts) VALUES ('optimize')")
+
+def create_tables(conn=None):
     """
-    Sets up the database tables. This should be run once.
-    This new version includes a 'students' table for all student data.
+    Sets up the database tables. This is safe to run repeatedly.
+    Student data is normalized into a 'students' dimension table and a
+    per-period 'student_period_metrics' table. 'latest_student_state' holds a
+    materialized copy of each student's most recent period for the dashboard.
+
+    Args:
+        conn (sqlite3.Connection): An open connection to use. If omitted, DB_FILE is opened.
     """
-    conn = sqlite3.connect(DB_FILE)
+    owns_connection = conn is None
+    if owns_connection:
+        conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
 
-    # --- Students Table ---
-    # This table will store all historical data for each student
+    # WAL lets the dashboard keep reading while migrations and note writes happen.
+    cursor.execute('PRAGMA journal_mode=WAL;')
+
+    _drop_legacy_students_table(cursor)
+
+    # --- Students Dimension Table ---
+    # One row per student with attributes that do not change between periods.
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS students (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            StudentID TEXT NOT NULL,
+            StudentID TEXT PRIMARY KEY,
+            Name TEXT,
+            Email TEXT,
+            Phone TEXT,
+            Branch TEXT,
+            Year INTEGER,
+            Target TEXT
+        );
+    ''')
+
+    # --- Per-Period Metrics Table ---
+    # The composite primary key is the (StudentID, ReportingPeriod) index used
+    # by history lookups and prevents duplicate records for the same period.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_period_metrics (
+            StudentID TEXT NOT NULL REFERENCES students(StudentID),
             ReportingPeriod INTEGER NOT NULL,
             AttendancePercentage INTEGER,
             AverageScore REAL,
@@ -23,13 +126,53 @@ def create_tables():
             LMS_Logins_Per_Week INTEGER,
             MidtermGrade REAL,
             ScholarshipHolder INTEGER,
+            FinancialStressScore INTEGER,
+            HealthImpact TEXT,
+            CareerConfidenceScore INTEGER,
+            PRIMARY KEY (StudentID, ReportingPeriod)
+        ) WITHOUT ROWID;
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_period ON student_period_metrics(ReportingPeriod);')
+
+    # --- Flat Record View ---
+    # The denormalized shape that the model and the API work with.
+    cursor.execute(f'''
+        CREATE VIEW IF NOT EXISTS student_records AS
+        SELECT {', '.join(('s.' if column in STUDENT_COLUMNS[1:] else 'm.') + column for column in RECORD_COLUMNS)}
+        FROM student_period_metrics m
+        JOIN students s ON s.StudentID = m.StudentID;
+    ''')
+
+    # --- Materialized Latest State ---
+    # One row per student holding their most recent period, so the dashboard
+    # never has to aggregate over the whole history.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS latest_student_state (
+            StudentID TEXT PRIMARY KEY,
+            AttendancePercentage INTEGER,
+            AverageScore REAL,
+            FeeStatus TEXT,
+            LMS_Logins_Per_Week INTEGER,
+            MidtermGrade REAL,
+            ScholarshipHolder INTEGER,
             Target TEXT,
+            Name TEXT,
             Email TEXT,
             Phone TEXT,
-            UNIQUE(StudentID, ReportingPeriod) -- Ensures no duplicate records for the same period
+            Branch TEXT,
+            Year INTEGER,
+            FinancialStressScore INTEGER,
+            HealthImpact TEXT,
+            CareerConfidenceScore INTEGER,
+            ReportingPeriod INTEGER NOT NULL
         );
     ''')
 
+    # --- Trend Analytics ---
+    # Per-student deltas, slopes and rolling statistics, filled in by trends.py.
+    from trends import create_student_trends_table
+    create_student_trends_table(conn)
+
     # --- Notes Table (unchanged) ---
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS notes (
@@ -40,11 +183,28 @@ def create_tables():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         );
     ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_student_time ON notes(student_id, timestamp);')
+
+    # --- Notes Search Index ---
+    create_notes_search_index(cursor)
 
     conn.commit()
-    conn.close()
-    print(f"Database '{DB_FILE}' and tables ('students', 'notes') are set up successfully.")
+    if owns_connection:
+        conn.close()
+        print(f"Database '{DB_FILE}' and tables ('students', 'student_period_metrics', 'latest_student_state', 'notes') are set up successfully.")
 
 if __name__ == '__main__':
-    create_tables()
+    parser = argparse.ArgumentParser(description="Set up the Mentor's Eye database tables.")
+    parser.add_argument('--rebuild-notes-index', action='store_true', help="Re-index every existing note for full-text search.")
+    args = parser.parse_args()
 
+    if args.rebuild_notes_index:
+        conn = sqlite3.connect(DB_FILE)
+        if create_notes_search_index(conn.cursor()):
+            rebuild_notes_search_index(conn.cursor())
+            conn.commit()
+            count = conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0]
+            print(f"-> Re-indexed {count} notes for search.")
+        conn.close()
+    else:
+        create_tables()
@@ -0,0 +1,250 @@
+import html
+import re
+import sqlite3
+import threading
+
+from metrics import time_stage
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+
+# Tuned for many concurrent readers and occasional small writes (notes).
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',      # Readers never block on the writer
+    'synchronous': 'NORMAL',    # Safe with WAL, avoids an fsync per commit
+    'cache_size': -64000,       # 64 MB page cache per connection
+    'mmap_size': 268435456,     # Memory-map up to 256 MB of the database file
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,       # Wait up to 5 s for a lock instead of failing
+}
+# sqlite3 keeps this many compiled statements per connection. Because pooled
+# connections live for the whole process, every query below is prepared once.
+CACHED_STATEMENTS = 256
+
+# --- Queries ---
+# Every route goes through these parameterized statements.
+LATEST_STUDENTS_QUERY = "SELECT * FROM latest_student_state ORDER BY StudentID"
+STUDENT_HISTORY_QUERY = "SELECT * FROM student_records WHERE StudentID = ? ORDER BY ReportingPeriod"
+INSERT_NOTE_QUERY = "INSERT INTO notes (student_id, mentor_name, note_text) VALUES (?, ?, ?)"
+STUDENT_NOTES_QUERY = "SELECT * FROM notes WHERE student_id = ? ORDER BY timestamp DESC"
+# Walks idx_risk_scores_rank in order, so a page costs the same however large the cohort is.
+STUDENT_PAGE_QUERY = """
+    SELECT l.StudentID, l.Name, l.Branch, l.Year, l.FeeStatus, l.ReportingPeriod,
+           r.level, r.probabilities, r.factor_bitmask, r.dropout_probability,
+           t.attendance_delta, t.score_delta, t.trend_bitmask
+    FROM risk_scores r
+    JOIN latest_student_state l ON l.StudentID = r.StudentID AND l.ReportingPeriod = r.ReportingPeriod
+    LEFT JOIN student_trends t ON t.StudentID = r.StudentID
+    WHERE r.model_version = ?{conditions}
+    ORDER BY r.dropout_probability DESC, r.StudentID
+    LIMIT ?
+"""
+# Ranked by bm25 over the FTS5 index, with note text weighted above the mentor's name.
+# \x02 and \x03 mark matched terms in the snippet; search_notes turns them into <mark> tags.
+SEARCH_NOTES_QUERY = """
+    SELECT n.id, n.student_id, s.Name AS student_name, n.mentor_name, n.timestamp,
+           snippet(notes_fts, 0, char(2), char(3), '…', 16) AS snippet
+    FROM notes_fts
+    JOIN notes n ON n.id = notes_fts.rowid
+    LEFT JOIN students s ON s.StudentID = n.student_id
+    WHERE notes_fts MATCH ? AND notes_fts.rowid >= ?{conditions}
+    ORDER BY bm25(notes_fts, 10.0, 1.0), n.id DESC
+    LIMIT ? OFFSET ?
+"""
+SEARCH_NOTES_COUNT_QUERY = "SELECT COUNT(*) FROM notes_fts WHERE notes_fts MATCH ?"
+SEARCH_STUDENT_NOTES_COUNT_QUERY = """
+    SELECT COUNT(*) FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+    WHERE notes_fts MATCH ? AND n.student_id = ?
+"""
+# The rowid of the Nth most recent match. Finding matches is cheap, but bm25
+# has to be computed for every match it ranks, so a very common word across
+# years of notes would cost hundreds of milliseconds to rank in full.
+RANKING_WINDOW_QUERY = "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?"
+# Searches rank at most this many of the most recent matches (more when paging past them).
+MAX_RANKED_MATCHES = 5000
+BRANCHES_QUERY = "SELECT DISTINCT Branch FROM students WHERE Branch IS NOT NULL ORDER BY Branch"
+YEARS_QUERY = "SELECT DISTINCT Year FROM students WHERE Year IS NOT NULL ORDER BY Year"
+
+class ConnectionPool:
+    """
+    Hands out one long-lived SQLite connection per thread.
+    Connections are opened lazily, configured with CONNECTION_PRAGMAS and the
+    sqlite3.Row factory, and reused for every request served by that thread,
+    which makes the pool safe under a multi-threaded WSGI server.
+    """
+
+    def __init__(self, db_file=DB_FILE, pragmas=None):
+        self.db_file = db_file
+        self.pragmas = CONNECTION_PRAGMAS if pragmas is None else pragmas
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get_connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_all(self):
+        """Closes every connection the pool has opened, e.g. at shutdown."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+# pandas is only imported by the functions that build DataFrames, so that the
+# note endpoints can use this module without loading it.
+def fetch_latest_students(conn):
+    """Returns the latest record of every student as a DataFrame."""
+    import pandas as pd
+    return pd.read_sql_query(LATEST_STUDENTS_QUERY, conn)
+
+def fetch_student_history(conn, student_id):
+    """Returns all of a student's records, oldest period first, as a DataFrame."""
+    import pandas as pd
+    # Timed as two stages, so slow SQL and slow DataFrame construction can be told apart.
+    with time_stage('db_query'):
+        cursor = conn.execute(STUDENT_HISTORY_QUERY, (student_id,))
+        rows = cursor.fetchall()
+    with time_stage('dataframe_build'):
+        return pd.DataFrame.from_records([tuple(row) for row in rows], columns=[column[0] for column in cursor.description],
+                                         coerce_float=True)
+
+def insert_note(conn, student_id, mentor_name, note_text):
+    """Adds a mentor note. The transaction is rolled back if the insert fails."""
+    with conn:
+        conn.execute(INSERT_NOTE_QUERY, (student_id, mentor_name, note_text))
+
+def fetch_notes(conn, student_id):
+    """Returns a student's notes, newest first, as a list of dicts."""
+    return [dict(row) for row in conn.execute(STUDENT_NOTES_QUERY, (student_id,))]
+
+def build_fts_query(text):
+    """
+    Turns free text typed by a mentor into a safe FTS5 query: every word must
+    match (porter-stemmed), "quoted phrases" match as phrases, and a trailing
+    '*' makes a word a prefix. FTS5 operators in the input are treated as
+    plain text, so no input can raise a syntax error.
+
+    Returns:
+        str: The MATCH expression, or '' if the text has no searchable words.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|([^\s"]+)', text):
+        prefix = word.endswith('*')
+        value = ' '.join(re.findall(r'\w+', phrase or word))
+        if value:
+            terms.append('"' + value + '"' + ('*' if prefix and not phrase else ''))
+    return ' '.join(terms)
+
+def search_notes(conn, text, limit=20, offset=0, student_id=None):
+    """
+    Full-text search across every mentor note, best match first.
+
+    Args:
+        conn (sqlite3.Connection): A pooled connection.
+        text (str): What to search for (see build_fts_query).
+        limit (int): Results per page.
+        offset (int): Results to skip.
+        student_id (str): Only search this student's notes.
+
+    Returns:
+        tuple: (results, total). Each result is a dict whose 'snippet' is
+        HTML-escaped text with the matched terms wrapped in <mark>. 'total'
+        counts every match, even though only the most recent
+        MAX_RANKED_MATCHES are ranked when searching all students.
+    """
+    match = build_fts_query(text)
+    if not match:
+        return [], 0
+
+    conditions = ''
+    if student_id is not None:
+        # One student's notes are few enough to rank in full.
+        min_rowid = 0
+        conditions = '\n      AND n.student_id = ?'
+        total = conn.execute(SEARCH_STUDENT_NOTES_COUNT_QUERY, (match, student_id)).fetchone()[0]
+    else:
+        window = MAX_RANKED_MATCHES * -(-(offset + limit) // MAX_RANKED_MATCHES)
+        window_start = conn.execute(RANKING_WINDOW_QUERY, (match, window - 1)).fetchone()
+        min_rowid = window_start[0] if window_start else 0
+        total = conn.execute(SEARCH_NOTES_COUNT_QUERY, (match,)).fetchone()[0]
+
+    params = [match, min_rowid] + ([student_id] if student_id is not None else [])
+    results = []
+    for row in conn.execute(SEARCH_NOTES_QUERY.format(conditions=conditions), params + [limit, offset]):
+        result = dict(row)
+        result['snippet'] = html.escape(result['snippet']).replace('\x02', '<mark>').replace('\x03', '</mark>')
+        results.append(result)
+    return results, total
+
+def fetch_student_page(conn, model_version, limit, after=None, level=None, branch=None, year=None,
+                       fee_status=None, factor_bit=None, trend_bit=None, search=None):
+    """
+    Returns one page of the cohort, highest dropout probability first.
+    Pagination is keyset-based: pass the (dropout_probability, StudentID) of
+    the last row of the previous page as 'after' to get the next page.
+
+    Args:
+        conn (sqlite3.Connection): A pooled connection.
+        model_version (str): Only scores from this model version are listed.
+        limit (int): Maximum number of rows to return.
+        after (tuple): (dropout_probability, StudentID) cursor, or None for the first page.
+        level (str): Only students with this predicted class.
+        branch (str): Only students in this Branch.
+        year (int): Only students in this Year.
+        fee_status (str): Only students with this FeeStatus.
+        factor_bit (int): Only students whose factor bitmask has this bit set.
+        trend_bit (int): Only students whose trend bitmask has this bit set (see trends.py).
+        search (str): Case-insensitive substring of the student's name or ID.
+
+    Returns:
+        list: sqlite3.Row objects for the page.
+    """
+    conditions = []
+    params = [model_version]
+
+    if after is not None:
+        conditions.append("(r.dropout_probability < ? OR (r.dropout_probability = ? AND r.StudentID > ?))")
+        params.extend([after[0], after[0], after[1]])
+    if level is not None:
+        conditions.append("r.level = ?")
+        params.append(level)
+    if branch is not None:
+        conditions.append("l.Branch = ?")
+        params.append(branch)
+    if year is not None:
+        conditions.append("l.Year = ?")
+        params.append(year)
+    if fee_status is not None:
+        conditions.append("l.FeeStatus = ?")
+        params.append(fee_status)
+    if factor_bit is not None:
+        conditions.append("(r.factor_bitmask >> ?) & 1 = 1")
+        params.append(factor_bit)
+    if trend_bit is not None:
+        conditions.append("(t.trend_bitmask >> ?) & 1 = 1")
+        params.append(trend_bit)
+    if search:
+        conditions.append("(l.Name LIKE ? OR l.StudentID LIKE ?)")
+        params.extend([f"%{search}%", f"%{search}%"])
+
+    query = STUDENT_PAGE_QUERY.format(conditions=''.join(f"\n      AND {condition}" for condition in conditions))
+    params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+def fetch_filter_options(conn):
+    """Returns the distinct Branch and Year values for the dashboard filters."""
+    return {
+        'branches': [row[0] for row in conn.execute(BRANCHES_QUERY)],
+        'years': [row[0] for row in conn.execute(YEARS_QUERY)],
+    }
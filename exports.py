@@ -0,0 +1,371 @@
+import argparse
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+from db import ConnectionPool, fetch_student_page
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+EXPORT_DIR = 'exports'
+EXPORT_FORMATS = ('csv', 'xlsx')
+# Students read (and, for CSV, streamed out) per keyset page, so memory stays
+# the same however large the cohort is.
+EXPORT_PAGE_SIZE = 500
+RECENT_NOTES_PER_STUDENT = 3
+POLL_INTERVAL = 2.0
+# A running export whose progress has not moved for this long belongs to a
+# worker that died, so it is queued again.
+STALE_JOB_SECONDS = 300
+# Spreadsheet apps run cells starting with these as formulas; such text is
+# prefixed with a quote so a note or name can never execute in Excel.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# The newest notes of every student on a page, in one query.
+RECENT_NOTES_QUERY = """
+    SELECT student_id, mentor_name, timestamp, note_text FROM (
+        SELECT student_id, mentor_name, timestamp, note_text,
+               ROW_NUMBER() OVER (PARTITION BY student_id ORDER BY timestamp DESC, id DESC) AS position
+        FROM notes
+        WHERE student_id IN ({placeholders})
+    )
+    WHERE position <= ?
+    ORDER BY student_id, position
+"""
+
+def _import_openpyxl():
+    """openpyxl is optional: without it only CSV exports are available."""
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise ImportError("XLSX exports need openpyxl: pip install openpyxl") from e
+    return openpyxl
+
+# --- Rows ---
+def export_header(class_names):
+    """Returns the export's column names for a model with the given classes."""
+    return ['StudentID', 'Name', 'Branch', 'Year', 'FeeStatus', 'ReportingPeriod', 'RiskLevel',
+            *[f'P({label})' for label in class_names],
+            'RiskFactors', 'TrendFlags', 'AttendanceDelta', 'ScoreDelta', 'RecentNotes']
+
+def fetch_recent_notes(conn, student_ids, per_student=RECENT_NOTES_PER_STUDENT):
+    """Returns {StudentID: [note, ...]} with each student's newest notes, formatted for a single cell."""
+    notes = {}
+    for start in range(0, len(student_ids), 900):
+        chunk = student_ids[start:start + 900]
+        cursor = conn.execute(RECENT_NOTES_QUERY.format(placeholders=', '.join('?' * len(chunk))), [*chunk, per_student])
+        for student_id, mentor_name, timestamp, note_text in cursor:
+            notes.setdefault(student_id, []).append(f"{timestamp} {mentor_name}: {note_text}")
+    return notes
+
+def _safe_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def iter_export_rows(conn, model_version, class_names, filters=None, page_size=EXPORT_PAGE_SIZE):
+    """
+    Yields the cohort's export rows, highest dropout probability first.
+    The stored scores are walked with the same keyset pagination as the
+    dashboard, one page at a time, so nothing is held beyond the current page
+    and every query is a short read that never blocks writers.
+
+    Args:
+        conn (sqlite3.Connection): A pooled connection.
+        model_version (str): Export the scores of this model version.
+        class_names (sequence): The label encoder's classes_, for the probability columns.
+        filters (dict): fetch_student_page keyword arguments (level, branch, ...).
+        page_size (int): Students per page.
+
+    Yields:
+        list: One row per student, matching export_header.
+    """
+    from predict import expand_risk_factors
+    from trends import create_student_trends_table, expand_trend_flags
+
+    create_student_trends_table(conn)
+    filters = filters or {}
+    # Few distinct bitmasks occur in a cohort, so each is expanded once.
+    factor_texts, trend_texts = {}, {}
+    after = None
+    while True:
+        page = fetch_student_page(conn, model_version, page_size, after=after, **filters)
+        if not page:
+            return
+        notes = fetch_recent_notes(conn, [row['StudentID'] for row in page])
+        for row in page:
+            probabilities = json.loads(row['probabilities'])
+            factor_bitmask, trend_bitmask = row['factor_bitmask'], row['trend_bitmask'] or 0
+            if factor_bitmask not in factor_texts:
+                factor_texts[factor_bitmask] = '; '.join(factor['text'] for factor in expand_risk_factors(factor_bitmask))
+            if trend_bitmask not in trend_texts:
+                trend_texts[trend_bitmask] = '; '.join(expand_trend_flags(trend_bitmask))
+            yield [
+                _safe_cell(row['StudentID']), _safe_cell(row['Name']), _safe_cell(row['Branch']), row['Year'],
+                _safe_cell(row['FeeStatus']), row['ReportingPeriod'], row['level'],
+                *[round(probabilities[str(label)], 4) for label in class_names],
+                factor_texts[factor_bitmask], trend_texts[trend_bitmask],
+                row['attendance_delta'], row['score_delta'],
+                _safe_cell(' | '.join(notes.get(row['StudentID'], []))),
+            ]
+        if len(page) < page_size:
+            return
+        after = (page[-1]['dropout_probability'], page[-1]['StudentID'])
+
+def iter_csv(header, rows, rows_per_chunk=EXPORT_PAGE_SIZE):
+    """Encodes rows as CSV text, yielding one chunk per rows_per_chunk rows, for a streaming response."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def write_export(path, export_format, header, rows, on_progress=None):
+    """
+    Writes an export file. It is written next to 'path' first and moved into
+    place once complete, so a download never sees a partial file.
+
+    Args:
+        path (str): The file to write.
+        export_format (str): 'csv' or 'xlsx'.
+        header (list): Column names.
+        rows (iterable): Rows, e.g. from iter_export_rows.
+        on_progress (callable): Called with the number of rows written, every EXPORT_PAGE_SIZE rows.
+
+    Returns:
+        int: The number of rows written.
+    """
+    partial_path = path + '.part'
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            yield row
+            count += 1
+            if on_progress is not None and count % EXPORT_PAGE_SIZE == 0:
+                on_progress(count)
+
+    if export_format == 'csv':
+        with open(partial_path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in iter_csv(header, counted(rows)):
+                f.write(chunk)
+    elif export_format == 'xlsx':
+        openpyxl = _import_openpyxl()
+        # Write-only workbooks stream rows to disk instead of keeping every cell in memory.
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Cohort')
+        sheet.append(header)
+        for row in counted(rows):
+            sheet.append(row)
+        workbook.save(partial_path)
+    else:
+        raise ValueError(f"Unknown export format '{export_format}'; expected one of {EXPORT_FORMATS}.")
+    os.replace(partial_path, path)
+    return count
+
+# --- Job Queue ---
+# Large exports run as jobs in the application database, like rescoring (see
+# scoring_worker.py), and leave a file in EXPORT_DIR to download.
+def create_export_jobs_table(conn):
+    """Creates the 'export_jobs' queue table if it does not exist yet."""
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS export_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                format TEXT NOT NULL, -- csv or xlsx
+                filters TEXT NOT NULL, -- JSON fetch_student_page keyword arguments
+                model_version TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued', -- queued, running, done or failed
+                processed INTEGER NOT NULL DEFAULT 0,
+                path TEXT,
+                error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME
+            );
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status, id);')
+
+def _job_to_dict(row):
+    job = dict(row)
+    job['filters'] = json.loads(job['filters'])
+    return job
+
+def enqueue_export_job(conn, export_format, model_version, filters=None):
+    """
+    Queues an export.
+
+    Args:
+        conn (sqlite3.Connection): A pooled connection.
+        export_format (str): 'csv' or 'xlsx'.
+        model_version (str): Export the scores of this model version.
+        filters (dict): fetch_student_page keyword arguments.
+
+    Returns:
+        int: The job id.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}'; expected one of {EXPORT_FORMATS}.")
+    create_export_jobs_table(conn)
+    with conn:
+        cursor = conn.execute(
+            'INSERT INTO export_jobs (format, filters, model_version) VALUES (?, ?, ?)',
+            (export_format, json.dumps(filters or {}, sort_keys=True), model_version)
+        )
+        return cursor.lastrowid
+
+def get_export_job(conn, job_id):
+    """Returns a job as a dict, or None if there is no such job."""
+    create_export_jobs_table(conn)
+    row = conn.execute('SELECT * FROM export_jobs WHERE id = ?', (job_id,)).fetchone()
+    return None if row is None else _job_to_dict(row)
+
+def list_export_jobs(conn, limit=20):
+    """Returns the most recent jobs, newest first."""
+    create_export_jobs_table(conn)
+    return [_job_to_dict(row) for row in conn.execute('SELECT * FROM export_jobs ORDER BY id DESC LIMIT ?', (limit,))]
+
+def claim_next_export_job(conn):
+    """Marks the oldest queued job as running and returns it, or None if the queue is empty."""
+    with conn:
+        conn.execute(
+            "UPDATE export_jobs SET status = 'queued' WHERE status = 'running' AND updated_at < datetime('now', ?)",
+            (f'-{STALE_JOB_SECONDS} seconds',)
+        )
+        row = conn.execute(
+            "UPDATE export_jobs SET status = 'running', processed = 0, error = NULL, "
+            "started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = (SELECT id FROM export_jobs WHERE status = 'queued' ORDER BY id LIMIT 1) "
+            "RETURNING *"
+        ).fetchone()
+    return None if row is None else _job_to_dict(row)
+
+def _finish_job(conn, job_id, status, path=None, error=None):
+    with conn:
+        conn.execute(
+            'UPDATE export_jobs SET status = ?, path = ?, error = ?, updated_at = CURRENT_TIMESTAMP, '
+            'finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (status, path, error, job_id)
+        )
+
+def run_export_job(conn, job, class_names, output_dir=EXPORT_DIR):
+    """
+    Writes a claimed job's export file, recording progress after every page.
+
+    Returns:
+        str: The path of the written file.
+    """
+    def record_progress(processed):
+        with conn:
+            conn.execute('UPDATE export_jobs SET processed = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         (processed, job['id']))
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"cohort-export-{job['id']}.{job['format']}")
+    rows = iter_export_rows(conn, job['model_version'], class_names, job['filters'])
+    record_progress(write_export(path, job['format'], export_header(class_names), rows, on_progress=record_progress))
+    return path
+
+class ExportWorker:
+    """Runs queued exports on a background thread, so that no web worker is tied up writing one."""
+
+    def __init__(self, db_file=DB_FILE, get_model=None, output_dir=EXPORT_DIR, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            db_file (str): The application database holding the queue.
+            get_model (callable): Returns the serving LoadedModel, for its class names.
+            output_dir (str): Where export files are written.
+            poll_interval (float): Seconds between checks for jobs queued by other processes.
+        """
+        self.db_file = db_file
+        self.get_model = get_model
+        self.output_dir = output_dir
+        self.poll_interval = poll_interval
+        self._pool = ConnectionPool(db_file)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        """Wakes the worker thread so a job queued in this process starts right away."""
+        self._wake.set()
+
+    def run_pending(self):
+        """
+        Runs queued jobs until the queue is empty.
+
+        Returns:
+            int: The number of jobs run.
+        """
+        conn = self._pool.get_connection()
+        create_export_jobs_table(conn)
+        jobs_run = 0
+        while not self._stopped.is_set():
+            job = claim_next_export_job(conn)
+            if job is None:
+                return jobs_run
+            jobs_run += 1
+            start_time = time.perf_counter()
+
+            loaded = self.get_model()
+            if loaded is None:
+                _finish_job(conn, job['id'], 'failed', error="Model artifacts not loaded.")
+                continue
+            try:
+                path = run_export_job(conn, job, loaded.label_encoder.classes_, self.output_dir)
+                _finish_job(conn, job['id'], 'done', path=path)
+                print(f"-> Export job {job['id']}: wrote '{path}' in {time.perf_counter() - start_time:.2f}s.")
+            except Exception as e:
+                _finish_job(conn, job['id'], 'failed', error=str(e))
+                print(f"🛑 ERROR: Export job {job['id']} failed: {e}")
+        return jobs_run
+
+    def start(self):
+        """Starts the worker on a daemon thread."""
+        def work():
+            while not self._stopped.is_set():
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    print(f"🛑 ERROR: Export worker failed: {e}")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+            self._pool.close_all()
+
+        self._thread = threading.Thread(target=work, name='export-worker', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stops the worker thread once the job it is running (if any) has finished."""
+        self._stopped.set()
+        self._wake.set()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the scored cohort to CSV or XLSX.")
+    parser.add_argument('--db', default=DB_FILE, help=f"SQLite database file (default: {DB_FILE}).")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help="Output format (default: csv).")
+    parser.add_argument('--output', default=None, help="Output file (default: cohort-export.<format>).")
+    args = parser.parse_args()
+
+    from model_registry import ModelRegistry
+    loaded = ModelRegistry().get()
+    if loaded is None:
+        raise SystemExit(1)
+
+    start_time = time.perf_counter()
+    output = args.output or f'cohort-export.{args.format}'
+    conn = ConnectionPool(args.db).get_connection()
+    class_names = loaded.label_encoder.classes_
+    count = write_export(output, args.format, export_header(class_names), iter_export_rows(conn, loaded.version, class_names))
+    print(f"-> Exported {count} students to '{output}' in {time.perf_counter() - start_time:.2f}s.")
@@ -3,6 +3,8 @@ import numpy as np
 from faker import Faker
 import os
 
+from generate_synthetic_data import TARGET_CLASSES, draw_wellness_scores
+
 # Initialize Faker to generate realistic names and contact info
 fake = Faker('en_IN')
 
@@ -14,6 +16,7 @@ WELLNESS_OUTPUT_FILE = 'student_wellness_survey.csv'
 BRANCHES = ['Computer Science', 'Mechanical', 'Civil', 'Electronics', 'Electrical']
 YEARS = [1, 2, 3, 4]
 NUM_PERIODS = 4
+SEED = 42
 
 def generate_holistic_data():
     """
@@ -31,6 +34,10 @@ def generate_holistic_data():
         print(f"FATAL ERROR: Base data file '{BASE_FILE}' not found.")
         return
 
+    # Every draw below comes from one seeded generator, so reruns are reproducible.
+    rng = np.random.default_rng(SEED)
+    Faker.seed(SEED)
+
     # --- 1. Augment with Demographics & Contact Info ---
     print(f"Step 1: Augmenting {len(base_df)} students with full demographics...")
     
@@ -39,58 +46,37 @@ def generate_holistic_data():
     
     # --- FIX: Generate and add Email and Phone columns ---
     # Create email based on the first part of the name to make it look realistic
-    base_df['Email'] = [f"{name.split(' ')[0].lower()}{np.random.randint(10,99)}@college.edu" for name in names]
+    base_df['Email'] = [f"{name.split(' ')[0].lower()}{suffix}@college.edu" for name, suffix in zip(names, rng.integers(10, 99, len(base_df)))]
     base_df['Phone'] = [fake.phone_number() for _ in range(len(base_df))]
 
-    base_df['Branch'] = np.random.choice(BRANCHES, len(base_df), p=[0.3, 0.2, 0.2, 0.2, 0.1])
-    base_df['Year'] = np.random.choice(YEARS, len(base_df), p=[0.4, 0.3, 0.2, 0.1])
+    base_df['Branch'] = rng.choice(BRANCHES, len(base_df), p=[0.3, 0.2, 0.2, 0.2, 0.1])
+    base_df['Year'] = rng.choice(YEARS, len(base_df), p=[0.4, 0.3, 0.2, 0.1])
     print("-> Added Name, Email, Phone, Branch, and Year columns.")
 
     # --- 2. Generate Wellness Survey Data ---
     print(f"Step 2: Generating wellness survey data...")
-    wellness_data = []
-    for _, row in base_df.iterrows():
-        if row['Target'] == 'Dropout':
-            financial_stress = np.random.randint(3, 6)
-            health_impact = np.random.choice(['Yes', 'No'], p=[0.6, 0.4])
-            career_confidence = np.random.randint(1, 4)
-        elif row['Target'] == 'Graduate':
-            financial_stress = np.random.randint(1, 4)
-            health_impact = np.random.choice(['Yes', 'No'], p=[0.1, 0.9])
-            career_confidence = np.random.randint(4, 6)
-        else: # Enrolled
-            financial_stress = np.random.randint(1, 5)
-            health_impact = np.random.choice(['Yes', 'No'], p=[0.3, 0.7])
-            career_confidence = np.random.randint(3, 6)
-            
-        wellness_data.append({
-            'StudentID': row['StudentID'],
-            'FinancialStressScore': financial_stress,
-            'HealthImpact': health_impact,
-            'CareerConfidenceScore': career_confidence
-        })
-
-    wellness_df = pd.DataFrame(wellness_data)
+    target_codes = base_df['Target'].map({label: code for code, label in enumerate(TARGET_CLASSES)}).to_numpy()
+    wellness_df = pd.DataFrame({'StudentID': base_df['StudentID'], **draw_wellness_scores(rng, target_codes)})
+    wellness_df = wellness_df[['StudentID', 'FinancialStressScore', 'HealthImpact', 'CareerConfidenceScore']]
     wellness_df.to_csv(WELLNESS_OUTPUT_FILE, index=False)
     print(f"-> Saved wellness data to '{WELLNESS_OUTPUT_FILE}'.")
 
     # --- 3. Create Comprehensive Historical Dataset ---
     print("Step 3: Generating historical data and creating the master file...")
     merged_df = pd.merge(base_df, wellness_df, on='StudentID')
-    
-    historical_df_list = []
-    for _, row in merged_df.iterrows():
-        for period in range(1, NUM_PERIODS + 1):
-            historical_row = row.copy()
-            historical_row['ReportingPeriod'] = period
-            
-            if period < NUM_PERIODS:
-                historical_row['AttendancePercentage'] = max(40, row['AttendancePercentage'] + np.random.randint(-5, 5) * (NUM_PERIODS - period))
-                historical_row['AverageScore'] = max(30, round(row['AverageScore'] + np.random.uniform(-3, 3) * (NUM_PERIODS - period), 2))
-            
-            historical_df_list.append(historical_row)
-    
-    final_historical_df = pd.DataFrame(historical_df_list)
+
+    # Every student's row is repeated once per period. The latest period keeps
+    # the base values; earlier ones get noise that grows with their distance from it.
+    final_historical_df = merged_df.loc[merged_df.index.repeat(NUM_PERIODS)].reset_index(drop=True)
+    periods = np.tile(np.arange(1, NUM_PERIODS + 1), len(merged_df))
+    final_historical_df['ReportingPeriod'] = periods
+    distance = NUM_PERIODS - periods
+    attendance = final_historical_df['AttendancePercentage'].to_numpy()
+    average_score = final_historical_df['AverageScore'].to_numpy()
+    final_historical_df['AttendancePercentage'] = np.where(
+        distance > 0, np.maximum(40, attendance + rng.integers(-5, 5, len(periods)) * distance), attendance)
+    final_historical_df['AverageScore'] = np.where(
+        distance > 0, np.maximum(30, np.round(average_score + rng.uniform(-3, 3, len(periods)) * distance, 2)), average_score)
     final_historical_df.to_csv(ENHANCED_HISTORICAL_OUTPUT_FILE, index=False)
     print(f"-> Saved master historical data to '{ENHANCED_HISTORICAL_OUTPUT_FILE}'.")
     print("\n--- Data Generation Fix Complete ---")
@@ -0,0 +1,291 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from database_setup import RECORD_COLUMNS
+
+# --- Configuration ---
+OUTPUT_FILE = 'synthetic_student_data.csv'
+DEFAULT_STUDENTS = 300
+DEFAULT_PERIODS = 4
+DEFAULT_SEED = 42
+# Students generated (and held in memory) per chunk; each chunk is written out before the next is kept.
+DEFAULT_CHUNK_SIZE = 50000
+
+BRANCHES = ['Computer Science', 'Mechanical', 'Civil', 'Electronics', 'Electrical']
+BRANCH_PROBABILITIES = [0.3, 0.2, 0.2, 0.2, 0.1]
+YEARS = [1, 2, 3, 4]
+YEAR_PROBABILITIES = [0.4, 0.3, 0.2, 0.1]
+
+# --- Class-conditional Profiles ---
+# Calibrated on project_student_data.csv. Every per-class table below is
+# indexed by the position of the student's Target in TARGET_CLASSES, so a whole
+# chunk is drawn with one call per column instead of one call per student.
+TARGET_CLASSES = ['Dropout', 'Enrolled', 'Graduate']
+TARGET_PROBABILITIES = [0.22, 0.48, 0.30]
+
+# [low, high) per class for integer columns.
+INTEGER_RANGES = {
+    'AttendancePercentage': [(40, 80), (70, 95), (85, 100)],
+    'LMS_Logins_Per_Week': [(0, 5), (3, 10), (5, 15)],
+}
+# The wellness survey answers, drawn the same way.
+WELLNESS_RANGES = {
+    'FinancialStressScore': [(3, 6), (1, 5), (1, 4)],
+    'CareerConfidenceScore': [(1, 4), (3, 6), (4, 6)],
+}
+HEALTH_IMPACT_PROBABILITIES = (['Yes', 'No'], [[0.6, 0.4], [0.3, 0.7], [0.1, 0.9]])
+# [low, high) per class for float columns, rounded to 2 decimals.
+FLOAT_RANGES = {
+    'AverageScore': [(30, 65), (60, 85), (75, 98)],
+    'MidtermGrade': [(25, 60), (55, 80), (70, 95)],
+}
+# Per-class probabilities for categorical columns.
+CATEGORY_PROBABILITIES = {
+    'FeeStatus': (['Paid', 'Due', 'Overdue'], [[0.08, 0.24, 0.68], [0.81, 0.19, 0.0], [1.0, 0.0, 0.0]]),
+    'ScholarshipHolder': ([1, 0], [[0.45, 0.55], [0.36, 0.64], [0.29, 0.71]]),
+}
+# Per-class range of each student's change per period, so dropouts decline
+# towards their final values, graduates improve, and enrolled students drift.
+TREND_RANGES = {
+    'AttendancePercentage': [(-4.0, -1.0), (-1.0, 1.0), (0.0, 2.0)],
+    'AverageScore': [(-3.0, -0.5), (-1.0, 1.0), (0.0, 1.5)],
+}
+TREND_NOISE = {'AttendancePercentage': 2.0, 'AverageScore': 1.5}
+VALUE_BOUNDS = {'AttendancePercentage': (40, 100), 'AverageScore': (30, 100)}
+
+# Name pools for vectorized sampling; Faker is far too slow per-row at this scale.
+FIRST_NAMES = np.array([
+    'Aarav', 'Aditi', 'Akash', 'Ananya', 'Arjun', 'Bhavna', 'Deepak', 'Divya', 'Gaurav', 'Harish',
+    'Ishaan', 'Kavya', 'Karan', 'Lakshmi', 'Manish', 'Meera', 'Neha', 'Nikhil', 'Pooja', 'Pranav',
+    'Rahul', 'Riya', 'Rohan', 'Sanjay', 'Shreya', 'Siddharth', 'Sneha', 'Tanvi', 'Varun', 'Vikram',
+], dtype=object)
+LAST_NAMES = np.array([
+    'Agarwal', 'Bhat', 'Chopra', 'Das', 'Gupta', 'Iyer', 'Joshi', 'Kapoor', 'Kumar', 'Mehta',
+    'Menon', 'Nair', 'Narang', 'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma',
+], dtype=object)
+
+def _class_ranges(ranges, target_codes):
+    """Looks up each student's (low, high) bounds from a per-class range table."""
+    bounds = np.asarray(ranges)[target_codes]
+    return bounds[:, 0], bounds[:, 1]
+
+def _choice_by_class(rng, choices, probabilities, target_codes):
+    """Draws one of 'choices' per student, using the probabilities of the student's class."""
+    cumulative = np.cumsum(probabilities, axis=1)[target_codes]
+    indices = (rng.random(len(target_codes))[:, None] >= cumulative).sum(axis=1)
+    # Guards against a cumulative sum that rounds to just under 1.
+    return np.asarray(choices, dtype=object)[np.minimum(indices, len(choices) - 1)]
+
+def draw_wellness_scores(rng, target_codes):
+    """
+    Draws the wellness survey answers for a batch of students.
+
+    Args:
+        rng (np.random.Generator): The generator to draw from.
+        target_codes (np.ndarray): Each student's index into TARGET_CLASSES.
+
+    Returns:
+        dict: FinancialStressScore, HealthImpact and CareerConfidenceScore arrays.
+    """
+    scores = {}
+    for name, ranges in WELLNESS_RANGES.items():
+        low, high = _class_ranges(ranges, target_codes)
+        scores[name] = rng.integers(low, high)
+    scores['HealthImpact'] = _choice_by_class(rng, *HEALTH_IMPACT_PROBABILITIES, target_codes)
+    return scores
+
+def generate_students(rng, first_index, num_students, id_width=3):
+    """
+    Generates one student per row with final-period academics, demographics
+    and wellness scores, all drawn as whole arrays.
+
+    Args:
+        rng (np.random.Generator): The seeded generator to draw from.
+        first_index (int): 0-based index of the first student, for StudentIDs.
+        num_students (int): Number of students to generate.
+        id_width (int): Zero-padded width of the numeric part of the StudentID.
+
+    Returns:
+        pd.DataFrame: One row per student.
+    """
+    target_codes = rng.choice(len(TARGET_CLASSES), size=num_students, p=TARGET_PROBABILITIES)
+    columns = {
+        'StudentID': 'SID_2024' + pd.Series(np.arange(first_index + 1, first_index + num_students + 1)).astype(str).str.zfill(id_width),
+        'Target': np.asarray(TARGET_CLASSES, dtype=object)[target_codes],
+    }
+
+    for name, ranges in INTEGER_RANGES.items():
+        low, high = _class_ranges(ranges, target_codes)
+        columns[name] = rng.integers(low, high)
+    for name, ranges in FLOAT_RANGES.items():
+        low, high = _class_ranges(ranges, target_codes)
+        columns[name] = np.round(rng.uniform(low, high), 2)
+    for name, (choices, probabilities) in CATEGORY_PROBABILITIES.items():
+        columns[name] = _choice_by_class(rng, choices, probabilities, target_codes)
+    columns.update(draw_wellness_scores(rng, target_codes))
+
+    # --- Demographics & Contact Info ---
+    first_names = FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), num_students)]
+    last_names = LAST_NAMES[rng.integers(0, len(LAST_NAMES), num_students)]
+    columns['Name'] = first_names + ' ' + last_names
+    email_suffixes = pd.Series(rng.integers(10, 100, num_students)).astype(str)
+    columns['Email'] = pd.Series(first_names).str.lower() + email_suffixes + '@college.edu'
+    columns['Phone'] = rng.integers(6000000000, 10000000000, num_students)
+    columns['Branch'] = np.asarray(BRANCHES, dtype=object)[rng.choice(len(BRANCHES), size=num_students, p=BRANCH_PROBABILITIES)]
+    columns['Year'] = np.asarray(YEARS)[rng.choice(len(YEARS), size=num_students, p=YEAR_PROBABILITIES)]
+
+    students_df = pd.DataFrame({name: np.asarray(values) for name, values in columns.items()})
+    students_df['TargetCode'] = target_codes
+    return students_df
+
+def draw_period_trends(rng, students_df, num_periods):
+    """
+    Back-projects the trended columns over every reporting period.
+    The final period keeps the student's generated value; earlier periods
+    follow a per-student trend with per-period noise.
+
+    Args:
+        rng (np.random.Generator): The generator to draw from.
+        students_df (pd.DataFrame): One row per student, with 'TargetCode' and the trended columns.
+        num_periods (int): Number of reporting periods per student.
+
+    Returns:
+        dict: Column name -> (num_students, num_periods) array of values.
+    """
+    num_students = len(students_df)
+    target_codes = students_df['TargetCode'].to_numpy()
+    periods_remaining = np.arange(num_periods - 1, -1, -1)[None, :]
+
+    trends = {}
+    for name, ranges in TREND_RANGES.items():
+        low, high = _class_ranges(ranges, target_codes)
+        slopes = rng.uniform(low, high)[:, None]
+        noise = rng.normal(0.0, TREND_NOISE[name], size=(num_students, num_periods))
+        noise[:, -1] = 0.0 # The final period is the student's current value
+        final_values = students_df[name].to_numpy(dtype=np.float64)[:, None]
+        values = np.clip(final_values - slopes * periods_remaining + noise, *VALUE_BOUNDS[name])
+        trends[name] = np.round(values).astype(np.int64) if name in INTEGER_RANGES else np.round(values, 2)
+    return trends
+
+def expand_periods(rng, students_df, num_periods):
+    """
+    Expands one row per student into one row per student per reporting period.
+
+    Args:
+        rng (np.random.Generator): The seeded generator to draw from.
+        students_df (pd.DataFrame): Output of generate_students.
+        num_periods (int): Number of reporting periods per student.
+
+    Returns:
+        pd.DataFrame: The records in RECORD_COLUMNS order, grouped by student.
+    """
+    trends = draw_period_trends(rng, students_df, num_periods)
+    records_df = students_df.drop(columns='TargetCode').iloc[np.repeat(np.arange(len(students_df)), num_periods)].reset_index(drop=True)
+    records_df['ReportingPeriod'] = np.tile(np.arange(1, num_periods + 1), len(students_df))
+    for name, values in trends.items():
+        records_df[name] = values.ravel()
+    return records_df[RECORD_COLUMNS]
+
+def generate_records_chunk(seed_sequence, first_index, num_students, num_periods, id_width):
+    """Generates one chunk of records from its own seed, so chunks can run in any order or process."""
+    rng = np.random.default_rng(seed_sequence)
+    return expand_periods(rng, generate_students(rng, first_index, num_students, id_width), num_periods)
+
+def _format_records_chunk(seed_sequence, first_index, num_students, num_periods, id_width):
+    """
+    Worker entry point: generates a chunk and returns it as CSV text, identical
+    to generate_records_chunk(...).to_csv(). DataFrame.to_csv dominates the run
+    time at this scale, so rows are formatted directly instead: the columns that
+    do not change between periods are joined once per student, and only the
+    trended columns are formatted per period. This relies on RECORD_COLUMNS
+    being StudentID, the two trended columns, the static columns, ReportingPeriod;
+    no generated value contains a comma or quote.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    students_df = generate_students(rng, first_index, num_students, id_width)
+    trends = draw_period_trends(rng, students_df, num_periods)
+
+    static_columns = [students_df[name].to_numpy().astype(str) for name in RECORD_COLUMNS[3:-1]]
+    static_values = list(map(','.join, zip(*static_columns)))
+    lines = [
+        f"{student_id},{attendance},{score!r},{static},{period}\n"
+        for student_id, static, attendance_row, score_row in zip(
+            students_df['StudentID'].tolist(), static_values,
+            trends['AttendancePercentage'].tolist(), trends['AverageScore'].tolist())
+        for period, (attendance, score) in enumerate(zip(attendance_row, score_row), start=1)
+    ]
+    return ''.join(lines)
+
+def generate_synthetic_data(num_students=DEFAULT_STUDENTS, num_periods=DEFAULT_PERIODS, output_file=OUTPUT_FILE,
+                            seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """
+    Writes a synthetic master dataset in the shape of master_student_data_historical.csv.
+    Students are generated in chunks and appended to the CSV as they finish,
+    so memory use is bounded by the chunk size, not the dataset size. Each
+    chunk has its own child seed, so the output for a given seed is identical
+    however many workers are used.
+
+    Args:
+        num_students (int): Number of students.
+        num_periods (int): Reporting periods per student.
+        output_file (str): The CSV file to write.
+        seed (int): Seed for reproducible output.
+        chunk_size (int): Students per chunk.
+        workers (int): Processes used to generate chunks in parallel.
+
+    Returns:
+        int: The number of records written.
+    """
+    print(f"--- Generating {num_students} students x {num_periods} periods into '{output_file}' ---")
+    start_time = time.perf_counter()
+
+    chunk_starts = list(range(0, num_students, chunk_size))
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_starts))
+    id_width = max(3, len(str(num_students)))
+    chunk_args = [
+        (seed_sequence, first_index, min(chunk_size, num_students - first_index), num_periods, id_width)
+        for seed_sequence, first_index in zip(seed_sequences, chunk_starts)
+    ]
+
+    total_records = 0
+    with open(output_file, 'w', newline='') as f:
+        f.write(','.join(RECORD_COLUMNS) + '\n')
+        if workers <= 1:
+            for args in chunk_args:
+                f.write(_format_records_chunk(*args))
+                total_records += args[2] * num_periods
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Keep only a few chunks in flight so finished ones cannot pile up in memory.
+                pending = []
+                for args in chunk_args:
+                    pending.append((executor.submit(_format_records_chunk, *args), args[2]))
+                    if len(pending) >= workers * 2:
+                        future, chunk_students = pending.pop(0)
+                        f.write(future.result())
+                        total_records += chunk_students * num_periods
+                for future, chunk_students in pending:
+                    f.write(future.result())
+                    total_records += chunk_students * num_periods
+
+    elapsed = time.perf_counter() - start_time
+    print(f"-> Wrote {total_records} records in {elapsed:.2f}s ({total_records / max(elapsed, 1e-9):,.0f} records/s).")
+    print("--- Data Generation Complete ---")
+    return total_records
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic Mentor's Eye master dataset.")
+    parser.add_argument('--students', type=int, default=DEFAULT_STUDENTS, help=f"Number of students (default: {DEFAULT_STUDENTS}).")
+    parser.add_argument('--periods', type=int, default=DEFAULT_PERIODS, help=f"Reporting periods per student (default: {DEFAULT_PERIODS}).")
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f"Output CSV file (default: {OUTPUT_FILE}).")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED}).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help=f"Students per chunk (default: {DEFAULT_CHUNK_SIZE}).")
+    parser.add_argument('--workers', type=int, default=1, help=f"Parallel worker processes (default: 1; up to {os.cpu_count()} here).")
+    args = parser.parse_args()
+
+    generate_synthetic_data(args.students, args.periods, args.output, args.seed, args.chunk_size, args.workers)
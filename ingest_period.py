@@ -0,0 +1,99 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import joblib
+import pandas as pd
+
+from database_setup import RECORD_COLUMNS, create_tables
+from live_updates import create_change_events_table, publish_events
+from migrate_data import refresh_latest_student_state, upsert_student_records
+from risk_scores import LABEL_ENCODER_FILE, MODEL_FILE, create_risk_scores_table, get_model_version, store_risk_scores
+from trends import refresh_student_trends
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+DEFAULT_CHUNK_SIZE = 5000
+
+def ingest_period_records(csv_file, db_file=DB_FILE, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Incrementally loads new reporting-period records into the database.
+    The CSV is streamed in chunks; each chunk is upserted on
+    (StudentID, ReportingPeriod) in its own transaction, after which only the
+    touched students' latest-state rows and trends are refreshed, only the
+    new records are rescored and a 'record' change event is published per
+    touched student. The cost is proportional to the new rows, not
+    the history, and WAL mode keeps the dashboard readable between chunks.
+
+    Args:
+        csv_file (str): CSV of new records, in the same shape as the master data file.
+        db_file (str): The SQLite database to ingest into.
+        chunk_size (int): Number of rows per chunk and transaction.
+
+    Returns:
+        int: The number of records ingested.
+    """
+    if not os.path.exists(csv_file):
+        print(f"FATAL ERROR: Data file '{csv_file}' not found.")
+        return 0
+
+    if not os.path.exists(db_file):
+        print(f"FATAL ERROR: Database file '{db_file}' not found.")
+        print("Please run 'database_setup.py' and 'migrate_data.py' first.")
+        return 0
+
+    # Scoring is optional: without a model the routes fall back to live inference.
+    model = label_encoder = model_version = None
+    if os.path.exists(MODEL_FILE) and os.path.exists(LABEL_ENCODER_FILE):
+        model = joblib.load(MODEL_FILE)
+        label_encoder = joblib.load(LABEL_ENCODER_FILE)
+        model_version = get_model_version(MODEL_FILE)
+    else:
+        print(f"-> '{MODEL_FILE}' not found; new records will be scored on first view instead.")
+
+    print(f"--- Ingesting '{csv_file}' into '{db_file}' in chunks of {chunk_size} ---")
+    start_time = time.perf_counter()
+
+    conn = sqlite3.connect(db_file, timeout=30)
+    create_tables(conn)
+    create_risk_scores_table(conn)
+    create_change_events_table(conn)
+
+    total_records = 0
+    touched_students = set()
+    try:
+        for chunk_number, chunk_df in enumerate(pd.read_csv(csv_file, chunksize=chunk_size), start=1):
+            missing = set(RECORD_COLUMNS) - set(chunk_df.columns)
+            if missing:
+                raise ValueError(f"'{csv_file}' is missing required columns: {sorted(missing)}")
+
+            chunk_students = chunk_df['StudentID'].unique().tolist()
+            with conn:
+                upsert_student_records(conn, chunk_df)
+                refresh_latest_student_state(conn, chunk_students)
+                refresh_student_trends(conn, chunk_students)
+                if model is not None:
+                    store_risk_scores(conn, chunk_df, model, label_encoder, model_version, publish_changes=True)
+                # History, trends and metrics changed even where the risk did not.
+                publish_events(conn, [('record', student_id, {'StudentID': student_id}) for student_id in chunk_students])
+
+            total_records += len(chunk_df)
+            touched_students.update(chunk_students)
+            print(f"-> Chunk {chunk_number}: upserted {len(chunk_df)} records ({total_records} total).")
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"-> Ingested {total_records} records for {len(touched_students)} students in {elapsed:.2f}s.")
+    print("--- Ingestion Complete ---")
+    return total_records
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Upsert new reporting-period records into the Mentor's Eye database.")
+    parser.add_argument('csv_file', help="CSV of new period records, in the master data file's shape.")
+    parser.add_argument('--db', default=DB_FILE, help=f"SQLite database file (default: {DB_FILE}).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help=f"Rows per transaction (default: {DEFAULT_CHUNK_SIZE}).")
+    args = parser.parse_args()
+
+    ingest_period_records(args.csv_file, args.db, args.chunk_size)
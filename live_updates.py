@@ -0,0 +1,209 @@
+import json
+import queue
+import threading
+
+from db import ConnectionPool
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+# Seconds between checks of the change log for new events.
+POLL_INTERVAL = 0.5
+# Only this many of the most recent events are kept, for clients resuming with Last-Event-ID.
+EVENT_LOG_SIZE = 10000
+# Events buffered per subscriber; a client that falls further behind is told to reload.
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# --- Change Log ---
+# Changes are appended to a table in the application database, so a change
+# made by any process (a worker, ingest_period.py, another app instance)
+# reaches every process's subscribers.
+def create_change_events_table(conn):
+    """Creates the 'change_events' log table if it does not exist yet."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL, -- risk, record, note or model
+            student_id TEXT,
+            payload TEXT NOT NULL, -- JSON
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+def publish_events(conn, events):
+    """
+    Appends events to the change log. Runs inside the caller's transaction, so
+    an event is only visible once the change it describes is committed.
+
+    Args:
+        conn (sqlite3.Connection): An open database connection.
+        events (list): (event_type, student_id, payload dict) tuples.
+    """
+    if events:
+        conn.executemany(
+            'INSERT INTO change_events (event_type, student_id, payload) VALUES (?, ?, ?)',
+            [(event_type, student_id, json.dumps(payload)) for event_type, student_id, payload in events]
+        )
+
+def publish_event(conn, event_type, student_id, payload):
+    """Appends a single event in its own transaction."""
+    create_change_events_table(conn)
+    with conn:
+        publish_events(conn, [(event_type, student_id, payload)])
+
+def fetch_events_after(conn, after_id, limit):
+    """Returns up to 'limit' events with an id greater than after_id, oldest first."""
+    return [
+        {'id': row[0], 'type': row[1], 'student_id': row[2], 'data': json.loads(row[3])}
+        for row in conn.execute(
+            'SELECT id, event_type, student_id, payload FROM change_events WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        )
+    ]
+
+def find_risk_changes(conn, students_df, model_version, risk_levels, probabilities, factor_bitmasks, class_names):
+    """
+    Compares freshly computed scores with each student's most recent stored
+    score for the same model version, before the new scores are written.
+
+    Only students with a previous score are compared, so scoring a new model
+    version for the first time (a model swap) produces no per-student events.
+
+    Returns:
+        list: ('risk', StudentID, delta) events for students whose level,
+        factors or rounded probabilities changed. A delta holds the new level
+        and probabilities and the factors that were added and removed.
+    """
+    from predict import expand_risk_factors
+
+    # The newest record per student in the batch is the one a card shows.
+    periods = [int(period) for period in students_df['ReportingPeriod']]
+    positions = {}
+    for i, student_id in enumerate(students_df['StudentID']):
+        if student_id not in positions or periods[i] >= periods[positions[student_id]]:
+            positions[student_id] = i
+
+    student_ids = list(positions)
+    previous = {}
+    for start in range(0, len(student_ids), 900):
+        chunk = student_ids[start:start + 900]
+        cursor = conn.execute(
+            f"SELECT StudentID, ReportingPeriod, level, probabilities, factor_bitmask FROM risk_scores "
+            f"WHERE model_version = ? AND StudentID IN ({', '.join('?' * len(chunk))})",
+            [model_version, *chunk]
+        )
+        for student_id, period, level, stored_probabilities, factor_bitmask in cursor:
+            if student_id not in previous or period > previous[student_id][0]:
+                previous[student_id] = (period, level, stored_probabilities, factor_bitmask)
+
+    events = []
+    for student_id, i in positions.items():
+        if student_id not in previous:
+            continue
+        old_period, old_level, old_probabilities, old_bitmask = previous[student_id]
+        period = periods[i]
+        if period < old_period:
+            continue # A correction to an older period does not change what the card shows
+
+        new_probabilities = {str(label): round(float(prob), 2) for label, prob in zip(class_names, probabilities[i])}
+        old_probabilities = {label: round(prob, 2) for label, prob in json.loads(old_probabilities).items()}
+        new_bitmask = int(factor_bitmasks[i])
+        if str(risk_levels[i]) == old_level and new_bitmask == old_bitmask and new_probabilities == old_probabilities:
+            continue
+
+        events.append(('risk', student_id, {
+            'StudentID': student_id,
+            'ReportingPeriod': period,
+            'level': str(risk_levels[i]),
+            'probabilities': new_probabilities,
+            'factors_added': [factor['text'] for factor in expand_risk_factors(new_bitmask & ~old_bitmask)],
+            'factors_removed': [factor['text'] for factor in expand_risk_factors(old_bitmask & ~new_bitmask)],
+        }))
+    return events
+
+# --- Fan-out ---
+class EventBroadcaster:
+    """
+    Follows the change log and hands new events to every subscriber in this
+    process. One thread polls the database however many dashboards are
+    connected; each poll is a single range query on the primary key.
+    """
+
+    def __init__(self, db_file=DB_FILE, poll_interval=POLL_INTERVAL, on_event=None):
+        """
+        Args:
+            db_file (str): The application database holding the change log.
+            poll_interval (float): Seconds between polls.
+            on_event (callable): Called with every event before it is fanned out,
+                e.g. to invalidate this process's caches.
+        """
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+        self.on_event = on_event
+        self._pool = ConnectionPool(db_file)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last_id = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts following the change log on a daemon thread, from its current end."""
+        conn = self._pool.get_connection()
+        create_change_events_table(conn)
+        self._last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_events').fetchone()[0]
+        self._thread = threading.Thread(target=self._follow, name='event-broadcaster', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def subscribe(self):
+        """Returns a queue that receives every new event; None is sent if the subscriber falls behind."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stop(self):
+        """Stops following the change log. Every subscriber is sent None, so its client reconnects."""
+        self._stopped.set()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            self._reset(subscriber)
+
+    def _follow(self):
+        conn = self._pool.get_connection()
+        polls = 0
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self._dispatch(fetch_events_after(conn, self._last_id, SUBSCRIBER_QUEUE_SIZE))
+                polls += 1
+                if polls % 1000 == 0:
+                    with conn:
+                        conn.execute('DELETE FROM change_events WHERE id <= ?', (self._last_id - EVENT_LOG_SIZE,))
+            except Exception as e:
+                print(f"🛑 ERROR: Could not read change events: {e}")
+        self._pool.close_all()
+
+    def _dispatch(self, events):
+        for event in events:
+            self._last_id = event['id']
+            if self.on_event is not None:
+                self.on_event(event)
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # Too far behind to catch up event by event; the client reloads instead.
+                    self._reset(subscriber)
+
+    def _reset(self, subscriber):
+        self.unsubscribe(subscriber)
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        subscriber.put_nowait(None)
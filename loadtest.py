@@ -0,0 +1,472 @@
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from benchmark import REPO_DIR, get_commit
+
+# --- Configuration ---
+RESULTS_FILE = 'loadtest_results.json'
+DB_FILE = 'mentors_eye.db'
+DEFAULT_STUDENTS = 2000
+DEFAULT_PERIODS = 4
+DEFAULT_SEED = 42
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32]
+DEFAULT_DURATION = 20 # Seconds measured per concurrency level
+DEFAULT_WARMUP = 3 # Seconds run before each level's measurement starts
+DEFAULT_THREADS = 4 # Threads per server worker
+LOADTEST_USER = ('mentor@college.edu', 'password123')
+SERVER_LOG = 'loadtest_server.log'
+COHORT_FILE = 'loadtest_cohort.json' # Records how the work directory's cohort was seeded
+SEED_NOTES_PER_STUDENT = 3
+SERVER_START_TIMEOUT = 60
+REQUEST_TIMEOUT = 30
+
+# The traffic mix, as relative weights. A mentor mostly opens students from
+# the dashboard and reads or adds notes; the dashboard itself is reloaded less often.
+DEFAULT_MIX = {'dashboard': 10, 'student': 45, 'get_notes': 35, 'add_note': 10}
+# Mentors concentrate on the students at the top of the risk-ordered list:
+# this share of requests goes to the highest-risk HOT_STUDENT_FRACTION.
+HOT_STUDENT_FRACTION = 0.2
+HOT_TRAFFIC_FRACTION = 0.8
+NOTE_PHRASES = [
+    'Discussed attendance and agreed on a weekly check-in.',
+    'Student mentioned financial stress; referred to the scholarship office.',
+    'Scores improving after the remedial sessions.',
+    'Missed the last two meetings, follow up by phone.',
+    'Health issues affecting exam preparation, informed the department.',
+]
+# How often the write lock is probed while a level runs (see probe_write_lock).
+LOCK_PROBE_INTERVAL = 0.005
+
+def _check_gunicorn():
+    """gunicorn is only needed by this tool, so it is checked for here rather than required by the app."""
+    try:
+        import gunicorn # noqa: F401
+    except ImportError as e:
+        raise ImportError("The load test runs the app under gunicorn. Install it with 'pip install gunicorn'.") from e
+
+# --- Cohort ---
+def seed_cohort(work_dir, num_students, num_periods, seed):
+    """
+    Builds a synthetic cohort in work_dir: data, trained model, database and a
+    few notes per student. Skipped when work_dir already holds a cohort seeded
+    with the same parameters, so that repeated runs measure the same data.
+
+    Returns:
+        bool: True if the cohort was (re)built.
+    """
+    cohort = {'students': num_students, 'periods': num_periods, 'seed': seed}
+    cohort_file = os.path.join(work_dir, COHORT_FILE)
+    if os.path.exists(cohort_file):
+        with open(cohort_file) as f:
+            if json.load(f) == cohort:
+                return False
+
+    original_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        import database_setup
+        import migrate_data
+        import train_model
+        from generate_synthetic_data import generate_synthetic_data
+
+        for path in (DB_FILE, DB_FILE + '-wal', DB_FILE + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(num_students, num_periods, train_model.DATA_FILE, seed)
+            train_model.train_holistic_model()
+            database_setup.create_tables()
+            migrate_data.migrate_data_to_db()
+
+        rng = random.Random(seed)
+        conn = sqlite3.connect(DB_FILE)
+        student_ids = [row[0] for row in conn.execute('SELECT StudentID FROM students ORDER BY StudentID')]
+        with conn:
+            conn.executemany(
+                'INSERT INTO notes (student_id, mentor_name, note_text) VALUES (?, ?, ?)',
+                [(student_id, 'Seed Mentor', rng.choice(NOTE_PHRASES))
+                 for student_id in student_ids for _ in range(rng.randint(0, SEED_NOTES_PER_STUDENT))]
+            )
+        conn.close()
+    finally:
+        os.chdir(original_dir)
+
+    with open(cohort_file, 'w') as f:
+        json.dump(cohort, f)
+    return True
+
+def load_student_ids(db_file):
+    """Returns every scored student's ID, highest dropout probability first (the dashboard's order)."""
+    conn = sqlite3.connect(db_file)
+    try:
+        return [row[0] for row in conn.execute(
+            'SELECT StudentID FROM risk_scores GROUP BY StudentID ORDER BY MAX(dropout_probability) DESC, StudentID')]
+    finally:
+        conn.close()
+
+# --- Server ---
+def find_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@contextlib.contextmanager
+def run_server(work_dir, port, workers, threads):
+    """
+    Runs the app under gunicorn on localhost with the work directory's
+    database and model, and stops it on exit. Output goes to SERVER_LOG.
+    """
+    _check_gunicorn()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+               MODEL_WATCH_INTERVAL='0', EXPORT_WORKER='0')
+    command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--threads', str(threads), '--worker-class', 'gthread',
+               '--chdir', work_dir, '--timeout', '120', '--access-logfile', '-']
+    log = open(os.path.join(work_dir, SERVER_LOG), 'a')
+    server = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with code {server.returncode}; see '{os.path.join(work_dir, SERVER_LOG)}'.")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/login')
+                if connection.getresponse().status == 200:
+                    connection.close()
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"The server did not start within {SERVER_START_TIMEOUT}s.")
+            time.sleep(0.2)
+        yield server
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+# --- Clients ---
+class MentorClient:
+    """
+    One simulated mentor: logs in once, then sends requests back to back over
+    a keep-alive connection, drawn from the traffic mix with its own seeded
+    generator so every run replays the same sequence.
+    """
+
+    def __init__(self, port, student_ids, mix, seed):
+        self.port = port
+        self.student_ids = student_ids
+        self.hot_count = max(1, int(len(student_ids) * HOT_STUDENT_FRACTION))
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.rng = random.Random(seed)
+        self.connection = None
+        self.cookie = None
+
+    def send(self, method, path, body=None, content_type=None):
+        """Sends one request and returns (status, body), reconnecting once if the server closed the connection."""
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Set-Cookie'):
+                    self.cookie = response.getheader('Set-Cookie').split(';', 1)[0]
+                if response.will_close:
+                    self.close()
+                return response.status, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt:
+                    raise
+
+    def login(self):
+        email, password = LOADTEST_USER
+        status, _ = self.send('POST', '/login', urllib.parse.urlencode({'email': email, 'password': password}),
+                               'application/x-www-form-urlencoded')
+        if status != 302 or not self.cookie:
+            raise RuntimeError(f"Login failed with status {status}.")
+
+    def pick_student(self):
+        if self.rng.random() < HOT_TRAFFIC_FRACTION:
+            return self.student_ids[self.rng.randrange(self.hot_count)]
+        return self.rng.choice(self.student_ids)
+
+    def next_request(self):
+        """Draws the next request: (kind, method, path, body, content type)."""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == 'dashboard':
+            return kind, 'GET', '/', None, None
+        student_id = self.pick_student()
+        if kind == 'student':
+            return kind, 'GET', f'/student/{student_id}', None, None
+        if kind == 'get_notes':
+            return kind, 'GET', f'/get_notes/{student_id}', None, None
+        body = json.dumps({'student_id': student_id, 'mentor_name': 'Load Test', 'note_text': self.rng.choice(NOTE_PHRASES)})
+        return kind, 'POST', '/add_note', body, 'application/json'
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def run_client(client, stop_at, measure_from, samples):
+    """Sends requests until stop_at, recording (kind, seconds, status, locked) for those started after measure_from."""
+    while True:
+        kind, method, path, body, content_type = client.next_request()
+        start_time = time.monotonic()
+        if start_time >= stop_at:
+            return
+        try:
+            status, data = client.send(method, path, body, content_type)
+            locked = status >= 500 and b'database is locked' in data
+        except (OSError, http.client.HTTPException):
+            status, locked = 0, False # Connection error or timeout
+        if start_time >= measure_from:
+            samples.append((kind, time.monotonic() - start_time, status, locked))
+
+# --- Lock Contention ---
+def probe_write_lock(db_file, stop, counts):
+    """
+    Tries to take SQLite's write lock every LOCK_PROBE_INTERVAL seconds
+    without waiting for it. The share of probes that find it taken is how
+    often a writer would have had to queue behind another one.
+    """
+    conn = sqlite3.connect(db_file, timeout=0, isolation_level=None)
+    while not stop.wait(LOCK_PROBE_INTERVAL):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('ROLLBACK')
+        except sqlite3.OperationalError:
+            counts['busy'] += 1
+        counts['probes'] += 1
+    conn.close()
+
+# --- Load Test ---
+def summarize_samples(samples, seconds):
+    """Returns throughput, latency percentiles (ms) and error counts for a list of request samples."""
+    if not samples:
+        return {'requests': 0, 'throughput_per_s': 0.0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+                'errors': 0, 'error_rate': 0.0, 'locked_errors': 0}
+    latencies_ms = np.array([sample[1] for sample in samples]) * 1000
+    errors = sum(1 for sample in samples if sample[2] == 0 or sample[2] >= 400)
+    return {
+        'requests': len(samples),
+        'throughput_per_s': len(samples) / seconds,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'errors': errors,
+        'error_rate': errors / len(samples),
+        'locked_errors': sum(1 for sample in samples if sample[3]),
+    }
+
+def run_level(port, db_file, student_ids, mix, concurrency, duration, warmup, seed):
+    """
+    Runs 'concurrency' mentors against the server for warmup + duration
+    seconds and summarizes the measured part, overall and per request kind.
+    """
+    clients = [MentorClient(port, student_ids, mix, seed * 1000003 + concurrency * 1009 + i) for i in range(concurrency)]
+    for client in clients:
+        client.login()
+
+    samples = [[] for _ in clients]
+    lock_counts = {'probes': 0, 'busy': 0}
+    stop_probe = threading.Event()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+    threads = [threading.Thread(target=run_client, args=(client, stop_at, measure_from, client_samples), daemon=True)
+               for client, client_samples in zip(clients, samples)]
+    probe = threading.Thread(target=probe_write_lock, args=(db_file, stop_probe, lock_counts), daemon=True)
+
+    for thread in threads:
+        thread.start()
+    time.sleep(max(0.0, measure_from - time.monotonic()))
+    probe.start()
+    for thread in threads:
+        thread.join()
+    stop_probe.set()
+    probe.join()
+    for client in clients:
+        client.close()
+
+    all_samples = [sample for client_samples in samples for sample in client_samples]
+    result = {'concurrency': concurrency, **summarize_samples(all_samples, duration)}
+    result['lock_busy_ratio'] = lock_counts['busy'] / lock_counts['probes'] if lock_counts['probes'] else 0.0
+    result['by_kind'] = {kind: summarize_samples([sample for sample in all_samples if sample[0] == kind], duration)
+                         for kind in mix}
+    return result
+
+def find_saturation(levels):
+    """
+    Returns the peak throughput and the lowest concurrency that reaches 90% of
+    it: adding clients beyond that point mostly adds latency.
+    """
+    peak = max(levels, key=lambda level: level['throughput_per_s'])
+    knee = next(level for level in levels if level['throughput_per_s'] >= 0.9 * peak['throughput_per_s'])
+    return {'peak_throughput_per_s': peak['throughput_per_s'], 'peak_concurrency': peak['concurrency'],
+            'knee_concurrency': knee['concurrency']}
+
+def print_level(level):
+    print(f"{level['concurrency']:>5} clients {level['throughput_per_s']:>9.1f} req/s   p50 {level['p50_ms'] or 0:>8.2f} ms   "
+          f"p95 {level['p95_ms'] or 0:>8.2f} ms   p99 {level['p99_ms'] or 0:>8.2f} ms   "
+          f"errors {level['error_rate']:>6.2%}   lock busy {level['lock_busy_ratio']:>6.2%}")
+
+def run_load_test(work_dir, num_students=DEFAULT_STUDENTS, num_periods=DEFAULT_PERIODS, concurrency_levels=None,
+                  duration=DEFAULT_DURATION, warmup=DEFAULT_WARMUP, workers=None, threads=DEFAULT_THREADS,
+                  mix=None, seed=DEFAULT_SEED):
+    """
+    Seeds a synthetic cohort, starts the app under gunicorn and measures it at
+    increasing numbers of concurrent mentors, one level after another.
+
+    Args:
+        work_dir (str): Holds the cohort, database, model and server log.
+        num_students (int): Cohort size.
+        num_periods (int): Reporting periods per student.
+        concurrency_levels (list): Numbers of concurrent mentors to measure.
+        duration (float): Seconds measured per level.
+        warmup (float): Seconds run before each level is measured.
+        workers (int): gunicorn worker processes (default: 2 x cores + 1).
+        threads (int): Threads per worker.
+        mix (dict): Request kind -> relative weight (see DEFAULT_MIX).
+        seed (int): Seed for the cohort and every client's request sequence.
+
+    Returns:
+        dict: {'meta': ..., 'levels': [per-level results], 'saturation': ...}.
+    """
+    concurrency_levels = concurrency_levels or DEFAULT_CONCURRENCY
+    workers = workers or 2 * (os.cpu_count() or 1) + 1
+    mix = mix or DEFAULT_MIX
+    work_dir = os.path.abspath(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+
+    print(f"--- Seeding {num_students} students x {num_periods} periods in '{work_dir}' ---")
+    start_time = time.perf_counter()
+    if seed_cohort(work_dir, num_students, num_periods, seed):
+        print(f"-> Seeded in {time.perf_counter() - start_time:.1f}s.")
+    else:
+        print("-> Reusing the cohort already seeded there.")
+
+    db_file = os.path.join(work_dir, DB_FILE)
+    student_ids = load_student_ids(db_file)
+    port = find_free_port()
+
+    print(f"--- Serving on 127.0.0.1:{port} with {workers} workers x {threads} threads; mix {mix} ---")
+    levels = []
+    with run_server(work_dir, port, workers, threads):
+        for concurrency in concurrency_levels:
+            level = run_level(port, db_file, student_ids, mix, concurrency, duration, warmup, seed)
+            levels.append(level)
+            print_level(level)
+
+    return {
+        'meta': {
+            'commit': get_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'students': num_students,
+            'periods': num_periods,
+            'seed': seed,
+            'workers': workers,
+            'threads': threads,
+            'duration': duration,
+            'warmup': warmup,
+            'mix': mix,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'levels': levels,
+        'saturation': find_saturation(levels),
+    }
+
+def compare_results(baseline, current):
+    """Prints the change in throughput and p95 latency at every concurrency level both runs measured."""
+    print(f"\n--- Compared with {baseline['meta'].get('commit')} ({baseline['meta']['students']} students, "
+          f"{baseline['meta']['workers']} workers) ---")
+    baseline_levels = {level['concurrency']: level for level in baseline['levels']}
+    for level in current['levels']:
+        before = baseline_levels.get(level['concurrency'])
+        if before is None:
+            continue
+        changes = []
+        for key in ('throughput_per_s', 'p95_ms'):
+            if before[key] and level[key] is not None:
+                changes.append(f"{key} {before[key]:>9.1f} -> {level[key]:>9.1f} ({(level[key] - before[key]) / before[key] * 100:>+6.1f}%)")
+        print(f"{level['concurrency']:>5} clients   " + '   '.join(changes))
+
+def parse_mix(text):
+    """Parses 'dashboard=10,student=45,...' into a DEFAULT_MIX-style dict."""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request kind '{kind.strip()}'; use {', '.join(DEFAULT_MIX)}.")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test the app under gunicorn with simulated mentors.")
+    parser.add_argument('--students', type=int, default=DEFAULT_STUDENTS, help=f"Cohort size (default: {DEFAULT_STUDENTS}).")
+    parser.add_argument('--periods', type=int, default=DEFAULT_PERIODS, help=f"Reporting periods per student (default: {DEFAULT_PERIODS}).")
+    parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)),
+                        help=f"Comma-separated numbers of concurrent mentors (default: {','.join(map(str, DEFAULT_CONCURRENCY))}).")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help=f"Seconds measured per level (default: {DEFAULT_DURATION}).")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP, help=f"Seconds before each level is measured (default: {DEFAULT_WARMUP}).")
+    parser.add_argument('--workers', type=int, default=None, help="gunicorn worker processes (default: 2 x cores + 1).")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help=f"Threads per worker (default: {DEFAULT_THREADS}).")
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help=f"Request weights (default: {','.join(f'{kind}={weight}' for kind, weight in DEFAULT_MIX.items())}).")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED}).")
+    parser.add_argument('--work-dir', default='loadtest_work', help="Where the cohort is seeded and kept between runs (default: loadtest_work).")
+    parser.add_argument('--output', default=RESULTS_FILE, help=f"Where to write the JSON results (default: {RESULTS_FILE}).")
+    parser.add_argument('--compare', default=None, help="A previous results file to compare against.")
+    args = parser.parse_args()
+
+    output_file = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    try:
+        load_test = run_load_test(args.work_dir, args.students, args.periods,
+                                  [int(value) for value in args.concurrency.split(',')], args.duration, args.warmup,
+                                  args.workers, args.threads, args.mix, args.seed)
+    except (ImportError, RuntimeError) as e:
+        print(f"🛑 FATAL ERROR: {e}")
+        sys.exit(1)
+
+    saturation = load_test['saturation']
+    print(f"-> Peak {saturation['peak_throughput_per_s']:.1f} req/s at {saturation['peak_concurrency']} clients; "
+          f"90% of it is reached at {saturation['knee_concurrency']} clients.")
+    with open(output_file, 'w') as f:
+        json.dump(load_test, f, indent=2)
+    print(f"-> Results saved to '{output_file}'.")
+
+    if baseline is not None:
+        compare_results(baseline, load_test)
@@ -0,0 +1,140 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Upper bounds (seconds) of the latency histogram buckets, from sub-millisecond
+# lookups up to full-cohort scoring.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_METRIC = 'mentors_eye_stage_duration_seconds'
+REQUEST_METRIC = 'mentors_eye_request_duration_seconds'
+
+class Histogram:
+    """A thread-safe latency histogram with fixed bucket bounds, like a Prometheus histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1) # The last slot is the +Inf bucket
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (cumulative bucket counts including +Inf, sum of observations, count).
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+class MetricsRegistry:
+    """
+    Named histograms, one per combination of label values, kept in process and
+    rendered in the Prometheus text exposition format. Recording a value costs
+    a dict lookup and a short lock, so it is cheap enough for every request.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {} # (metric name, sorted label items) -> Histogram
+        self._descriptions = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, description):
+        """Sets the HELP text rendered for a metric."""
+        self._descriptions[name] = description
+
+    def observe(self, name, value, **labels):
+        """Records one observation of 'name' with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Times the body of a 'with' block and records it, even if it raises."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def render(self):
+        """
+        Returns:
+            list: Prometheus text-format lines for every histogram.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+
+        lines = []
+        described = set()
+        for (name, labels), histogram in histograms:
+            if name not in described:
+                described.add(name)
+                if name in self._descriptions:
+                    lines.append(f"# HELP {name} {self._descriptions[name]}")
+                lines.append(f"# TYPE {name} histogram")
+
+            cumulative, total, count = histogram.snapshot()
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), cumulative):
+                lines.append(f"{name}_bucket{format_labels(dict(labels, le=bound))} {bucket_count}")
+            lines.append(f"{name}_sum{format_labels(dict(labels))} {total!r}")
+            lines.append(f"{name}_count{format_labels(dict(labels))} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+def format_labels(labels):
+    """Formats a label dict as {key="value",...}, escaped as the text format requires."""
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def format_metric(name, metric_type, description, samples):
+    """
+    Formats a gauge or counter for the text format.
+
+    Args:
+        name (str): Metric name.
+        metric_type (str): 'gauge' or 'counter'.
+        description (str): HELP text.
+        samples (list): (labels dict, value) pairs.
+
+    Returns:
+        list: Text-format lines.
+    """
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{format_labels(labels)} {value!r}" for labels, value in samples)
+    return lines
+
+# --- Process-wide Registry ---
+# Shared by app.py, predict.py and db.py so that every stage ends up on /metrics.
+metrics = MetricsRegistry()
+metrics.describe(STAGE_METRIC, "Time spent in each serving stage (DB query, DataFrame building, model inference, factor evaluation, rendering).")
+metrics.describe(REQUEST_METRIC, "Time from receiving a request to returning its response, by endpoint.")
+
+def time_stage(stage):
+    """Times one serving stage, e.g. 'with time_stage('db_query'): ...'."""
+    return metrics.time(STAGE_METRIC, stage=stage)
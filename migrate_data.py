@@ -1,16 +1,82 @@
-import pandas as pd
 import sqlite3
 import os
 
+from data_store import read_records
+from database_setup import METRIC_COLUMNS, RECORD_COLUMNS, STUDENT_COLUMNS, create_tables
+from risk_scores import precompute_risk_scores
+from trends import refresh_student_trends
+
 # --- Configuration ---
 # This script reads from the master data file we created.
 DATA_FILE = 'master_student_data_historical.csv'
 DB_FILE = 'mentors_eye.db'
 
+def upsert_student_records(conn, records_df):
+    """
+    Writes flat student records into the normalized tables. Student attributes
+    go to 'students' and per-period values to 'student_period_metrics'; rows
+    that already exist for the same key are overwritten.
+
+    Args:
+        conn (sqlite3.Connection): An open database connection.
+        records_df (pd.DataFrame): Records in the flat RECORD_COLUMNS shape.
+    """
+    # The latest record wins for attributes that live on the student dimension.
+    latest_df = records_df.sort_values('ReportingPeriod').drop_duplicates('StudentID', keep='last')
+    students_df = latest_df[STUDENT_COLUMNS].astype(object).where(latest_df[STUDENT_COLUMNS].notna(), None)
+    students_df['Phone'] = students_df['Phone'].map(lambda phone: None if phone is None else str(phone))
+    students_df['ReportingPeriod'] = latest_df['ReportingPeriod'].map(int)
+
+    metrics_df = records_df[METRIC_COLUMNS].astype(object).where(records_df[METRIC_COLUMNS].notna(), None)
+
+    # Runs before the metrics are written, so a correction to an older period
+    # is compared with the student's stored latest period and leaves their
+    # current attributes alone.
+    conn.executemany(
+        f"INSERT INTO students ({', '.join(STUDENT_COLUMNS)}) VALUES ({', '.join('?' * len(STUDENT_COLUMNS))}) "
+        f"ON CONFLICT(StudentID) DO UPDATE SET "
+        f"{', '.join(f'{column} = excluded.{column}' for column in STUDENT_COLUMNS[1:])} "
+        f"WHERE ? >= (SELECT COALESCE(MAX(ReportingPeriod), ?) FROM student_period_metrics WHERE StudentID = excluded.StudentID)",
+        ((*row[:-1], row[-1], row[-1]) for row in students_df.itertuples(index=False, name=None))
+    )
+    conn.executemany(
+        f"INSERT OR REPLACE INTO student_period_metrics ({', '.join(METRIC_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(METRIC_COLUMNS))})",
+        metrics_df.itertuples(index=False, name=None)
+    )
+
+def refresh_latest_student_state(conn, student_ids=None):
+    """
+    Rebuilds rows of the materialized 'latest_student_state' table from the
+    normalized tables.
+
+    Args:
+        conn (sqlite3.Connection): An open database connection.
+        student_ids (list): Only refresh these students. Refreshes everyone if omitted.
+    """
+    latest_query = f'''
+        INSERT OR REPLACE INTO latest_student_state ({', '.join(RECORD_COLUMNS)})
+        SELECT {', '.join(RECORD_COLUMNS)} FROM student_records r
+        WHERE r.ReportingPeriod = (
+            SELECT MAX(ReportingPeriod) FROM student_period_metrics m WHERE m.StudentID = r.StudentID
+        )
+    '''
+    if student_ids is None:
+        conn.execute('DELETE FROM latest_student_state')
+        conn.execute(latest_query)
+        return
+
+    student_ids = list(student_ids)
+    # Chunked to stay under SQLite's bound-parameter limit.
+    for start in range(0, len(student_ids), 900):
+        chunk = student_ids[start:start + 900]
+        placeholders = ', '.join('?' * len(chunk))
+        conn.execute(latest_query + f' AND r.StudentID IN ({placeholders})', chunk)
+
 def migrate_data_to_db():
     """
     Reads the comprehensive historical student data from the CSV
-    and populates the 'students' table in the SQLite database.
+    and populates the normalized student tables in the SQLite database.
     This is a one-time operation to set up the application's data source.
     """
     if not os.path.exists(DATA_FILE):
@@ -24,26 +90,38 @@ def migrate_data_to_db():
         return
 
     print(f"--- Starting data migration from '{DATA_FILE}' to '{DB_FILE}' ---")
-    
-    df = pd.read_csv(DATA_FILE)
-    
+
+    # Uses the columnar copy of the data file when there is one (see data_store.py).
+    df = read_records(DATA_FILE)
+
     # Establish connection to the database
     conn = sqlite3.connect(DB_FILE)
-    
-    # Use pandas' to_sql function for an efficient bulk insert.
-    # 'if_exists='replace'' will drop the table if it already exists and create a new one.
-    # This ensures a clean slate every time you run the setup.
-    df.to_sql('students', conn, if_exists='replace', index=False)
-    
+
+    # Make sure the declared schema (keys, indexes, WAL) exists; it is never
+    # dropped, so the constraints and indexes survive every migration.
+    create_tables(conn)
+
+    # Replace the student data in a single transaction for a clean slate.
+    with conn:
+        conn.execute('DELETE FROM latest_student_state')
+        conn.execute('DELETE FROM student_period_metrics')
+        conn.execute('DELETE FROM students')
+        upsert_student_records(conn, df)
+        refresh_latest_student_state(conn)
+        refresh_student_trends(conn)
+
     # Verify the migration by counting the inserted rows
-    count = pd.read_sql('SELECT COUNT(*) FROM students', conn).iloc[0, 0]
-    
+    count = conn.execute('SELECT COUNT(*) FROM student_period_metrics').fetchone()[0]
+    student_count = conn.execute('SELECT COUNT(*) FROM latest_student_state').fetchone()[0]
+
     conn.close()
-    
-    print(f"-> Successfully migrated {count} records into the 'students' table.")
+
+    print(f"-> Successfully migrated {count} records for {student_count} students.")
+
+    # Score every record up front so the dashboard never has to run the model.
+    precompute_risk_scores(DB_FILE)
     print("--- Data Migration Complete ---")
     print("Next, you can run the final application with 'python app.py'.")
 
 if __name__ == '__main__':
     migrate_data_to_db()
-
@@ -0,0 +1,430 @@
+import os
+import random
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from db import ConnectionPool
+
+# --- Configuration ---
+MODEL_FILE = 'student_dropout_model.joblib'
+LABEL_ENCODER_FILE = 'label_encoder.joblib'
+COMPILED_MODEL_FILE = 'student_dropout_model.compiled.joblib'
+# A process that has not reported the versions it serves for this long is
+# assumed to have exited.
+SERVER_TIMEOUT_SECONDS = 300
+
+# A loaded, ready-to-serve model. 'version' keys stored risk scores.
+# 'artifact_bytes' is the size of the files it was loaded from, a proxy for its memory use.
+LoadedModel = namedtuple('LoadedModel', ['model', 'label_encoder', 'version', 'load_seconds', 'artifact_bytes'])
+
+# --- Serving Versions ---
+# Several processes (e.g. gunicorn workers) serve scores from the same
+# database, and each swaps models on its own schedule. Every process records
+# the versions it serves, so a version's scores are only deleted once no live
+# process still reads them.
+def create_model_servers_table(conn):
+    """Creates the 'model_servers' table if it does not exist yet. It has one row per serving process."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS model_servers (
+            server_id TEXT PRIMARY KEY, -- host:pid:registry
+            model_version TEXT,
+            shadow_version TEXT,
+            updated_at REAL NOT NULL -- Unix time of the last report
+        );
+    ''')
+
+def record_serving_versions(conn, server_id, model_version, shadow_version):
+    """Records the versions a process serves, and forgets processes that stopped reporting long ago."""
+    now = time.time()
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO model_servers (server_id, model_version, shadow_version, updated_at) VALUES (?, ?, ?, ?)',
+            (server_id, model_version, shadow_version, now)
+        )
+        conn.execute('DELETE FROM model_servers WHERE updated_at < ?', (now - 10 * SERVER_TIMEOUT_SECONDS,))
+
+def fetch_served_versions(conn, timeout=SERVER_TIMEOUT_SECONDS):
+    """Returns every model version (serving or shadow) that a live process reported."""
+    rows = conn.execute('SELECT model_version, shadow_version FROM model_servers WHERE updated_at >= ?',
+                        (time.time() - timeout,))
+    return {version for row in rows for version in row if version is not None}
+
+# Promotions are recorded too, so that every process promotes the same shadow
+# model (on its own watcher thread) instead of each deciding on the sample of
+# traffic it happened to see.
+def create_model_promotions_table(conn):
+    """Creates the 'model_promotions' table if it does not exist yet."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS model_promotions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_version TEXT NOT NULL,
+            reason TEXT NOT NULL, -- manual or shadow
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+def record_promotion(conn, model_version, reason):
+    """Records the decision to promote a model version, for every process's watcher to apply."""
+    create_model_promotions_table(conn)
+    with conn:
+        conn.execute('INSERT INTO model_promotions (model_version, reason) VALUES (?, ?)', (model_version, reason))
+
+def fetch_promoted_version(conn):
+    """Returns the most recently promoted model version, or None."""
+    create_model_promotions_table(conn)
+    row = conn.execute('SELECT model_version FROM model_promotions ORDER BY id DESC LIMIT 1').fetchone()
+    return row[0] if row else None
+
+class ModelRegistry:
+    """
+    Owns the model that the app serves.
+    Nothing is loaded until the first call to get() (or a background warm-up),
+    so importing the app stays cheap. Artifacts are memory-mapped, so forked
+    workers share the same physical pages for the node arrays.
+
+    A watcher thread can pick up retrained artifacts while the app is running.
+    New models are loaded off the request path and swapped in atomically,
+    either immediately or after shadow-scoring a sample of live traffic.
+    """
+
+    def __init__(self, model_file=MODEL_FILE, label_encoder_file=LABEL_ENCODER_FILE,
+                 compiled_file=COMPILED_MODEL_FILE, mmap_mode='r', shadow_sample_rate=0.0,
+                 shadow_min_samples=200, max_disagreement_rate=0.05, prepare=None, on_swap=None, db_file=None,
+                 on_sync=None):
+        """
+        Args:
+            model_file, label_encoder_file, compiled_file (str): The artifact paths.
+            mmap_mode (str): Passed to joblib.load for the model arrays.
+            shadow_sample_rate (float): Fraction of shadow_score() calls that compare a new
+                model against the current one before it is promoted. 0 promotes immediately.
+            shadow_min_samples (int): Comparisons needed before a shadow model is judged.
+            max_disagreement_rate (float): Highest disagreement rate that is auto-promoted.
+            prepare (callable): Called with a new LoadedModel before it is promoted,
+                e.g. to queue the scoring of the cohort with it.
+            on_swap (callable): Called with (previous, new) LoadedModel after a swap.
+            db_file (str): The database the scores are served from. When given, the
+                versions this process serves are recorded there, and scores of versions
+                it no longer serves are deleted once no other process serves them either.
+            on_sync (callable): Called on the watcher thread after every poll.
+        """
+        self.model_file = model_file
+        self.label_encoder_file = label_encoder_file
+        self.compiled_file = compiled_file
+        self.mmap_mode = mmap_mode
+        self.shadow_sample_rate = shadow_sample_rate
+        self.shadow_min_samples = shadow_min_samples
+        self.max_disagreement_rate = max_disagreement_rate
+        self.prepare = prepare
+        self.on_swap = on_swap
+        self.db_file = db_file
+        self.on_sync = on_sync
+        self.server_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._pool = ConnectionPool(db_file) if db_file else None
+        self._retired_versions = set() # Served by this process before, scores not deleted yet
+        self._requested_promotion = None
+        self._current = None
+        self._shadow = None
+        self._shadow_compared = 0
+        self._shadow_disagreed = 0
+        self._artifact_signature = None
+        self._pending_signature = None
+        self._swap_count = 0
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-shadow')
+
+    def get(self):
+        """
+        Returns the current LoadedModel, loading it on first use.
+        Safe to call from many threads; only one of them performs the load.
+
+        Returns:
+            LoadedModel: The model, or None if the artifacts do not exist yet.
+        """
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._artifact_signature = self._get_artifact_signature()
+                    self._current = self._load()
+                    loaded_now = self._current is not None
+                else:
+                    loaded_now = False
+                current = self._current
+            if loaded_now:
+                # Reported straight away, so no other process deletes these scores before the first poll.
+                self._report_serving()
+        return current
+
+    @property
+    def is_loaded(self):
+        return self._current is not None
+
+    def _load(self):
+        """Loads the artifacts. The compiled model is preferred over the pipeline."""
+        if not os.path.exists(self.model_file) or not os.path.exists(self.label_encoder_file):
+            print(f"🛑 ERROR: Could not load model files: '{self.model_file}' or '{self.label_encoder_file}' is missing.")
+            print("Please ensure you have run 'train_model.py' successfully.")
+            return None
+
+        # Imported here so that importing the app does not pull in NumPy or joblib.
+        import joblib
+        from compiled_model import load_compiled_model
+        from risk_scores import get_model_version
+
+        start_time = time.perf_counter()
+        model = load_compiled_model(self.compiled_file, self.model_file, mmap_mode=self.mmap_mode)
+        if model is not None:
+            label_encoder = model.label_encoder
+            artifact_bytes = os.path.getsize(self.compiled_file)
+        else:
+            model = joblib.load(self.model_file, mmap_mode=self.mmap_mode)
+            label_encoder = joblib.load(self.label_encoder_file)
+            artifact_bytes = os.path.getsize(self.model_file) + os.path.getsize(self.label_encoder_file)
+        # Stored risk scores are keyed by this version, so a retrained model never serves stale scores.
+        version = get_model_version(self.model_file)
+        load_seconds = time.perf_counter() - start_time
+
+        print(f"--- Model loaded in {load_seconds * 1000:.0f} ms ({type(model).__name__}, version {version}). ---")
+        return LoadedModel(model, label_encoder, version, load_seconds, artifact_bytes)
+
+    def warm_up_in_background(self):
+        """Starts loading the model on a daemon thread so the first request does not wait for it."""
+        def warm_up():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"🛑 ERROR: Background model warm-up failed: {e}")
+
+        thread = threading.Thread(target=warm_up, name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    # --- Hot Reload ---
+    def _get_artifact_signature(self):
+        """Returns (mtime, size) for every artifact, to cheaply detect new files."""
+        signature = []
+        for path in (self.model_file, self.label_encoder_file, self.compiled_file):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def check_for_update(self):
+        """
+        Loads the artifacts again if they changed on disk since the last load.
+        A new model version is promoted straight away, or parked as a shadow
+        model when shadow scoring is enabled. Runs on the watcher thread.
+
+        Returns:
+            bool: True if a new model was loaded.
+        """
+        if self._current is None:
+            return False # Nothing served yet; get() will load the latest files.
+
+        signature = self._get_artifact_signature()
+        if signature == self._artifact_signature:
+            return False
+        if signature != self._pending_signature:
+            # Wait until the files have stopped changing, so a half-finished
+            # retrain is never picked up.
+            self._pending_signature = signature
+            return False
+
+        candidate = self._load()
+        self._artifact_signature = signature
+        if candidate is None:
+            return False
+
+        if (candidate.version == self._current.version or self.shadow_sample_rate <= 0
+                or (self._coordinated and fetch_promoted_version(self._pool.get_connection()) == candidate.version)):
+            # The same model in a new format (e.g. a freshly compiled artifact), no shadowing,
+            # or another process has already promoted it.
+            self._promote(candidate)
+        else:
+            with self._lock:
+                self._shadow = candidate
+                self._shadow_compared = 0
+                self._shadow_disagreed = 0
+            print(f"--- Shadow-scoring model {candidate.version} against {self._current.version}. ---")
+        return True
+
+    def _promote(self, candidate):
+        """Prepares a new model and atomically makes it the one that get() returns."""
+        if self.prepare is not None:
+            self.prepare(candidate)
+        with self._lock:
+            previous = self._current
+            self._current = candidate
+            if self._shadow is candidate:
+                self._shadow = None
+            self._swap_count += 1
+            if previous is not None and previous.version != candidate.version:
+                self._retired_versions.add(previous.version)
+            self._retired_versions.discard(candidate.version)
+        print(f"--- Promoted model {candidate.version} (was {previous.version if previous else None}). ---")
+        if self.on_swap is not None:
+            self.on_swap(previous, candidate)
+
+    def promote_shadow(self):
+        """
+        Promotes the current shadow model regardless of its disagreement rate.
+        Only the decision is made here: the new model is prepared and swapped
+        in by every process's watcher (or this registry's shadow thread when
+        there is no database), so the caller returns straight away.
+
+        Returns:
+            str: The version being promoted, or None if there is no shadow model.
+        """
+        shadow = self._shadow
+        if shadow is None:
+            return None
+        self._request_promotion(shadow, 'manual')
+        return shadow.version
+
+    @property
+    def _coordinated(self):
+        return self._pool is not None and os.path.exists(self.db_file)
+
+    def _request_promotion(self, shadow, reason):
+        if self._requested_promotion == shadow.version and reason != 'manual':
+            return
+        self._requested_promotion = shadow.version
+        if self._coordinated:
+            record_promotion(self._pool.get_connection(), shadow.version, reason)
+            print(f"--- Requested promotion of model {shadow.version} ({reason}). ---")
+        else:
+            self._shadow_executor.submit(self._promote, shadow)
+
+    def start_watching(self, interval=10, watch_files=True):
+        """
+        Polls every 'interval' seconds on a daemon thread: picks up new
+        artifacts (unless watch_files is False) and syncs with the other
+        processes serving the same database.
+        """
+        def watch():
+            while not self._stopped.wait(interval):
+                if watch_files:
+                    try:
+                        self.check_for_update()
+                    except Exception as e:
+                        print(f"🛑 ERROR: Model reload failed: {e}")
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"🛑 ERROR: Model sync failed: {e}")
+            if self._pool is not None:
+                self._pool.close_all()
+
+        thread = threading.Thread(target=watch, name='model-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    # --- Coordination ---
+    def _report_serving(self):
+        if self._pool is None or not os.path.exists(self.db_file):
+            return
+        try:
+            conn = self._pool.get_connection()
+            create_model_servers_table(conn)
+            current, shadow = self._current, self._shadow
+            record_serving_versions(conn, self.server_id, current.version if current else None,
+                                    shadow.version if shadow else None)
+        except Exception as e:
+            print(f"🛑 ERROR: Could not record the serving model version: {e}")
+
+    def sync(self):
+        """
+        Records the versions this process serves, applies a promotion of its
+        shadow model recorded by any process, and deletes the scores of
+        versions it has retired once no live process serves them any more.
+        Runs on the watcher thread.
+        """
+        self._report_serving()
+        shadow = self._shadow
+        if shadow is not None and self._coordinated and fetch_promoted_version(self._pool.get_connection()) == shadow.version:
+            self._promote(shadow)
+        if self._retired_versions and self._coordinated:
+            from risk_scores import delete_model_version_scores
+
+            conn = self._pool.get_connection()
+            for version in self._retired_versions - fetch_served_versions(conn):
+                with conn:
+                    deleted = delete_model_version_scores(conn, version)
+                self._retired_versions.discard(version)
+                print(f"--- Deleted {deleted} scores of model {version}, which no process serves any more. ---")
+        if self.on_sync is not None:
+            self.on_sync()
+
+    def stop(self):
+        """Stops the watcher and shadow threads and drops the loaded models, e.g. when a tenant is closed."""
+        self._stopped.set()
+        self._shadow_executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._current = None
+            self._shadow = None
+
+    def memory_bytes(self):
+        """Approximate memory held by the loaded models: the size of the artifacts they were loaded from."""
+        return sum(loaded.artifact_bytes for loaded in (self._current, self._shadow) if loaded is not None)
+
+    # --- Shadow Scoring ---
+    def shadow_score(self, students_df):
+        """
+        Samples live traffic for shadow comparison. The comparison itself runs
+        on a background thread, so the request that triggered it is not slowed down.
+
+        Args:
+            students_df (pd.DataFrame): The records the current model just served.
+        """
+        if self._shadow is None or random.random() >= self.shadow_sample_rate:
+            return
+        self._shadow_executor.submit(self._compare_with_shadow, self._current, self._shadow, students_df)
+
+    def _compare_with_shadow(self, current, shadow, students_df):
+        from predict import score_students
+
+        try:
+            served_levels = score_students(students_df, current.model, current.label_encoder)[0]
+            shadow_levels = score_students(students_df, shadow.model, shadow.label_encoder)[0]
+        except Exception as e:
+            print(f"🛑 ERROR: Shadow scoring failed: {e}")
+            return
+
+        with self._lock:
+            if self._shadow is not shadow:
+                return # Promoted or replaced in the meantime
+            self._shadow_compared += len(served_levels)
+            self._shadow_disagreed += int((served_levels != shadow_levels).sum())
+            compared, disagreed = self._shadow_compared, self._shadow_disagreed
+
+        if compared >= self.shadow_min_samples:
+            disagreement_rate = disagreed / compared
+            if disagreement_rate <= self.max_disagreement_rate:
+                self._request_promotion(shadow, 'shadow')
+            elif compared - len(served_levels) < self.shadow_min_samples:
+                print(f"--- Shadow model {shadow.version} disagrees on {disagreement_rate:.1%} of "
+                      f"{compared} samples; not promoting automatically. ---")
+
+    def status(self):
+        """
+        Returns:
+            dict: The serving and shadow model versions, plus shadow disagreement stats.
+        """
+        with self._lock:
+            current, shadow = self._current, self._shadow
+            compared, disagreed = self._shadow_compared, self._shadow_disagreed
+        return {
+            'version': current.version if current else None,
+            'model_type': type(current.model).__name__ if current else None,
+            'swaps': self._swap_count,
+            'shadow_version': shadow.version if shadow else None,
+            'shadow_sample_rate': self.shadow_sample_rate,
+            'shadow_compared': compared if shadow else 0,
+            'shadow_disagreement_rate': (disagreed / compared) if shadow and compared else None,
+        }
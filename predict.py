@@ -1,7 +1,10 @@
-import joblib
-import pandas as pd
+import json
+import operator
+import os
 import numpy as np
 
+from metrics import time_stage
+
 # --- Configuration ---
 # These thresholds define what constitutes a "risk factor". They can be adjusted.
 ATTENDANCE_THRESHOLD = 75
@@ -9,6 +12,97 @@ SCORE_THRESHOLD = 60
 FINANCIAL_STRESS_THRESHOLD = 4 # High risk if score is 4 or 5
 CAREER_CONFIDENCE_THRESHOLD = 2 # High risk if score is 1 or 2
 
+# The declarative rule table. Edit risk_rules.json to change which factors are
+# flagged without touching the code; these defaults are used if it is missing.
+# RISK_RULES_FILE in the environment overrides the path, e.g. so that scripts
+# run in a tenant's directory use the deployment's rules (see tenants.py).
+RISK_RULES_FILE = os.environ.get('RISK_RULES_FILE', 'risk_rules.json')
+DEFAULT_RISK_RULES = [
+    {'text': 'Low Attendance', 'column': 'AttendancePercentage', 'op': '<', 'value': ATTENDANCE_THRESHOLD},
+    {'text': 'Low Average Score', 'column': 'AverageScore', 'op': '<', 'value': SCORE_THRESHOLD},
+    {'text': 'Overdue Fees', 'column': 'FeeStatus', 'op': '==', 'value': 'Overdue'},
+    {'text': 'High Financial Stress', 'column': 'FinancialStressScore', 'op': '>=', 'value': FINANCIAL_STRESS_THRESHOLD},
+    {'text': 'Health Issues Impacting Study', 'column': 'HealthImpact', 'op': '==', 'value': 'Yes'},
+    {'text': 'Low Career Confidence', 'column': 'CareerConfidenceScore', 'op': '<=', 'value': CAREER_CONFIDENCE_THRESHOLD},
+]
+RULE_OPERATORS = {
+    '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+MAX_RISK_RULES = 63 # One bit per rule; the bitmask must fit SQLite's signed INTEGER
+
+# Identifier and label columns that are never fed to the model.
+NON_FEATURE_COLUMNS = ['StudentID', 'Name', 'Email', 'Phone', 'Target', 'ReportingPeriod']
+
+def load_risk_rules(rules_file=RISK_RULES_FILE):
+    """
+    Loads the risk factor rule table from a JSON file.
+    Each rule is a dict with 'text', 'column', 'op' and 'value' keys. Falls back
+    to DEFAULT_RISK_RULES when the file does not exist.
+
+    Args:
+        rules_file (str): Path to the JSON rule table.
+
+    Returns:
+        list: The validated list of rule dicts. A rule's position is its bit.
+    """
+    if not os.path.exists(rules_file):
+        return list(DEFAULT_RISK_RULES)
+
+    with open(rules_file) as f:
+        rules = json.load(f)
+
+    if len(rules) > MAX_RISK_RULES:
+        raise ValueError(f"At most {MAX_RISK_RULES} risk rules are supported, got {len(rules)}.")
+    for rule in rules:
+        missing = {'text', 'column', 'op', 'value'} - set(rule)
+        if missing:
+            raise ValueError(f"Risk rule {rule} is missing keys: {sorted(missing)}")
+        if rule['op'] not in RULE_OPERATORS:
+            raise ValueError(f"Unknown operator '{rule['op']}' in risk rule '{rule['text']}'.")
+    return rules
+
+RISK_RULES = load_risk_rules()
+
+def evaluate_risk_factors(students_df, rules=None):
+    """
+    Evaluates every risk rule over a whole DataFrame at once.
+    Each rule is one vectorized comparison over a column, so the cost does not
+    grow with a Python loop per student.
+
+    Args:
+        students_df (pd.DataFrame): One row per student.
+        rules (list): Rule table to apply. Defaults to RISK_RULES.
+
+    Returns:
+        np.ndarray: A uint64 bitmask per row; bit i is set when rules[i] triggers.
+    """
+    rules = RISK_RULES if rules is None else rules
+    bitmasks = np.zeros(len(students_df), dtype=np.uint64)
+
+    for bit, rule in enumerate(rules):
+        values = students_df[rule['column']].to_numpy()
+        triggered = np.asarray(RULE_OPERATORS[rule['op']](values, rule['value']), dtype=bool)
+        bitmasks |= triggered.astype(np.uint64) << np.uint64(bit)
+
+    return bitmasks
+
+def expand_risk_factors(bitmask, rules=None):
+    """
+    Expands a factor bitmask into the list of {'text': ...} dicts used for rendering.
+
+    Args:
+        bitmask (int): A bitmask produced by evaluate_risk_factors.
+        rules (list): The rule table the bitmask was produced with. Defaults to RISK_RULES.
+
+    Returns:
+        list: One {'text': ...} dict per triggered factor, in rule order.
+    """
+    rules = RISK_RULES if rules is None else rules
+    bitmask = int(bitmask)
+    return [{'text': rule['text']} for bit, rule in enumerate(rules) if bitmask >> bit & 1]
+
 def get_holistic_risk_profile(student_data, model, label_encoder):
     """
     Calculates a student's risk profile using the holistic model pipeline.
@@ -22,41 +116,120 @@ def get_holistic_risk_profile(student_data, model, label_encoder):
     Returns:
         dict: A dictionary containing the risk level, probabilities, and a list of factors.
     """
-    # Predict the probability for each class
-    probabilities = model.predict_proba(student_data)[0]
-    
-    # Get the predicted class index
-    prediction_index = model.predict(student_data)[0]
-    risk_level = label_encoder.inverse_transform([prediction_index])[0]
+    with time_stage('model_inference'):
+        # Predict the probability for each class
+        probabilities = model.predict_proba(student_data)[0]
+
+        # Get the predicted class index
+        prediction_index = model.predict(student_data)[0]
+        risk_level = label_encoder.inverse_transform([prediction_index])[0]
 
     # Map probabilities to class names
     prob_dict = {label: round(prob, 2) for label, prob in zip(label_encoder.classes_, probabilities)}
 
     # --- Determine Risk Factors ---
-    factors = []
-    student = student_data.iloc[0] # Get the student's data as a Series
+    with time_stage('factor_evaluation'):
+        factor_bitmask = evaluate_risk_factors(student_data.head(1))[0]
+        factors = expand_risk_factors(factor_bitmask)
 
-    if student['AttendancePercentage'] < ATTENDANCE_THRESHOLD:
-        factors.append({'text': 'Low Attendance'})
-        
-    if student['AverageScore'] < SCORE_THRESHOLD:
-        factors.append({'text': 'Low Average Score'})
+    return {
+        'level': risk_level,
+        'probabilities': prob_dict,
+        'factors': factors
+    }
 
-    if student['FeeStatus'] == 'Overdue':
-        factors.append({'text': 'Overdue Fees'})
-        
-    if student['FinancialStressScore'] >= FINANCIAL_STRESS_THRESHOLD:
-        factors.append({'text': 'High Financial Stress'})
+def score_students(students_df, model, label_encoder):
+    """
+    Runs the model and the factor rules over a whole cohort in one pass.
+    The pipeline is evaluated once with predict_proba and the class is taken
+    from the argmax, exactly as predict() does it.
 
-    if student['HealthImpact'] == 'Yes':
-        factors.append({'text': 'Health Issues Impacting Study'})
+    Args:
+        students_df (pd.DataFrame): One row per student. Identifier columns
+            (StudentID, Name, ...) are dropped automatically if present.
+        model (Pipeline): The trained scikit-learn pipeline.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+
+    Returns:
+        tuple: (risk_levels, probabilities, factor_bitmasks) arrays, one entry per row.
+    """
+    features_df = students_df.drop(columns=NON_FEATURE_COLUMNS, errors='ignore')
+
+    with time_stage('model_inference'):
+        probabilities = model.predict_proba(features_df)
+        prediction_indices = model.classes_.take(np.argmax(probabilities, axis=1))
+        risk_levels = label_encoder.inverse_transform(prediction_indices)
+    with time_stage('factor_evaluation'):
+        factor_bitmasks = evaluate_risk_factors(features_df)
+
+    return risk_levels, probabilities, factor_bitmasks
+
+def explain_students(students_df, model, label_encoder, class_name):
+    """
+    Explains the model's probability of class_name for a whole batch at once,
+    with path-based tree contributions over the forest.
 
-    if student['CareerConfidenceScore'] <= CAREER_CONFIDENCE_THRESHOLD:
-        factors.append({'text': 'Low Career Confidence'})
+    Args:
+        students_df (pd.DataFrame): One row per student. Identifier columns
+            (StudentID, Name, ...) are dropped automatically if present.
+        model: The trained pipeline or its CompiledModel.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+        class_name (str): The class whose probability is explained, e.g. 'Dropout'.
 
+    Returns:
+        tuple: (expected_value, feature_names, contributions). For every row,
+        expected_value plus the row of the (n_rows, n_features) contributions
+        array equals the predicted probability of class_name.
+    """
+    from compiled_model import get_explainer
+
+    features_df = students_df.drop(columns=NON_FEATURE_COLUMNS, errors='ignore')
+    explainer = get_explainer(model, label_encoder)
+    class_index = list(label_encoder.classes_).index(class_name)
+
+    with time_stage('model_explanation'):
+        contributions = explainer.predict_contributions(features_df, class_index)
+    return explainer.expected_value(class_index), explainer.input_features, contributions
+
+def build_risk_profile(risk_level, probabilities, factor_bitmask, class_names):
+    """
+    Builds the risk profile dict rendered by the dashboard from raw scores.
+
+    Args:
+        risk_level (str): The predicted class name.
+        probabilities (sequence): Per-class probabilities, aligned with class_names.
+        factor_bitmask (int): The factor bitmask from evaluate_risk_factors.
+        class_names (sequence): The label encoder's classes_.
+
+    Returns:
+        dict: A dictionary containing the risk level, probabilities, and a list of factors.
+    """
     return {
         'level': risk_level,
-        'probabilities': prob_dict,
-        'factors': factors
+        'probabilities': {label: round(prob, 2) for label, prob in zip(class_names, probabilities)},
+        'factors': expand_risk_factors(factor_bitmask)
     }
 
+def get_holistic_risk_profiles(students_df, model, label_encoder):
+    """
+    Batch variant of get_holistic_risk_profile for a whole cohort.
+    Runs the pipeline once over every row, so the model is only evaluated a
+    single time no matter how many students there are.
+
+    Args:
+        students_df (pd.DataFrame): One row per student. Identifier columns
+            (StudentID, Name, ...) are dropped automatically if present.
+        model (Pipeline): The trained scikit-learn pipeline.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+
+    Returns:
+        list: One risk profile dict per row, in the same order as students_df.
+    """
+    if students_df.empty:
+        return []
+
+    risk_levels, probabilities, factor_bitmasks = score_students(students_df, model, label_encoder)
+    return [
+        build_risk_profile(risk_levels[i], probabilities[i], factor_bitmasks[i], label_encoder.classes_)
+        for i in range(len(students_df))
+    ]
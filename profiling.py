@@ -0,0 +1,86 @@
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# --- Configuration ---
+PROFILE_DIR = 'profiles'
+# Seconds between stack samples in 'stacks' mode.
+SAMPLE_INTERVAL = 0.001
+PROFILE_MODES = ('cprofile', 'stacks')
+
+class RequestProfiler:
+    """
+    Profiles a single request on the thread serving it.
+
+    'cprofile' records every call with cProfile and writes a .prof file (open
+    it with pstats or snakeviz). 'stacks' samples the thread's stack from a
+    helper thread every SAMPLE_INTERVAL seconds and writes the samples in the
+    folded format that flamegraph.pl and speedscope read; it is the cheaper
+    of the two, so timings stay closer to an unprofiled request.
+    """
+
+    def __init__(self, mode='cprofile', output_dir=PROFILE_DIR, sample_interval=SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'; expected one of {PROFILE_MODES}.")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self._profile = None
+        self._samples = Counter()
+        self._sampling = None
+        self._sampler = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            target_thread_id = threading.get_ident()
+            self._sampling = threading.Event()
+            self._sampling.set()
+            self._sampler = threading.Thread(target=self._sample, args=(target_thread_id,),
+                                             name='request-profiler', daemon=True)
+            self._sampler.start()
+
+    def _sample(self, target_thread_id):
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(target_thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._samples[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def stop(self, name):
+        """
+        Stops profiling and writes the result.
+
+        Args:
+            name (str): Used in the file name, e.g. the endpoint.
+
+        Returns:
+            str: The path of the written file.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name) or 'request'
+        base_path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**6:06d}-{safe_name}")
+
+        if self.mode == 'cprofile':
+            self._profile.disable()
+            path = base_path + '.prof'
+            self._profile.dump_stats(path)
+        else:
+            self._sampling.clear()
+            self._sampler.join()
+            path = base_path + '.folded'
+            with open(path, 'w') as f:
+                for stack, count in self._samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+import joblib
+import pandas as pd
+
+from live_updates import create_change_events_table, find_risk_changes, publish_events
+from predict import RISK_RULES, build_risk_profile, explain_students, score_students
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+MODEL_FILE = 'student_dropout_model.joblib'
+LABEL_ENCODER_FILE = 'label_encoder.joblib'
+
+# Rows are written to SQLite in batches of this size during bulk scoring.
+INSERT_BATCH_SIZE = 5000
+
+# The class whose probability the cohort is ranked by.
+RISK_CLASS = 'Dropout'
+# Decimal places kept for stored feature contributions.
+EXPLANATION_PRECISION = 4
+
+def get_model_version(model_file=MODEL_FILE):
+    """
+    Computes the version tag that stored risk scores are keyed by.
+    It is a hash of the model artifact's bytes together with the active risk
+    rule table, so retraining the model or editing risk_rules.json both
+    invalidate previously stored scores automatically.
+
+    Args:
+        model_file (str): Path to the joblib model artifact.
+
+    Returns:
+        str: A short hex digest identifying the model version.
+    """
+    digest = hashlib.sha256()
+    with open(model_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    digest.update(json.dumps(RISK_RULES, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def create_risk_scores_table(conn):
+    """Creates the 'risk_scores' table and its ranking index if they do not exist yet."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_scores (
+            StudentID TEXT NOT NULL,
+            ReportingPeriod INTEGER NOT NULL,
+            model_version TEXT NOT NULL,
+            level TEXT NOT NULL,
+            probabilities TEXT NOT NULL, -- JSON object of class name -> probability
+            dropout_probability REAL NOT NULL DEFAULT 0, -- probabilities[RISK_CLASS], for ranking
+            factor_bitmask INTEGER NOT NULL,
+            explanation TEXT, -- JSON per-feature contributions to RISK_CLASS's probability
+            scored_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (StudentID, ReportingPeriod, model_version)
+        );
+    ''')
+
+    # Tables created before scores were ranked lack the ranking column; backfill it.
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(risk_scores)")]
+    if 'dropout_probability' not in columns:
+        with conn:
+            conn.execute("ALTER TABLE risk_scores ADD COLUMN dropout_probability REAL NOT NULL DEFAULT 0")
+            conn.execute(f"UPDATE risk_scores SET dropout_probability = json_extract(probabilities, '$.{RISK_CLASS}')")
+    # Scores stored before explanations existed get theirs the first time they are read.
+    if 'explanation' not in columns:
+        with conn:
+            conn.execute("ALTER TABLE risk_scores ADD COLUMN explanation TEXT")
+
+    # Lets the cohort API walk scores in rank order and stop after one page.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_risk_scores_rank
+        ON risk_scores(model_version, dropout_probability DESC, StudentID);
+    ''')
+
+def encode_explanations(expected_value, feature_names, contributions):
+    """Encodes each row of a contribution matrix from explain_students as the JSON stored in 'risk_scores'."""
+    rounded = contributions.round(EXPLANATION_PRECISION).tolist()
+    return [
+        json.dumps({'expected_value': round(expected_value, EXPLANATION_PRECISION), 'contributions': dict(zip(feature_names, row))})
+        for row in rounded
+    ]
+
+def build_explanation(explanation_json):
+    """Builds the explanation returned to the dashboard: contributions largest first."""
+    explanation = json.loads(explanation_json)
+    return {
+        'class': RISK_CLASS,
+        'expected_value': explanation['expected_value'],
+        'contributions': [
+            {'feature': feature, 'value': value}
+            for feature, value in sorted(explanation['contributions'].items(), key=lambda item: -abs(item[1]))
+        ],
+    }
+
+def store_risk_scores(conn, students_df, model, label_encoder, model_version, publish_changes=False):
+    """
+    Scores a batch of student records and writes the results to 'risk_scores'.
+    Existing rows for the same (StudentID, ReportingPeriod, model_version) are replaced.
+    Every row is stored with its explanation, computed for the whole batch at
+    once, so the dashboard never has to explain a score when it is opened.
+
+    Args:
+        conn (sqlite3.Connection): An open database connection.
+        students_df (pd.DataFrame): Student records, including StudentID and ReportingPeriod.
+        model (Pipeline): The trained scikit-learn pipeline.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+        model_version (str): The version tag from get_model_version.
+        publish_changes (bool): Also log a change event for every student whose
+            stored risk changed, for dashboards following live updates.
+
+    Returns:
+        tuple: (risk_levels, probabilities, factor_bitmasks) as computed by score_students.
+    """
+    scores = score_students(students_df, model, label_encoder)
+    risk_levels, probabilities, factor_bitmasks = scores
+    class_names = label_encoder.classes_
+    risk_class_index = list(class_names).index(RISK_CLASS)
+    explanations = encode_explanations(*explain_students(students_df, model, label_encoder, RISK_CLASS))
+
+    events = []
+    if publish_changes:
+        # Compared before writing, while the previous scores are still stored.
+        events = find_risk_changes(conn, students_df, model_version, risk_levels, probabilities, factor_bitmasks, class_names)
+
+    rows = [
+        (
+            student_id,
+            int(period),
+            model_version,
+            str(risk_levels[i]),
+            json.dumps({str(label): float(prob) for label, prob in zip(class_names, probabilities[i])}),
+            float(probabilities[i][risk_class_index]),
+            int(factor_bitmasks[i]),
+            explanations[i],
+        )
+        for i, (student_id, period) in enumerate(zip(students_df['StudentID'], students_df['ReportingPeriod']))
+    ]
+    conn.executemany(
+        'INSERT OR REPLACE INTO risk_scores '
+        '(StudentID, ReportingPeriod, model_version, level, probabilities, dropout_probability, factor_bitmask, explanation) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    if events:
+        create_change_events_table(conn)
+        publish_events(conn, events)
+    return scores
+
+def delete_other_model_versions(conn, model_version):
+    """Deletes stored scores from every model version except 'model_version'."""
+    conn.execute('DELETE FROM risk_scores WHERE model_version != ?', (model_version,))
+
+def delete_model_version_scores(conn, model_version):
+    """Deletes the stored scores of one model version. Returns the number of rows deleted."""
+    return conn.execute('DELETE FROM risk_scores WHERE model_version = ?', (model_version,)).rowcount
+
+def count_model_version_scores(conn, model_version):
+    """Returns how many scores are stored for a model version."""
+    return conn.execute('SELECT COUNT(*) FROM risk_scores WHERE model_version = ?', (model_version,)).fetchone()[0]
+
+def count_unscored_latest_records(conn, model_version):
+    """Returns how many students' latest records have no stored score for a model version."""
+    return conn.execute(
+        'SELECT COUNT(*) FROM latest_student_state l WHERE NOT EXISTS (SELECT 1 FROM risk_scores r '
+        'WHERE r.StudentID = l.StudentID AND r.ReportingPeriod = l.ReportingPeriod AND r.model_version = ?)',
+        (model_version,)
+    ).fetchone()[0]
+
+def precompute_risk_scores(db_file=DB_FILE, model_file=MODEL_FILE, label_encoder_file=LABEL_ENCODER_FILE,
+                           prune_other_versions=True):
+    """
+    Scores every student record in the database in bulk and stores the results.
+    This is run after data is migrated and after the model is retrained.
+
+    Args:
+        prune_other_versions (bool): Delete scores from any other model version.
+            Pass False while a running app may still be serving the previous
+            model; the app deletes them itself once no process serves them.
+
+    Returns:
+        int: The number of records scored, or 0 if the inputs are missing.
+    """
+    if not os.path.exists(model_file) or not os.path.exists(label_encoder_file):
+        print(f"-> Skipping risk score precomputation: '{model_file}' not found.")
+        return 0
+
+    model = joblib.load(model_file)
+    label_encoder = joblib.load(label_encoder_file)
+    model_version = get_model_version(model_file)
+
+    conn = sqlite3.connect(db_file)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'student_records'").fetchone() is None:
+            print("-> Skipping risk score precomputation: student tables are not set up yet.")
+            return 0
+
+        create_risk_scores_table(conn)
+        students_df = pd.read_sql_query('SELECT * FROM student_records', conn)
+
+        with conn:
+            if prune_other_versions:
+                delete_other_model_versions(conn, model_version)
+            for start in range(0, len(students_df), INSERT_BATCH_SIZE):
+                batch_df = students_df.iloc[start:start + INSERT_BATCH_SIZE]
+                store_risk_scores(conn, batch_df, model, label_encoder, model_version)
+    finally:
+        conn.close()
+
+    print(f"-> Precomputed {len(students_df)} risk scores for model version {model_version}.")
+    return len(students_df)
+
+def score_unscored_latest_records(conn, model, label_encoder, model_version):
+    """
+    Scores every student whose latest record has no stored score for the
+    current model version, e.g. after a retrain that did not go through
+    precompute_risk_scores.
+
+    Returns:
+        int: The number of records that had to be scored.
+    """
+    create_risk_scores_table(conn)
+    unscored_df = pd.read_sql_query(
+        '''
+        SELECT l.* FROM latest_student_state l
+        LEFT JOIN risk_scores r
+            ON r.StudentID = l.StudentID AND r.ReportingPeriod = l.ReportingPeriod AND r.model_version = ?
+        WHERE r.StudentID IS NULL
+        ''',
+        conn,
+        params=(model_version,)
+    )
+    if not unscored_df.empty:
+        with conn:
+            store_risk_scores(conn, unscored_df, model, label_encoder, model_version)
+    return len(unscored_df)
+
+def get_risk_profiles(conn, students_df, model, label_encoder, model_version):
+    """
+    Returns risk profiles for the given student records, reading stored scores
+    from 'risk_scores' and only running live inference for records that have
+    no score for the current model version. Live scores are written back.
+
+    Args:
+        conn (sqlite3.Connection): An open database connection.
+        students_df (pd.DataFrame): Student records, including StudentID and ReportingPeriod.
+        model (Pipeline): The trained scikit-learn pipeline.
+        label_encoder (LabelEncoder): The fitted label encoder for the target.
+        model_version (str): The version tag from get_model_version.
+
+    Returns:
+        list: One risk profile dict per row, in the same order as students_df.
+    """
+    if students_df.empty:
+        return []
+
+    create_risk_scores_table(conn)
+    keys = list(zip(students_df['StudentID'], students_df['ReportingPeriod'].astype(int)))
+    student_ids = sorted({student_id for student_id, _ in keys})
+
+    # Fetch in chunks to stay under SQLite's bound-parameter limit.
+    stored = {}
+    for start in range(0, len(student_ids), 900):
+        chunk = student_ids[start:start + 900]
+        placeholders = ','.join('?' * len(chunk))
+        cursor = conn.execute(
+            f'SELECT StudentID, ReportingPeriod, level, probabilities, factor_bitmask FROM risk_scores '
+            f'WHERE model_version = ? AND StudentID IN ({placeholders})',
+            [model_version, *chunk]
+        )
+        for student_id, period, level, probabilities, factor_bitmask in cursor:
+            stored[(student_id, period)] = (level, probabilities, factor_bitmask)
+
+    class_names = label_encoder.classes_
+    profiles = [None] * len(keys)
+    missing_positions = []
+    for i, key in enumerate(keys):
+        if key in stored:
+            level, probabilities, factor_bitmask = stored[key]
+            prob_values = json.loads(probabilities)
+            profiles[i] = build_risk_profile(level, [prob_values[str(label)] for label in class_names], factor_bitmask, class_names)
+        else:
+            missing_positions.append(i)
+
+    # --- Fall back to live inference for anything not yet scored ---
+    if missing_positions:
+        missing_df = students_df.iloc[missing_positions]
+        with conn:
+            risk_levels, probabilities, factor_bitmasks = store_risk_scores(conn, missing_df, model, label_encoder, model_version,
+                                                                            publish_changes=True)
+        for j, i in enumerate(missing_positions):
+            profiles[i] = build_risk_profile(risk_levels[j], probabilities[j], factor_bitmasks[j], class_names)
+
+    return profiles
+
+def get_risk_explanations(conn, students_df, model, label_encoder, model_version):
+    """
+    Returns the stored explanations of the given student records' scores.
+    Scores stored before explanations existed are explained once and updated.
+    Call get_risk_profiles first so that every record has a stored score.
+
+    Returns:
+        list: One explanation dict (see build_explanation) per row, in the same
+        order as students_df, or None for a record without a stored score.
+    """
+    keys = list(zip(students_df['StudentID'], students_df['ReportingPeriod'].astype(int)))
+    stored = {}
+    student_ids = sorted({student_id for student_id, _ in keys})
+    for start in range(0, len(student_ids), 900):
+        chunk = student_ids[start:start + 900]
+        cursor = conn.execute(
+            f"SELECT StudentID, ReportingPeriod, explanation FROM risk_scores "
+            f"WHERE model_version = ? AND StudentID IN ({', '.join('?' * len(chunk))})",
+            [model_version, *chunk]
+        )
+        for student_id, period, explanation in cursor:
+            stored[(student_id, period)] = explanation
+
+    missing_positions = [i for i, key in enumerate(keys) if key in stored and stored[key] is None]
+    if missing_positions:
+        explanations = encode_explanations(*explain_students(students_df.iloc[missing_positions], model, label_encoder, RISK_CLASS))
+        updates = [(explanation, *keys[i], model_version) for i, explanation in zip(missing_positions, explanations)]
+        with conn:
+            conn.executemany(
+                'UPDATE risk_scores SET explanation = ? WHERE StudentID = ? AND ReportingPeriod = ? AND model_version = ?',
+                updates
+            )
+        for explanation, student_id, period, _ in updates:
+            stored[(student_id, period)] = explanation
+
+    return [build_explanation(stored[key]) if stored.get(key) is not None else None for key in keys]
+
+if __name__ == '__main__':
+    precompute_risk_scores()
@@ -0,0 +1,329 @@
+import argparse
+import json
+import threading
+import time
+
+from db import ConnectionPool
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+# Latest records scored (and committed) per batch; progress is updated after each one.
+SCORING_BATCH_SIZE = 5000
+# Explicit student lists are looked up in chunks to stay under SQLite's bound-parameter limit.
+STUDENT_ID_CHUNK_SIZE = 900
+POLL_INTERVAL = 2.0
+# A running job whose progress has not moved for this long belongs to a worker
+# that died (e.g. the app was restarted mid-job), so it is queued again.
+STALE_JOB_SECONDS = 300
+
+# --- Job Queue ---
+# Jobs live in the application database, so they survive restarts and can be
+# queued by scripts (see the CLI below) for a running app to pick up.
+def create_scoring_jobs_table(conn):
+    """Creates the 'scoring_jobs' queue table if it does not exist yet."""
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scoring_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_ids TEXT, -- JSON list, or NULL for every student
+                model_version TEXT, -- NULL: whichever model is serving when the job runs
+                force INTEGER NOT NULL DEFAULT 0, -- Re-score records that already have a score
+                status TEXT NOT NULL DEFAULT 'queued', -- queued, running, done or failed
+                total INTEGER,
+                processed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME
+            );
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_scoring_jobs_status ON scoring_jobs(status, id);')
+
+def _job_to_dict(row):
+    job = dict(row)
+    job['student_ids'] = None if job['student_ids'] is None else json.loads(job['student_ids'])
+    job['force'] = bool(job['force'])
+    return job
+
+def enqueue_scoring_job(conn, student_ids=None, model_version=None, force=None):
+    """
+    Queues a rescoring job.
+
+    Args:
+        conn (sqlite3.Connection): A pooled connection.
+        student_ids (list): Rescore these students' latest records. Everyone if omitted.
+        model_version (str): Only run with this model version. The serving model if omitted.
+        force (bool): Re-score records that already have a score for the version.
+            Defaults to True for explicit students (their records may have been
+            corrected) and False for the whole cohort (only fill in the gaps).
+
+    Returns:
+        int: The job id. A whole-cohort job that is already queued or running
+        for the same version is reused instead of queueing a duplicate.
+    """
+    create_scoring_jobs_table(conn)
+    force = (student_ids is not None) if force is None else bool(force)
+
+    with conn:
+        if student_ids is None:
+            existing = conn.execute(
+                "SELECT id FROM scoring_jobs WHERE student_ids IS NULL AND model_version IS ? AND force = ? "
+                "AND status IN ('queued', 'running') ORDER BY id LIMIT 1",
+                (model_version, int(force))
+            ).fetchone()
+            if existing is not None:
+                return existing[0]
+
+        cursor = conn.execute(
+            'INSERT INTO scoring_jobs (student_ids, model_version, force) VALUES (?, ?, ?)',
+            (None if student_ids is None else json.dumps(sorted(set(student_ids))), model_version, int(force))
+        )
+        return cursor.lastrowid
+
+def get_scoring_job(conn, job_id):
+    """Returns a job as a dict, or None if there is no such job."""
+    create_scoring_jobs_table(conn)
+    row = conn.execute('SELECT * FROM scoring_jobs WHERE id = ?', (job_id,)).fetchone()
+    return None if row is None else _job_to_dict(row)
+
+def list_scoring_jobs(conn, limit=20):
+    """Returns the most recent jobs, newest first."""
+    create_scoring_jobs_table(conn)
+    return [_job_to_dict(row) for row in conn.execute('SELECT * FROM scoring_jobs ORDER BY id DESC LIMIT ?', (limit,))]
+
+def has_queued_jobs(conn):
+    """Returns True if any job is waiting to be claimed."""
+    return conn.execute("SELECT 1 FROM scoring_jobs WHERE status = 'queued' LIMIT 1").fetchone() is not None
+
+def claim_next_job(conn, model_version=None):
+    """
+    Marks the oldest queued job as running and returns it, or None if the
+    queue is empty. The claim is a single UPDATE, so two workers (e.g. in
+    different app processes) never run the same job.
+
+    Args:
+        conn (sqlite3.Connection): The worker's connection.
+        model_version (str): The version the worker serves. Jobs for another
+            version are left for a worker that serves it, e.g. a job queued
+            for a new model before every process has swapped to it.
+    """
+    with conn:
+        conn.execute(
+            "UPDATE scoring_jobs SET status = 'queued' WHERE status = 'running' AND updated_at < datetime('now', ?)",
+            (f'-{STALE_JOB_SECONDS} seconds',)
+        )
+        row = conn.execute(
+            "UPDATE scoring_jobs SET status = 'running', processed = 0, error = NULL, "
+            "started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = (SELECT id FROM scoring_jobs WHERE status = 'queued' "
+            "AND (? IS NULL OR model_version IS NULL OR model_version = ?) ORDER BY id LIMIT 1) "
+            "RETURNING *",
+            (model_version, model_version)
+        ).fetchone()
+    return None if row is None else _job_to_dict(row)
+
+def _finish_job(conn, job_id, status, error=None):
+    with conn:
+        conn.execute(
+            'UPDATE scoring_jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP, '
+            'finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (status, error, job_id)
+        )
+
+# --- Running Jobs ---
+def _target_conditions(job, model_version):
+    """SQL conditions and parameters selecting the latest records a job has to score."""
+    if job['force']:
+        return '', []
+    return (' AND NOT EXISTS (SELECT 1 FROM risk_scores r WHERE r.StudentID = l.StudentID '
+            'AND r.ReportingPeriod = l.ReportingPeriod AND r.model_version = ?)'), [model_version]
+
+def count_job_targets(conn, job, model_version):
+    """Returns how many latest records the job will score."""
+    conditions, params = _target_conditions(job, model_version)
+    if job['student_ids'] is None:
+        return conn.execute(f'SELECT COUNT(*) FROM latest_student_state l WHERE 1 = 1{conditions}', params).fetchone()[0]
+
+    total = 0
+    for start in range(0, len(job['student_ids']), STUDENT_ID_CHUNK_SIZE):
+        chunk = job['student_ids'][start:start + STUDENT_ID_CHUNK_SIZE]
+        total += conn.execute(
+            f"SELECT COUNT(*) FROM latest_student_state l WHERE l.StudentID IN ({', '.join('?' * len(chunk))}){conditions}",
+            chunk + params
+        ).fetchone()[0]
+    return total
+
+def iter_job_batches(conn, job, model_version, batch_size=SCORING_BATCH_SIZE):
+    """
+    Yields the job's target records as DataFrames of at most batch_size rows.
+    The whole cohort is walked in StudentID order with a keyset, so each batch
+    is one indexed range query however large the cohort is.
+    """
+    import pandas as pd
+
+    conditions, params = _target_conditions(job, model_version)
+    if job['student_ids'] is None:
+        after = ''
+        while True:
+            batch_df = pd.read_sql_query(
+                f'SELECT l.* FROM latest_student_state l WHERE l.StudentID > ?{conditions} ORDER BY l.StudentID LIMIT ?',
+                conn, params=[after] + params + [batch_size]
+            )
+            if batch_df.empty:
+                return
+            yield batch_df
+            after = batch_df['StudentID'].iloc[-1]
+    else:
+        chunk_size = min(batch_size, STUDENT_ID_CHUNK_SIZE)
+        for start in range(0, len(job['student_ids']), chunk_size):
+            chunk = job['student_ids'][start:start + chunk_size]
+            batch_df = pd.read_sql_query(
+                f"SELECT l.* FROM latest_student_state l WHERE l.StudentID IN ({', '.join('?' * len(chunk))}){conditions}",
+                conn, params=chunk + params
+            )
+            if not batch_df.empty:
+                yield batch_df
+
+def run_scoring_job(conn, job, loaded, batch_size=SCORING_BATCH_SIZE):
+    """
+    Scores a claimed job's records in vectorized batches with the given model,
+    committing the scores and the job's progress together after every batch.
+
+    Args:
+        conn (sqlite3.Connection): The worker's connection.
+        job (dict): A job returned by claim_next_job.
+        loaded (LoadedModel): The model to score with; must match the job's model_version, if set.
+        batch_size (int): Records per batch.
+
+    Returns:
+        int: The number of records scored.
+    """
+    from risk_scores import create_risk_scores_table, store_risk_scores
+
+    create_risk_scores_table(conn)
+    total = count_job_targets(conn, job, loaded.version)
+    with conn:
+        conn.execute('UPDATE scoring_jobs SET model_version = ?, total = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                     (loaded.version, total, job['id']))
+
+    processed = 0
+    for batch_df in iter_job_batches(conn, job, loaded.version, batch_size):
+        processed += len(batch_df)
+        with conn:
+            store_risk_scores(conn, batch_df, loaded.model, loaded.label_encoder, loaded.version, publish_changes=True)
+            conn.execute('UPDATE scoring_jobs SET processed = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         (processed, job['id']))
+    return processed
+
+class ScoringWorker:
+    """
+    Runs queued scoring jobs on a background thread next to the app, so that
+    cohort-wide inference never happens on the request path.
+    """
+
+    def __init__(self, db_file=DB_FILE, get_model=None, batch_size=SCORING_BATCH_SIZE,
+                 poll_interval=POLL_INTERVAL, on_job_done=None):
+        """
+        Args:
+            db_file (str): The application database holding the queue.
+            get_model (callable): Returns the serving LoadedModel (e.g. ModelRegistry.get).
+            batch_size (int): Records scored per batch.
+            poll_interval (float): Seconds between checks for jobs queued by other processes.
+            on_job_done (callable): Called with the finished job dict, e.g. to invalidate caches.
+        """
+        self.db_file = db_file
+        self.get_model = get_model
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.on_job_done = on_job_done
+        self._pool = ConnectionPool(db_file)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        """Wakes the worker thread so a job queued in this process starts right away."""
+        self._wake.set()
+
+    def run_pending(self):
+        """
+        Runs queued jobs until the queue is empty.
+
+        Returns:
+            int: The number of jobs run.
+        """
+        conn = self._pool.get_connection()
+        create_scoring_jobs_table(conn)
+        jobs_run = 0
+        while not self._stopped.is_set():
+            # The model is only loaded once there is work for it.
+            if not has_queued_jobs(conn):
+                return jobs_run
+            loaded = self.get_model()
+            job = claim_next_job(conn, None if loaded is None else loaded.version)
+            if job is None:
+                return jobs_run
+            jobs_run += 1
+            start_time = time.perf_counter()
+
+            if loaded is None:
+                _finish_job(conn, job['id'], 'failed', "Model artifacts not loaded.")
+            else:
+                try:
+                    processed = run_scoring_job(conn, job, loaded, self.batch_size)
+                    _finish_job(conn, job['id'], 'done')
+                    print(f"-> Scoring job {job['id']}: scored {processed} records with model {loaded.version} "
+                          f"in {time.perf_counter() - start_time:.2f}s.")
+                except Exception as e:
+                    _finish_job(conn, job['id'], 'failed', str(e))
+                    print(f"🛑 ERROR: Scoring job {job['id']} failed: {e}")
+
+            if self.on_job_done is not None:
+                self.on_job_done(get_scoring_job(conn, job['id']))
+        return jobs_run
+
+    def start(self):
+        """Starts the worker on a daemon thread."""
+        def work():
+            while not self._stopped.is_set():
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    print(f"🛑 ERROR: Scoring worker failed: {e}")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+            self._pool.close_all()
+
+        self._thread = threading.Thread(target=work, name='scoring-worker', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stops the worker thread once the job it is running (if any) has finished."""
+        self._stopped.set()
+        self._wake.set()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Queue or run Mentor's Eye rescoring jobs.")
+    parser.add_argument('--db', default=DB_FILE, help=f"SQLite database file (default: {DB_FILE}).")
+    parser.add_argument('--all', action='store_true', help="Queue a job for every student's latest record.")
+    parser.add_argument('--students', nargs='+', default=None, help="Queue a job for these StudentIDs.")
+    parser.add_argument('--model-version', default=None, help="Only run the job with this model version.")
+    parser.add_argument('--force', action='store_true', help="Re-score records that already have a score.")
+    parser.add_argument('--work', action='store_true', help="Run every queued job now, then exit.")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db)
+    if args.all or args.students:
+        job_id = enqueue_scoring_job(pool.get_connection(), args.students, args.model_version, args.force or None)
+        print(f"-> Queued scoring job {job_id}; a running app picks it up within {POLL_INTERVAL:.0f}s.")
+
+    if args.work:
+        from model_registry import ModelRegistry
+        ScoringWorker(args.db, ModelRegistry().get).run_pending()
+
+    for job in list_scoring_jobs(pool.get_connection(), limit=10):
+        progress = f"{job['processed']}/{job['total']}" if job['total'] is not None else '-'
+        scope = 'all students' if job['student_ids'] is None else f"{len(job['student_ids'])} students"
+        print(f"   job {job['id']:>4}  {job['status']:<8} {progress:>13}  {scope}{'  ' + job['error'] if job['error'] else ''}")
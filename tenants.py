@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+# Maps institutions to their own directory and mentors, e.g.
+#   {"tenants": {"north": {"mentors": ["mentor@north.edu"]},
+#                "south": {"mentors": ["mentor@south.edu"], "directory": "/srv/south"}}}
+# Each directory holds that institution's database, data files and model
+# artifacts under the usual file names. Without this file the current
+# directory is the only tenant and every mentor belongs to it.
+TENANTS_FILE = 'tenants.json'
+TENANTS_DIR = 'tenants' # Default parent of tenant directories
+DEFAULT_TENANT = 'default'
+TENANT_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+# How often the app checks TENANTS_FILE for new tenants.
+RELOAD_CHECK_SECONDS = 2
+# Shared by every tenant, so that model versions mean the same thing everywhere.
+RISK_RULES_FILE = 'risk_rules.json'
+
+# An institution. 'mentors' is None for the default tenant, which has everyone.
+TenantConfig = namedtuple('TenantConfig', ['name', 'directory', 'mentors'])
+
+def tenant_path(config, filename):
+    """Returns the path of one of a tenant's files, e.g. tenant_path(config, 'mentors_eye.db')."""
+    return os.path.join(config.directory, filename)
+
+def load_tenant_configs(tenants_file=TENANTS_FILE):
+    """
+    Reads the tenants file.
+
+    Returns:
+        dict: Tenant name -> TenantConfig. Just the default tenant if the file does not exist.
+    Raises ValueError if a tenant name is invalid or a mentor belongs to two tenants.
+    """
+    if not os.path.exists(tenants_file):
+        return {DEFAULT_TENANT: TenantConfig(DEFAULT_TENANT, '.', None)}
+
+    with open(tenants_file) as f:
+        entries = json.load(f).get('tenants', {})
+
+    configs = {}
+    owners = {}
+    for name, entry in entries.items():
+        if not TENANT_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid tenant name: {name!r}")
+        mentors = frozenset(entry.get('mentors', []))
+        for email in mentors:
+            if email in owners:
+                raise ValueError(f"Mentor {email} belongs to both '{owners[email]}' and '{name}'.")
+            owners[email] = name
+        configs[name] = TenantConfig(name, entry.get('directory', os.path.join(TENANTS_DIR, name)), mentors)
+    return configs
+
+def save_tenant_configs(configs, tenants_file=TENANTS_FILE):
+    """Writes the tenants file atomically, so a running app never reads half of it."""
+    entries = {
+        config.name: {'directory': config.directory, 'mentors': sorted(config.mentors or [])}
+        for config in configs.values()
+    }
+    temp_file = tenants_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump({'tenants': entries}, f, indent=2)
+    os.replace(temp_file, tenants_file)
+
+class TenantRegistry:
+    """
+    Maps logged-in mentors to their tenant. The tenants file is re-read when
+    it changes, so a tenant can be added while the app is running without
+    touching the ones already being served.
+    """
+
+    def __init__(self, tenants_file=TENANTS_FILE, check_interval=RELOAD_CHECK_SECONDS):
+        self.tenants_file = tenants_file
+        self.check_interval = check_interval
+        self._configs = load_tenant_configs(tenants_file)
+        self._mentor_tenants = self._index(self._configs)
+        self._signature = self._get_signature()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index(configs):
+        return {email: config.name for config in configs.values() for email in (config.mentors or [])}
+
+    def _get_signature(self):
+        try:
+            stat = os.stat(self.tenants_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            signature = self._get_signature()
+            if signature == self._signature:
+                return
+            try:
+                configs = load_tenant_configs(self.tenants_file)
+            except (OSError, ValueError) as e:
+                print(f"🛑 ERROR: Could not reload '{self.tenants_file}', keeping the current tenants: {e}")
+                return
+            self._configs, self._mentor_tenants = configs, self._index(configs)
+            self._signature = signature
+            print(f"--- Reloaded {len(configs)} tenants from '{self.tenants_file}'. ---")
+
+    def configs(self):
+        """Returns the current tenant name -> TenantConfig mapping."""
+        self._reload_if_changed()
+        return self._configs
+
+    def get(self, name):
+        """Returns a tenant's config, or None if there is no such tenant."""
+        return self.configs().get(name)
+
+    def tenant_for_mentor(self, email):
+        """Returns the name of the mentor's tenant, or None if they do not belong to one."""
+        configs = self.configs()
+        if DEFAULT_TENANT in configs and configs[DEFAULT_TENANT].mentors is None:
+            return DEFAULT_TENANT
+        return self._mentor_tenants.get(email)
+
+class TenantManager:
+    """
+    Keeps the services (connection pool, model, caches, workers) of recently
+    used tenants open. A tenant is opened on its first request. When the open
+    tenants together use more than the memory budget, the least recently used
+    ones with no request in progress are closed; they are simply opened again
+    when they are next needed.
+    """
+
+    def __init__(self, open_tenant, memory_budget_bytes):
+        """
+        Args:
+            open_tenant (callable): Opens a tenant's services given its name. The result
+                needs memory_bytes() and close() methods.
+            memory_budget_bytes (int): What all open tenants may use together.
+        """
+        self.open_tenant = open_tenant
+        self.memory_budget_bytes = memory_budget_bytes
+        self._open = OrderedDict() # name -> services, least recently used first
+        self._active = {} # name -> requests in progress
+        self._opening = {} # name -> Event set once the tenant is open (or failed to open)
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.evictions = 0
+
+    def acquire(self, name):
+        """
+        Returns a tenant's services for the duration of a request, opening them
+        if needed. Every acquire() must be matched by a release().
+
+        Opening a tenant (loading its model, starting its workers) happens
+        outside the manager's lock, so only requests for that same tenant wait
+        for it; requests for other tenants are not held up.
+        """
+        while True:
+            with self._lock:
+                services = self._open.get(name)
+                if services is not None:
+                    evicted = self._activate(name)
+                    break
+                opening = self._opening.get(name)
+                if opening is None:
+                    opening = self._opening[name] = threading.Event()
+                    break
+            # Another request is opening this tenant; wait for it, then look again.
+            opening.wait()
+
+        if services is None:
+            try:
+                services = self.open_tenant(name)
+            except BaseException:
+                with self._lock:
+                    del self._opening[name]
+                opening.set() # A waiting request tries to open it in turn
+                raise
+            with self._lock:
+                self._open[name] = services
+                self.opens += 1
+                del self._opening[name]
+                evicted = self._activate(name)
+            opening.set()
+
+        # Closed outside the lock, so other tenants' requests are not held up.
+        for evicted_name, evicted_services in evicted:
+            print(f"--- Closed idle tenant '{evicted_name}' to stay within the memory budget. ---")
+            evicted_services.close()
+        return services
+
+    def _activate(self, name):
+        """Counts a request for an open tenant and evicts others if needed. Called with the lock held."""
+        self._open.move_to_end(name)
+        self._active[name] = self._active.get(name, 0) + 1
+        return self._evict(keep=name)
+
+    def release(self, name):
+        """Marks one of a tenant's requests as finished."""
+        with self._lock:
+            self._active[name] -= 1
+            if not self._active[name]:
+                del self._active[name]
+
+    def _evict(self, keep):
+        used = sum(services.memory_bytes() for services in self._open.values())
+        evicted = []
+        for name in list(self._open):
+            if used <= self.memory_budget_bytes:
+                break
+            if name == keep or self._active.get(name):
+                continue
+            services = self._open.pop(name)
+            used -= services.memory_bytes()
+            evicted.append((name, services))
+            self.evictions += 1
+        return evicted
+
+    def open_tenants(self):
+        """Returns (name, services) for every open tenant, least recently used first."""
+        with self._lock:
+            return list(self._open.items())
+
+    def close_all(self):
+        """Closes every open tenant, e.g. at shutdown."""
+        with self._lock:
+            open_tenants = list(self._open.values())
+            self._open.clear()
+        for services in open_tenants:
+            services.close()
+
+# --- Administration ---
+def add_tenant(name, mentors, directory=None, tenants_file=TENANTS_FILE):
+    """
+    Adds a tenant (or more mentors to an existing one) and creates its directory.
+    Once the tenants file exists, only the mentors it lists can log in; to keep
+    serving the current single-institution files, add them as a tenant with
+    directory '.'.
+
+    Returns:
+        TenantConfig: The tenant's config.
+    Raises ValueError if the name is invalid or a mentor already belongs to another tenant.
+    """
+    if not TENANT_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid tenant name: {name!r}")
+
+    configs = {}
+    if os.path.exists(tenants_file):
+        configs = load_tenant_configs(tenants_file)
+
+    existing = configs.get(name)
+    config = TenantConfig(name, directory or (existing.directory if existing else os.path.join(TENANTS_DIR, name)),
+                          (existing.mentors if existing else frozenset()) | frozenset(mentors))
+    for other in configs.values():
+        if other.name != name and other.mentors & config.mentors:
+            raise ValueError(f"Mentors already belong to '{other.name}': {', '.join(sorted(other.mentors & config.mentors))}")
+    configs[name] = config
+
+    os.makedirs(config.directory, exist_ok=True)
+    save_tenant_configs(configs, tenants_file)
+    return config
+
+def run_script_for_tenants(script, script_args, configs, jobs):
+    """
+    Runs one of the project's scripts (e.g. migrate_data.py) once per tenant,
+    in parallel processes, each with the tenant's directory as its working
+    directory so that it reads and writes only that tenant's files. Output goes
+    to '<script>.log' in the tenant's directory.
+
+    Returns:
+        dict: Tenant name -> (return code, seconds).
+    """
+    script_path = os.path.abspath(script)
+    env = dict(os.environ, RISK_RULES_FILE=os.path.abspath(RISK_RULES_FILE))
+    log_name = os.path.splitext(os.path.basename(script))[0] + '.log'
+
+    def run(config):
+        start_time = time.perf_counter()
+        with open(tenant_path(config, log_name), 'w') as log:
+            returncode = subprocess.run([sys.executable, script_path, *script_args], cwd=config.directory, env=env,
+                                        stdout=log, stderr=subprocess.STDOUT).returncode
+        seconds = time.perf_counter() - start_time
+        status = 'done' if returncode == 0 else f'FAILED (exit code {returncode})'
+        print(f"-> [{config.name}] {os.path.basename(script)} {status} in {seconds:.1f}s, log: {tenant_path(config, log_name)}")
+        return config.name, (returncode, seconds)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(run, configs))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the institutions (tenants) served by one deployment.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help="List the tenants and their mentors.")
+
+    add_parser = subparsers.add_parser('add', help="Add a tenant, or mentors to an existing one.")
+    add_parser.add_argument('name', help="Tenant name (letters, digits, '-' and '_').")
+    add_parser.add_argument('--mentor', action='append', default=[], help="A mentor's email (repeatable).")
+    add_parser.add_argument('--directory', help=f"Where its files live (default: {TENANTS_DIR}/<name>).")
+
+    run_parser = subparsers.add_parser('run', help="Run a script (e.g. migrate_data.py) for each tenant in parallel. "
+                                                   "Arguments after '--' are passed to the script.")
+    run_parser.add_argument('script', help="The script to run.")
+    run_parser.add_argument('--tenant', action='append', help="Only this tenant (repeatable; default: all of them).")
+    run_parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="Tenants to run at once (default: one per core).")
+    # Everything after '--' is passed on to the script, e.g. '-- --n-jobs 1' for train_model.py.
+    argv = sys.argv[1:]
+    script_args = argv[argv.index('--') + 1:] if '--' in argv else []
+    args = parser.parse_args(argv[:argv.index('--')] if '--' in argv else argv)
+
+    if args.command == 'list':
+        for config in load_tenant_configs().values():
+            mentors = 'all mentors' if config.mentors is None else ', '.join(sorted(config.mentors)) or 'no mentors'
+            print(f"{config.name:<16} {config.directory:<24} {mentors}")
+
+    elif args.command == 'add':
+        if not os.path.exists(TENANTS_FILE):
+            print(f"-> Creating '{TENANTS_FILE}'. From now on only the mentors it lists can log in.")
+        config = add_tenant(args.name, args.mentor, args.directory)
+        print(f"-> Tenant '{config.name}' uses '{config.directory}'. Put its data files there, then run:")
+        print(f"   python tenants.py run database_setup.py --tenant {config.name}")
+        print(f"   python tenants.py run migrate_data.py --tenant {config.name}")
+        print(f"   python tenants.py run train_model.py --tenant {config.name}")
+
+    else:
+        configs = load_tenant_configs()
+        unknown = set(args.tenant or []) - set(configs)
+        if unknown:
+            print(f"🛑 FATAL ERROR: Unknown tenants: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        selected = [config for name, config in configs.items() if not args.tenant or name in args.tenant]
+
+        print(f"--- Running {args.script} for {len(selected)} tenants, {args.jobs} at a time ---")
+        results = run_script_for_tenants(args.script, script_args, selected, max(1, args.jobs))
+        failed = [name for name, (returncode, _) in results.items() if returncode != 0]
+        if failed:
+            print(f"🛑 ERROR: Failed for {', '.join(failed)}.")
+            sys.exit(1)
@@ -0,0 +1,179 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+
+from compiled_model import get_file_digest
+from data_store import RECORD_DTYPES, read_records
+from risk_scores import create_risk_scores_table, get_model_version, score_unscored_latest_records
+from train_model import (DATA_FILE, DB_FILE, LABEL_ENCODER_FILE, MODEL_FILE, NON_FEATURE_COLUMNS, TRAINING_COLUMNS,
+                         TRAINING_SNAPSHOT_FILE, save_artifacts, save_training_snapshot, train_holistic_model)
+
+# --- Configuration ---
+# Trees added per incremental run, trained on the changed students plus a replay sample.
+TREES_PER_INCREMENT = 30
+# The oldest trees are retired once the forest grows past this size.
+MAX_FOREST_TREES = 300
+# Unchanged students replayed per changed student, so new trees still see the whole cohort's patterns.
+REPLAY_RATIO = 1.0
+
+def load_training_snapshot():
+    """
+    Returns the snapshot saved by train_model.py, or None if there is none or
+    it belongs to a different model file (e.g. the model was replaced by hand).
+    """
+    if not os.path.exists(TRAINING_SNAPSHOT_FILE) or not os.path.exists(MODEL_FILE):
+        return None
+    snapshot = joblib.load(TRAINING_SNAPSHOT_FILE)
+    if snapshot['model_digest'] != get_file_digest(MODEL_FILE):
+        print(f"-> '{TRAINING_SNAPSHOT_FILE}' does not match '{MODEL_FILE}'.")
+        return None
+    return snapshot
+
+def read_delta_records(snapshot, delta_file=None):
+    """
+    Reads only the records that can change the latest state: a delta CSV if one
+    is given (e.g. the file passed to ingest_period.py), otherwise the periods of
+    the master data from the snapshot's latest period onwards. With the Parquet
+    store that opens just those partitions.
+    """
+    if delta_file is not None:
+        return pd.read_csv(delta_file, usecols=TRAINING_COLUMNS, dtype={column: RECORD_DTYPES[column] for column in TRAINING_COLUMNS})
+    return read_records(DATA_FILE, columns=TRAINING_COLUMNS, min_period=snapshot['max_period'])
+
+def find_changed_students(snapshot_df, delta_df):
+    """
+    Compares each student's latest delta record with the snapshot.
+
+    Returns:
+        pd.DataFrame: The latest delta records of students who are new, or whose
+        latest record is newer than or differs from the one in the snapshot.
+    """
+    delta_latest = delta_df.loc[delta_df.groupby('StudentID')['ReportingPeriod'].idxmax()]
+    merged = delta_latest.merge(snapshot_df, on='StudentID', how='left', suffixes=('', '_old'), indicator=True)
+
+    differs = np.zeros(len(merged), dtype=bool)
+    for column in TRAINING_COLUMNS[1:]:
+        differs |= (merged[column].astype(str) != merged[f'{column}_old'].astype(str)).to_numpy()
+    not_older = (merged['ReportingPeriod'] >= merged['ReportingPeriod_old']).to_numpy()
+    is_new = (merged['_merge'] == 'left_only').to_numpy()
+
+    return delta_latest[is_new | (differs & not_older)].reset_index(drop=True)
+
+def train_incremental(delta_file=None, trees_per_increment=TREES_PER_INCREMENT, max_trees=MAX_FOREST_TREES):
+    """
+    Updates the model with only the students whose latest record changed.
+    The fitted preprocessor is kept, and the forest grows by warm-starting
+    'trees_per_increment' new trees on the changed students plus a replay
+    sample of unchanged ones; the oldest trees are retired past 'max_trees'.
+    Only the latest state is re-scored afterwards, so the cost follows the
+    size of the change rather than the size of the history.
+
+    Args:
+        delta_file (str): CSV of new records. Defaults to reading new periods from the master data.
+        trees_per_increment (int): Trees added by this run.
+        max_trees (int): Largest forest kept.
+
+    Returns:
+        int: The number of changed students the model was updated with.
+    """
+    print("--- Starting Incremental Re-Training ---")
+    start_time = time.perf_counter()
+
+    snapshot = load_training_snapshot()
+    if snapshot is None:
+        print("-> No usable training snapshot; running a full retrain instead.")
+        train_holistic_model()
+        return None
+
+    if delta_file is not None and not os.path.exists(delta_file):
+        print(f"FATAL ERROR: Data file '{delta_file}' not found.")
+        return 0
+
+    # --- 1. Find What Changed ---
+    print("Step 1: Reading new records and comparing them with the training snapshot...")
+    snapshot_df = snapshot['latest']
+    delta_df = read_delta_records(snapshot, delta_file)
+    changed_df = find_changed_students(snapshot_df, delta_df)
+    print(f"-> Read {len(delta_df)} records; {len(changed_df)} of {len(snapshot_df)} students changed.")
+
+    if changed_df.empty:
+        print("-> Nothing changed since the last training run; the model is up to date.")
+        return 0
+
+    model_pipeline = joblib.load(MODEL_FILE)
+    le = joblib.load(LABEL_ENCODER_FILE)
+    preprocessor = model_pipeline.named_steps['preprocessor']
+    forest = model_pipeline.named_steps['classifier']
+
+    # --- 2. Build the Increment's Training Set ---
+    unchanged_df = snapshot_df[~snapshot_df['StudentID'].isin(changed_df['StudentID'])]
+    replay_size = min(len(unchanged_df), int(len(changed_df) * REPLAY_RATIO))
+    increment_df = pd.concat([changed_df, unchanged_df.sample(n=replay_size, random_state=len(forest.estimators_))])
+
+    unknown_targets = set(increment_df['Target']) - set(le.classes_)
+    if unknown_targets or len(set(increment_df['Target'])) < len(le.classes_):
+        # New trees must know every class, and only the classes the model already has.
+        print("-> The changed students do not cover every known class; running a full retrain instead.")
+        train_holistic_model()
+        return None
+
+    X_increment = preprocessor.transform(increment_df.drop(columns=NON_FEATURE_COLUMNS))
+    y_increment = le.transform(increment_df['Target'])
+    X_changed = preprocessor.transform(changed_df.drop(columns=NON_FEATURE_COLUMNS))
+    y_changed = le.transform(changed_df['Target'])
+    accuracy_before = accuracy_score(y_changed, forest.predict(X_changed))
+
+    # --- 3. Grow the Forest ---
+    print(f"Step 2: Adding {trees_per_increment} trees trained on {len(increment_df)} students "
+          f"({len(changed_df)} changed + {replay_size} replayed)...")
+    trees_before = len(forest.estimators_)
+    forest.set_params(warm_start=True, n_estimators=trees_before + trees_per_increment)
+    forest.fit(X_increment, y_increment)
+
+    retired = max(0, len(forest.estimators_) - max_trees)
+    if retired:
+        forest.estimators_ = forest.estimators_[retired:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    accuracy_after = accuracy_score(y_changed, forest.predict(X_changed))
+
+    # --- 4. Save the Model and Snapshot ---
+    print("Step 3: Saving the updated model pipeline and snapshot...")
+    latest_df = pd.concat([unchanged_df, changed_df]).sort_values('StudentID').reset_index(drop=True)
+    save_artifacts(model_pipeline, le)
+    save_training_snapshot(latest_df)
+
+    # Only every student's latest record needs a score for the new model
+    # version; older periods are scored on demand.
+    rescored = 0
+    if os.path.exists(DB_FILE):
+        print("Step 4: Scoring the latest student records with the updated model...")
+        conn = sqlite3.connect(DB_FILE, timeout=30)
+        try:
+            create_risk_scores_table(conn)
+            rescored = score_unscored_latest_records(conn, model_pipeline, le, get_model_version(MODEL_FILE))
+        finally:
+            conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\n-> Accuracy on the changed students: {accuracy_before * 100:.2f}% before, {accuracy_after * 100:.2f}% after.")
+    print(f"-> Trees: kept {trees_before - retired}, added {trees_per_increment}, retired {retired}.")
+    print(f"-> Trained on {len(increment_df)} of {len(latest_df)} students "
+          f"({1 - len(increment_df) / len(latest_df):.1%} skipped); read {len(delta_df)} records; "
+          f"re-scored {rescored} latest records.")
+    print(f"--- Incremental re-training complete in {elapsed:.2f}s. ---")
+    return len(changed_df)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update the Mentor's Eye model with only the students that changed.")
+    parser.add_argument('--delta-file', default=None, help="CSV of new records (default: read new periods from the master data).")
+    parser.add_argument('--trees', type=int, default=TREES_PER_INCREMENT, help=f"Trees to add (default: {TREES_PER_INCREMENT}).")
+    parser.add_argument('--max-trees', type=int, default=MAX_FOREST_TREES, help=f"Largest forest kept (default: {MAX_FOREST_TREES}).")
+    args = parser.parse_args()
+
+    train_incremental(args.delta_file, args.trees, args.max_trees)
@@ -1,38 +1,238 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
 from sklearn.preprocessing import LabelEncoder, MinMaxScaler, OneHotEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
+from joblib import Parallel, delayed
+import argparse
 import joblib
+import json
 import os
+import time
+
+from compiled_model import COMPILED_MODEL_FILE, export_compiled_model, get_file_digest
+from data_store import read_latest_records
+from risk_scores import precompute_risk_scores
 
 # --- Configuration ---
 DATA_FILE = 'master_student_data_historical.csv'
 MODEL_FILE = 'student_dropout_model.joblib'
+LABEL_ENCODER_FILE = 'label_encoder.joblib'
+DB_FILE = 'mentors_eye.db'
+# The latest record of every student the current model was trained on; see train_incremental.py.
+TRAINING_SNAPSHOT_FILE = 'training_snapshot.joblib'
+# Contact details are never features, so they are not even read.
+TRAINING_COLUMNS = [
+    'StudentID', 'AttendancePercentage', 'AverageScore', 'FeeStatus', 'LMS_Logins_Per_Week',
+    'MidtermGrade', 'ScholarshipHolder', 'Target', 'Branch', 'Year',
+    'FinancialStressScore', 'HealthImpact', 'CareerConfidenceScore', 'ReportingPeriod'
+]
+
+# --- Model Configuration ---
+NON_FEATURE_COLUMNS = ['StudentID', 'Target', 'ReportingPeriod']
+CATEGORICAL_FEATURES = ['Branch', 'HealthImpact', 'FeeStatus']
+DEFAULT_DROPPED_FEATURES = ['MidtermGrade']
+DEFAULT_FOREST_PARAMS = {'n_estimators': 150, 'max_depth': 15, 'min_samples_leaf': 3}
+
+# --- Hyperparameter Search ---
+# Every forest configuration is tried with every feature set. Feature sets
+# list the candidate columns left out; scaling is not searched because it
+# does not change how a forest splits.
+SEARCH_FOLDS = 5
+SEARCH_FOREST_GRID = {
+    'n_estimators': [50, 150, 300],
+    'max_depth': [10, 15, None],
+    'min_samples_leaf': [1, 3, 5],
+}
+SEARCH_FEATURE_SETS = {
+    'default': ['MidtermGrade'],
+    'with_midterm': [],
+    'no_demographics': ['MidtermGrade', 'Branch', 'Year'],
+}
+SEARCH_RESULTS_FILE = 'model_search_results.json'
+
+def save_artifacts(model_pipeline, label_encoder):
+    """
+    Writes the model, label encoder and compiled model.
+    Each file is written to a temporary path and renamed into place, with the
+    model file last, so a running app watching for new artifacts never reads
+    a partially written file.
+    """
+    model_tmp, label_encoder_tmp, compiled_tmp = (f"{path}.tmp" for path in (MODEL_FILE, LABEL_ENCODER_FILE, COMPILED_MODEL_FILE))
+    joblib.dump(model_pipeline, model_tmp)
+    joblib.dump(label_encoder, label_encoder_tmp)
+    # A NumPy-only copy of the pipeline for fast, scikit-learn-free serving.
+    # Its digest is taken from the temporary file, which has the same bytes.
+    export_compiled_model(model_pipeline, label_encoder, compiled_tmp, model_tmp)
+
+    os.replace(compiled_tmp, COMPILED_MODEL_FILE)
+    os.replace(label_encoder_tmp, LABEL_ENCODER_FILE)
+    os.replace(model_tmp, MODEL_FILE)
+
+def save_training_snapshot(latest_df):
+    """
+    Persists the latest-state training records next to the model they trained,
+    so an incremental retrain only has to look at what changed since.
+    The model digest ties the snapshot to exactly one model file.
+    """
+    snapshot = {
+        'latest': latest_df.reset_index(drop=True),
+        'max_period': int(latest_df['ReportingPeriod'].max()),
+        'model_digest': get_file_digest(MODEL_FILE),
+    }
+    joblib.dump(snapshot, TRAINING_SNAPSHOT_FILE + '.tmp')
+    os.replace(TRAINING_SNAPSHOT_FILE + '.tmp', TRAINING_SNAPSHOT_FILE)
+
+def get_feature_types(X):
+    """Splits the columns of X into (numerical_features, categorical_features)."""
+    numerical_features = X.select_dtypes(include=np.number).columns.tolist()
+    categorical_features = [column for column in CATEGORICAL_FEATURES if column in X.columns]
+    return numerical_features, categorical_features
+
+def build_preprocessor(numerical_features, categorical_features):
+    """Creates the (unfitted) preprocessing step shared by every model."""
+    return ColumnTransformer(
+        transformers=[
+            ('num', MinMaxScaler(), numerical_features),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
+        ],
+        remainder='passthrough'
+    )
+
+def build_model_pipeline(numerical_features, categorical_features, forest_params=None, n_jobs=-1):
+    """
+    Creates the (unfitted) preprocessor + RandomForestClassifier pipeline.
+
+    Args:
+        numerical_features (list): Columns to scale.
+        categorical_features (list): Columns to one-hot encode.
+        forest_params (dict): RandomForestClassifier parameters. DEFAULT_FOREST_PARAMS if omitted.
+        n_jobs (int): Cores used to build (and later evaluate) the trees; -1 uses all of them.
+
+    Returns:
+        Pipeline: The model pipeline.
+    """
+    forest_params = DEFAULT_FOREST_PARAMS if forest_params is None else forest_params
+    return Pipeline(steps=[
+        ('preprocessor', build_preprocessor(numerical_features, categorical_features)),
+        ('classifier', RandomForestClassifier(random_state=42, n_jobs=n_jobs, **forest_params))
+    ])
+
+def _evaluate_forest(X_fold_train, y_fold_train, X_fold_val, y_fold_val, forest_params):
+    """Fits one forest on one pre-transformed fold. Runs in a worker process."""
+    start_time = time.perf_counter()
+    forest = RandomForestClassifier(random_state=42, n_jobs=1, **forest_params).fit(X_fold_train, y_fold_train)
+    fit_seconds = time.perf_counter() - start_time
+    accuracy = accuracy_score(y_fold_val, forest.predict(X_fold_val))
+    node_count = sum(estimator.tree_.node_count for estimator in forest.estimators_)
+    return accuracy, fit_seconds, node_count
+
+def search_hyperparameters(X, y, folds=SEARCH_FOLDS, n_jobs=-1, results_file=SEARCH_RESULTS_FILE):
+    """
+    Runs a stratified k-fold search over SEARCH_FEATURE_SETS x SEARCH_FOREST_GRID.
+    The preprocessor is fitted once per (feature set, fold) and its output is
+    reused by every forest configuration. The (configuration, fold) fits then
+    run in parallel worker processes, and joblib memory-maps the shared
+    arrays instead of copying them into each worker.
+
+    Args:
+        X (pd.DataFrame): Candidate features (every column of every feature set).
+        y (np.ndarray): Encoded targets.
+        folds (int): Number of cross-validation folds.
+        n_jobs (int): Worker processes; -1 uses all cores.
+        results_file (str): Where to write the per-configuration results as JSON.
+
+    Returns:
+        dict: The best configuration's result (highest mean accuracy, then smallest model).
+    """
+    search_start = time.perf_counter()
+    fold_indices = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X, y))
 
-def train_holistic_model():
+    # --- Fit each preprocessor once per fold ---
+    transformed_folds = {}
+    for feature_set, dropped_features in SEARCH_FEATURE_SETS.items():
+        X_set = X.drop(columns=dropped_features)
+        numerical_features, categorical_features = get_feature_types(X_set)
+        for fold, (train_index, val_index) in enumerate(fold_indices):
+            preprocessor = build_preprocessor(numerical_features, categorical_features).fit(X_set.iloc[train_index])
+            transformed_folds[(feature_set, fold)] = (
+                np.asarray(preprocessor.transform(X_set.iloc[train_index]), dtype=np.float32),
+                np.asarray(preprocessor.transform(X_set.iloc[val_index]), dtype=np.float32),
+            )
+
+    candidates = [(feature_set, params) for feature_set in SEARCH_FEATURE_SETS for params in ParameterGrid(SEARCH_FOREST_GRID)]
+    print(f"-> Evaluating {len(candidates)} configurations x {folds} folds on {len(X)} students...")
+
+    tasks = []
+    for feature_set, params in candidates:
+        for fold, (train_index, val_index) in enumerate(fold_indices):
+            X_fold_train, X_fold_val = transformed_folds[(feature_set, fold)]
+            tasks.append(delayed(_evaluate_forest)(X_fold_train, y[train_index], X_fold_val, y[val_index], params))
+    fold_results = Parallel(n_jobs=n_jobs)(tasks)
+
+    # --- Summarize per configuration ---
+    results = []
+    for i, (feature_set, params) in enumerate(candidates):
+        accuracies, fit_seconds, node_counts = zip(*fold_results[i * folds:(i + 1) * folds])
+        results.append({
+            'feature_set': feature_set,
+            'params': params,
+            'mean_accuracy': float(np.mean(accuracies)),
+            'std_accuracy': float(np.std(accuracies)),
+            'mean_fit_seconds': float(np.mean(fit_seconds)),
+            'mean_node_count': int(np.mean(node_counts)),
+        })
+    results.sort(key=lambda result: (-result['mean_accuracy'], result['mean_node_count']))
+
+    print(f"\n{'Feature set':<16} {'Trees':>5} {'Depth':>5} {'Leaf':>4} {'Accuracy':>15} {'Fit (s)':>8} {'Nodes':>9}")
+    for result in results:
+        params = result['params']
+        print(f"{result['feature_set']:<16} {params['n_estimators']:>5} {str(params['max_depth']):>5} {params['min_samples_leaf']:>4} "
+              f"{result['mean_accuracy'] * 100:>8.2f}% ±{result['std_accuracy'] * 100:>4.2f} "
+              f"{result['mean_fit_seconds']:>8.2f} {result['mean_node_count']:>9}")
+
+    best = results[0]
+    # The smallest model whose accuracy is within one standard deviation of the best.
+    compact = min((result for result in results if result['mean_accuracy'] >= best['mean_accuracy'] - best['std_accuracy']),
+                  key=lambda result: result['mean_node_count'])
+    print(f"\n-> Best: {best['feature_set']} {best['params']} ({best['mean_accuracy'] * 100:.2f}%, {best['mean_node_count']} nodes).")
+    print(f"-> Smallest within one std: {compact['feature_set']} {compact['params']} "
+          f"({compact['mean_accuracy'] * 100:.2f}%, {compact['mean_node_count']} nodes).")
+
+    search_seconds = time.perf_counter() - search_start
+    with open(results_file, 'w') as f:
+        json.dump({'folds': folds, 'students': len(X), 'wall_seconds': search_seconds, 'results': results}, f, indent=2)
+    print(f"-> Search finished in {search_seconds:.1f}s; results saved to '{results_file}'.")
+    return best
+
+def train_holistic_model(search=False, folds=SEARCH_FOLDS, n_jobs=-1):
     """
     Trains the advanced model using the full master dataset.
     1. Loads the comprehensive historical data.
     2. Uses only the LATEST record for each student for training the prediction model.
     3. Preprocesses academic, demographic, and wellness features.
     4. Trains, evaluates, and saves the new, more powerful model.
+
+    Args:
+        search (bool): Pick the features and forest parameters with a cross-validated
+            search instead of using DEFAULT_DROPPED_FEATURES and DEFAULT_FOREST_PARAMS.
+        folds (int): Number of cross-validation folds for the search.
+        n_jobs (int): Cores used by the search and the final model; -1 uses all of them.
     """
     print("--- Starting Advanced Modeling & Re-Training ---")
 
+    # --- 1. Select Latest Records for Training ---
+    # Read from the columnar copy of the data file when there is one (see data_store.py).
+    print("Step 1: Selecting the most recent data for each student for training...")
     try:
-        df = pd.read_csv(DATA_FILE)
+        latest_df = read_latest_records(DATA_FILE, columns=TRAINING_COLUMNS)
     except FileNotFoundError:
         print(f"FATAL ERROR: Master data file '{DATA_FILE}' not found.")
         print("Please run 'generate_master_data.py' first to create it.")
         return
-
-    # --- 1. Select Latest Records for Training ---
-    print("Step 1: Selecting the most recent data for each student for training...")
-    latest_df = df.loc[df.groupby('StudentID')['ReportingPeriod'].idxmax()]
     print(f"-> Using {len(latest_df)} unique student records for training.")
 
     # --- 2. Feature Engineering & Preprocessing Setup ---
@@ -41,12 +241,8 @@ def train_holistic_model():
     # Define the target variable
     y_raw = latest_df['Target']
     
-    # Define features (X) by dropping identifiers and the target variable
-    # This now correctly handles the presence of Email and Phone.
-    X = latest_df.drop(columns=[
-        'StudentID', 'Name', 'Email', 'Phone', 'Target', 
-        'ReportingPeriod', 'MidtermGrade'
-    ])
+    # Define candidate features (X) by dropping identifiers and the target variable
+    X = latest_df.drop(columns=NON_FEATURE_COLUMNS)
 
     # Label Encode the target variable
     le = LabelEncoder()
@@ -54,33 +250,28 @@ def train_holistic_model():
     class_names = le.classes_
     print(f"-> Target variable encoded. Mapping: { {i: label for i, label in enumerate(class_names)} }")
 
-    # Define which columns are numerical and which are categorical
-    numerical_features = X.select_dtypes(include=np.number).columns.tolist()
-    categorical_features = ['Branch', 'HealthImpact', 'FeeStatus']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+
+    dropped_features, forest_params = DEFAULT_DROPPED_FEATURES, DEFAULT_FOREST_PARAMS
+    if search:
+        # Only the training split is searched, so the test split stays unseen until Step 4.
+        print(f"Step 2b: Searching hyperparameters with {folds}-fold cross-validation...")
+        best = search_hyperparameters(X_train, y_train, folds=folds, n_jobs=n_jobs)
+        dropped_features, forest_params = SEARCH_FEATURE_SETS[best['feature_set']], best['params']
+
+    X_train, X_test = X_train.drop(columns=dropped_features), X_test.drop(columns=dropped_features)
+    numerical_features, categorical_features = get_feature_types(X_train)
     
     print(f"-> Identified Numerical Features: {numerical_features}")
     print(f"-> Identified Categorical Features: {categorical_features}")
 
-    # Create a robust preprocessing pipeline
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', MinMaxScaler(), numerical_features),
-            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
-        ],
-        remainder='passthrough'
-    )
-
     # --- 3. Model Training ---
-    print("Step 3: Training the new Random Forest model pipeline...")
-    model_pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('classifier', RandomForestClassifier(n_estimators=150, random_state=42, max_depth=15, min_samples_leaf=3))
-    ])
+    print(f"Step 3: Training the new Random Forest model pipeline ({forest_params})...")
+    model_pipeline = build_model_pipeline(numerical_features, categorical_features, forest_params, n_jobs=n_jobs)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
-    
+    start_time = time.perf_counter()
     model_pipeline.fit(X_train, y_train)
-    print("-> Model training complete.")
+    print(f"-> Model training complete in {time.perf_counter() - start_time:.2f}s.")
 
     # --- 4. Model Evaluation ---
     print("Step 4: Evaluating the new holistic model...")
@@ -108,13 +299,29 @@ def train_holistic_model():
 
     # --- 6. Save the Model and Processors ---
     print("\nStep 6: Saving the new model pipeline...")
-    joblib.dump(model_pipeline, MODEL_FILE)
-    joblib.dump(le, 'label_encoder.joblib')
+    save_artifacts(model_pipeline, le)
+    save_training_snapshot(latest_df)
     print(f"-> New model pipeline saved to '{MODEL_FILE}'.")
-    print("-> Label encoder saved to 'label_encoder.joblib'.")
+    print(f"-> Label encoder saved to '{LABEL_ENCODER_FILE}'.")
+    print(f"-> Compiled inference artifact saved to '{COMPILED_MODEL_FILE}'.")
+    print(f"-> Training snapshot saved to '{TRAINING_SNAPSHOT_FILE}'.")
+
+    # The new model has a new version hash, so it needs its own stored scores.
+    # Scores for the previous version are kept, since a running app keeps
+    # serving them until it has hot-swapped to the new model.
+    if os.path.exists(DB_FILE):
+        print("Step 7: Re-scoring stored student records with the new model...")
+        precompute_risk_scores(DB_FILE, MODEL_FILE, LABEL_ENCODER_FILE, prune_other_versions=False)
+
     print("\n--- Model re-training complete. ---")
     print("Next, please run 'migrate_data.py' to update your database.")
 
 if __name__ == '__main__':
-    train_holistic_model()
+    parser = argparse.ArgumentParser(description="Train the Mentor's Eye dropout-risk model.")
+    parser.add_argument('--search', action='store_true', help="Run a cross-validated hyperparameter search first.")
+    parser.add_argument('--folds', type=int, default=SEARCH_FOLDS, help=f"Cross-validation folds for --search (default: {SEARCH_FOLDS}).")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Cores to use (default: -1, all of them).")
+    args = parser.parse_args()
+
+    train_holistic_model(search=args.search, folds=args.folds, n_jobs=args.n_jobs)
 
@@ -0,0 +1,175 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from predict import evaluate_risk_factors, expand_risk_factors
+
+# --- Configuration ---
+DB_FILE = 'mentors_eye.db'
+# Trends look at each student's last TREND_WINDOW periods, so the cost per
+# student stays the same however long their history grows.
+TREND_WINDOW = 4
+# Per-period metric -> column prefix in 'student_trends'.
+TREND_METRICS = {'AttendancePercentage': 'attendance', 'AverageScore': 'score'}
+TREND_STATISTICS = ['delta', 'slope', 'mean', 'std']
+TREND_COLUMNS = [f'{prefix}_{statistic}' for prefix in TREND_METRICS.values() for statistic in TREND_STATISTICS]
+
+# Early-warning filters, in the same rule format as the risk factors (see
+# predict.py); a rule's position is its bit in 'trend_bitmask'.
+#   *_delta: change from the previous period to the latest one
+#   *_slope: least-squares change per period over the window
+TREND_RULES = [
+    {'text': 'Attendance dropped >10 points', 'column': 'attendance_delta', 'op': '<', 'value': -10},
+    {'text': 'Average score dropped >10 points', 'column': 'score_delta', 'op': '<', 'value': -10},
+    {'text': 'Attendance declining', 'column': 'attendance_slope', 'op': '<=', 'value': -3},
+    {'text': 'Average score declining', 'column': 'score_slope', 'op': '<=', 'value': -3},
+]
+
+def create_student_trends_table(conn):
+    """Creates the 'student_trends' table if it does not exist yet. It has one row per student."""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS student_trends (
+            StudentID TEXT PRIMARY KEY,
+            ReportingPeriod INTEGER NOT NULL, -- The latest period the trends were computed up to
+            periods INTEGER NOT NULL, -- Periods in the window
+            {', '.join(f'{column} REAL' for column in TREND_COLUMNS)},
+            trend_bitmask INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+
+# --- Computation ---
+def compute_trends(records_df):
+    """
+    Computes every student's trend statistics in one vectorized pass.
+    Per-student sums are taken with np.add.reduceat over the group boundaries,
+    so there is no Python loop over students.
+
+    Args:
+        records_df (pd.DataFrame): StudentID, ReportingPeriod and the TREND_METRICS
+            columns, sorted by StudentID and ReportingPeriod.
+
+    Returns:
+        pd.DataFrame: One row per student with TREND_COLUMNS and trend_bitmask.
+        Deltas are NaN for students with a single period, slopes too.
+    """
+    if records_df.empty:
+        return pd.DataFrame(columns=['StudentID', 'ReportingPeriod', 'periods', *TREND_COLUMNS, 'trend_bitmask'])
+
+    student_ids = records_df['StudentID'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, student_ids[1:] != student_ids[:-1]])
+    ends = np.r_[starts[1:], len(student_ids)] - 1 # Each student's latest row
+    counts = (ends - starts + 1).astype(float)
+
+    x = records_df['ReportingPeriod'].to_numpy(dtype=float)
+    sum_x = np.add.reduceat(x, starts)
+    sum_xx = np.add.reduceat(x * x, starts)
+    slope_denominator = counts * sum_xx - sum_x ** 2
+
+    trends = {
+        'StudentID': student_ids[starts],
+        'ReportingPeriod': x[ends].astype(np.int64),
+        'periods': counts.astype(np.int64),
+    }
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for column, prefix in TREND_METRICS.items():
+            y = records_df[column].to_numpy(dtype=float)
+            sum_y = np.add.reduceat(y, starts)
+            sum_yy = np.add.reduceat(y * y, starts)
+            sum_xy = np.add.reduceat(x * y, starts)
+
+            mean = sum_y / counts
+            previous = np.where(counts > 1, y[np.maximum(ends - 1, 0)], np.nan)
+            trends[f'{prefix}_delta'] = y[ends] - previous
+            trends[f'{prefix}_slope'] = np.where(slope_denominator > 0, (counts * sum_xy - sum_x * sum_y) / slope_denominator, np.nan)
+            trends[f'{prefix}_mean'] = mean
+            trends[f'{prefix}_std'] = np.sqrt(np.maximum(sum_yy / counts - mean ** 2, 0))
+
+    trends_df = pd.DataFrame(trends)
+    trends_df['trend_bitmask'] = evaluate_risk_factors(trends_df, TREND_RULES)
+    return trends_df
+
+def expand_trend_flags(bitmask):
+    """Returns the texts of the trend rules set in a trend bitmask."""
+    return [flag['text'] for flag in expand_risk_factors(bitmask, TREND_RULES)]
+
+# --- Storage ---
+# Reads each student's last TREND_WINDOW periods with a primary-key range per
+# student, starting from their materialized latest state.
+WINDOW_RECORDS_QUERY = f'''
+    SELECT m.StudentID, m.ReportingPeriod, {', '.join(f'm.{column}' for column in TREND_METRICS)}
+    FROM latest_student_state l
+    JOIN student_period_metrics m
+        ON m.StudentID = l.StudentID AND m.ReportingPeriod > l.ReportingPeriod - ? AND m.ReportingPeriod <= l.ReportingPeriod
+    {{conditions}}
+    ORDER BY m.StudentID, m.ReportingPeriod
+'''
+
+def refresh_student_trends(conn, student_ids=None, window=TREND_WINDOW):
+    """
+    Recomputes and stores the trends of the given students (everyone if omitted).
+    Runs inside the caller's transaction when there is one.
+
+    Args:
+        conn (sqlite3.Connection): An open database connection.
+        student_ids (list): Only these students, e.g. the ones a new period touched.
+        window (int): Periods per student to compute trends over.
+
+    Returns:
+        pd.DataFrame: The stored trends.
+    """
+    create_student_trends_table(conn)
+    if student_ids is None:
+        records_df = pd.read_sql_query(WINDOW_RECORDS_QUERY.format(conditions=''), conn, params=(window,))
+    else:
+        student_ids = sorted(set(student_ids))
+        chunks = []
+        for start in range(0, len(student_ids), 900):
+            chunk = student_ids[start:start + 900]
+            chunks.append(pd.read_sql_query(
+                WINDOW_RECORDS_QUERY.format(conditions=f"WHERE l.StudentID IN ({', '.join('?' * len(chunk))})"),
+                conn, params=(window, *chunk)
+            ))
+        records_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    trends_df = compute_trends(records_df)
+    columns = ['StudentID', 'ReportingPeriod', 'periods', *TREND_COLUMNS, 'trend_bitmask']
+    rows = trends_df[columns].astype(object).where(trends_df[columns].notna(), None)
+    rows['trend_bitmask'] = rows['trend_bitmask'].map(int)
+
+    if student_ids is None:
+        conn.execute('DELETE FROM student_trends')
+    conn.executemany(
+        f"INSERT OR REPLACE INTO student_trends ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        rows.itertuples(index=False, name=None)
+    )
+    return trends_df
+
+def fetch_student_trends(conn, student_id):
+    """Returns a student's stored trends as a dict with the flagged rule texts, or None."""
+    cursor = conn.execute('SELECT * FROM student_trends WHERE StudentID = ?', (student_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    trends = dict(zip([column[0] for column in cursor.description], row))
+    trends['flags'] = expand_trend_flags(trends.pop('trend_bitmask'))
+    return trends
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recompute every student's trend analytics.")
+    parser.add_argument('--db', default=DB_FILE, help=f"SQLite database file (default: {DB_FILE}).")
+    parser.add_argument('--window', type=int, default=TREND_WINDOW, help=f"Periods per student (default: {TREND_WINDOW}).")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    conn = sqlite3.connect(args.db)
+    with conn:
+        trends_df = refresh_student_trends(conn, window=args.window)
+    conn.close()
+
+    print(f"-> Computed trends for {len(trends_df)} students in {time.perf_counter() - start_time:.2f}s.")
+    for bit, rule in enumerate(TREND_RULES):
+        flagged = int(((trends_df['trend_bitmask'].to_numpy(dtype=np.uint64) >> np.uint64(bit)) & np.uint64(1)).sum())
+        print(f"   {rule['text']:<36} {flagged} students")